@@ -0,0 +1,305 @@
+"""Admission control in front of the Flask app.
+
+Every request is put in a priority class before it reaches a route:
+
+- critical: creating a high-urgency request, claiming a request or
+  changing its status;
+- elevated: creating other requests, signing up and logging in;
+- listing: GET /requests, /map/..., /suggestions, /dispatch/...;
+- background: everything else (profile, health, stats, bulk import and
+  export).
+
+The controller admits at most `capacity` requests at once. Lower classes may
+only use a share of it, so critical work always has room. Busy listing
+routes also have their own budgets, so a flood of map refreshes cannot take
+all the listing slots. A request that cannot be admitted waits briefly,
+and slots are handed to the highest class first. When its wait runs out, it
+is shed: a GET is answered from the last good response to the same URL,
+session and Accept-Encoding if one is fresh enough, otherwise with 503 and
+Retry-After.
+
+Set ADMISSION_CAPACITY to about the number of requests a worker process
+serves at once (its thread count). Server-Sent Event streams are long-lived
+and bypass admission.
+"""
+from collections import OrderedDict
+import io
+import itertools
+import json
+import threading
+import time
+
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import ClosingIterator
+
+
+CRITICAL, ELEVATED, LISTING, BACKGROUND = range(4)
+CLASS_NAMES = ['critical', 'elevated', 'listing', 'background']
+
+# Share of capacity each class may occupy
+CLASS_SHARES = [1.0, 0.9, 0.75, 0.5]
+
+# Seconds a request may wait for a slot before it is shed
+CLASS_MAX_WAIT = [5.0, 2.0, 0.5, 0.2]
+
+# GET routes (by path prefix, most specific first) with their own share of capacity
+ROUTE_SHARES = [
+    ('/map/data', 0.25),
+    ('/suggestions', 0.25),
+    ('/map/', 0.5),
+    ('/requests', 0.5),
+]
+
+EXEMPT_PREFIXES = ('/events', '/admission/stats')
+
+# Largest request body read to find a new request's urgency
+MAX_CLASSIFY_BODY = 64 * 1024
+
+
+def classify(method, path, body=None):
+    """Priority class of a request, or None if it bypasses admission"""
+    if method == 'OPTIONS' or path.startswith(EXEMPT_PREFIXES):
+        return None
+    if method == 'POST' and path == '/requests':
+        return CRITICAL if (body or {}).get('urgency') == 'high' else ELEVATED
+    if method == 'PUT' and path.startswith('/requests/') and path.endswith(('/volunteer', '/status')):
+        return CRITICAL
+    if method == 'POST' and path.startswith('/auth/'):
+        return ELEVATED
+    if path in ('/requests/bulk', '/requests/export'):
+        # Long-running batch work yields to interactive requests
+        return BACKGROUND
+    if method == 'GET' and path.startswith(('/requests', '/map/', '/suggestions', '/dispatch/')):
+        return LISTING
+    return BACKGROUND
+
+
+def route_key(method, path):
+    """Budgeted route a request counts against, if any"""
+    if method != 'GET':
+        return None
+    for prefix, _ in ROUTE_SHARES:
+        if path.startswith(prefix):
+            return prefix
+    return None
+
+
+class AdmissionController:
+    """Concurrency limits with class shares, route budgets and priority hand-off"""
+
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self._class_limits = [max(1, int(capacity * share)) for share in CLASS_SHARES]
+        self._route_limits = {prefix: max(1, int(capacity * share)) for prefix, share in ROUTE_SHARES}
+        self._in_flight = 0
+        self._class_in_flight = [0] * len(CLASS_NAMES)
+        self._route_in_flight = dict.fromkeys(self._route_limits, 0)
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._counters = {name: dict.fromkeys(['admitted', 'queued', 'shed_stale', 'shed_503'], 0)
+                          for name in CLASS_NAMES}
+
+    def _fits(self, klass, route):
+        if self._in_flight >= self._class_limits[klass]:
+            return False
+        return route is None or self._route_in_flight[route] < self._route_limits[route]
+
+    def _outranked(self, klass, sequence):
+        # Someone ahead in line who could run now goes first
+        return any((k, s) < (klass, sequence) and self._fits(k, r) for k, s, r in self._waiting)
+
+    def _take(self, klass, route):
+        self._in_flight += 1
+        self._class_in_flight[klass] += 1
+        if route:
+            self._route_in_flight[route] += 1
+        self._counters[CLASS_NAMES[klass]]['admitted'] += 1
+
+    def acquire(self, klass, route=None):
+        """Take a slot, waiting up to the class's limit; False if the request must be shed"""
+        with self._cond:
+            if self._fits(klass, route) and not self._waiting:
+                self._take(klass, route)
+                return True
+
+            entry = (klass, next(self._sequence), route)
+            self._waiting.append(entry)
+            self._counters[CLASS_NAMES[klass]]['queued'] += 1
+            deadline = time.monotonic() + CLASS_MAX_WAIT[klass]
+            try:
+                while True:
+                    if self._fits(klass, route) and not self._outranked(klass, entry[1]):
+                        self._take(klass, route)
+                        return True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting.remove(entry)
+                # Whoever is next in line may be able to go now
+                self._cond.notify_all()
+
+    def release(self, klass, route=None):
+        with self._cond:
+            self._in_flight -= 1
+            self._class_in_flight[klass] -= 1
+            if route:
+                self._route_in_flight[route] -= 1
+            self._cond.notify_all()
+
+    def shed(self, klass, stale):
+        with self._cond:
+            self._counters[CLASS_NAMES[klass]]['shed_stale' if stale else 'shed_503'] += 1
+
+    def stats(self):
+        """In-flight and queue depth per class and route, plus counters"""
+        with self._cond:
+            waiting = [0] * len(CLASS_NAMES)
+            for klass, _, _ in self._waiting:
+                waiting[klass] += 1
+            return {
+                'capacity': self.capacity,
+                'in_flight': self._in_flight,
+                'queue_depth': len(self._waiting),
+                'classes': {
+                    name: dict(self._counters[name], in_flight=self._class_in_flight[k],
+                               waiting=waiting[k], limit=self._class_limits[k])
+                    for k, name in enumerate(CLASS_NAMES)
+                },
+                'routes': {
+                    prefix: {'in_flight': self._route_in_flight[prefix], 'limit': limit}
+                    for prefix, limit in self._route_limits.items()
+                }
+            }
+
+
+class StaleCache:
+    """Last good GET response per URL and session, for serving while shedding"""
+
+    def __init__(self, maxsize=512, max_age=120, max_bytes=512 * 1024):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """(age in seconds, status, headers, body) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, status, headers, body = entry
+            age = time.monotonic() - stored_at
+            if age > self.max_age:
+                del self._entries[key]
+                return None
+            return int(age), status, headers, body
+
+    def put(self, key, status, headers, body):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), status, headers, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+def cache_key(environ):
+    # Bodies are stored as sent, possibly compressed, so only replay them to
+    # clients that accept the same encodings
+    return (environ['PATH_INFO'], environ.get('QUERY_STRING', ''), environ.get('HTTP_COOKIE', ''),
+            environ.get('HTTP_ACCEPT_ENCODING', ''))
+
+
+class AdmissionMiddleware:
+    """WSGI middleware that admits, queues or sheds each request"""
+
+    def __init__(self, wsgi_app, controller, stale_cache=None):
+        self.wsgi_app = wsgi_app
+        self.controller = controller
+        self.stale_cache = stale_cache or StaleCache()
+
+    def __call__(self, environ, start_response):
+        method = environ['REQUEST_METHOD']
+        path = environ.get('PATH_INFO', '')
+        klass = classify(method, path, self._peek_json(environ) if method == 'POST' else None)
+        if klass is None:
+            return self.wsgi_app(environ, start_response)
+
+        route = route_key(method, path)
+        if not self.controller.acquire(klass, route):
+            return self._shed(klass, environ, start_response)
+
+        release = lambda: self.controller.release(klass, route)  # noqa: E731
+        try:
+            if klass == LISTING and method == 'GET':
+                app_iter = self._recording(environ, start_response)
+            else:
+                app_iter = self.wsgi_app(environ, start_response)
+        except BaseException:
+            release()
+            raise
+        # The slot is held until the body has been sent
+        return ClosingIterator(app_iter, [release])
+
+    def _peek_json(self, environ):
+        """Parse a small JSON body and put it back for the app"""
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return None
+        if not 0 < length <= MAX_CLASSIFY_BODY:
+            return None
+        raw = environ['wsgi.input'].read(length)
+        environ['wsgi.input'] = io.BytesIO(raw)
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            return None
+        return body if isinstance(body, dict) else None
+
+    def _recording(self, environ, start_response):
+        """Run the app, keeping a copy of a successful response for later shedding"""
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            captured['status'], captured['headers'] = status, headers
+            return start_response(status, headers, exc_info)
+
+        app_iter = self.wsgi_app(environ, capture)
+
+        def generate():
+            chunks, size = [], 0
+            try:
+                for chunk in app_iter:
+                    if chunks is not None:
+                        size += len(chunk)
+                        if size <= self.stale_cache.max_bytes:
+                            chunks.append(chunk)
+                        else:
+                            chunks = None
+                    yield chunk
+                if chunks is not None and captured.get('status', '').startswith('200'):
+                    self.stale_cache.put(cache_key(environ), captured['status'], captured['headers'], b''.join(chunks))
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+
+        return generate()
+
+    def _shed(self, klass, environ, start_response):
+        cached = self.stale_cache.get(cache_key(environ)) if environ['REQUEST_METHOD'] == 'GET' else None
+        self.controller.shed(klass, stale=cached is not None)
+        if cached:
+            age, status, headers, body = cached
+            headers = [(k, v) for k, v in headers if k.lower() not in ('age', 'warning', 'content-length')]
+            headers += [('Age', str(age)), ('Warning', '110 - "Response is Stale"'),
+                        ('Content-Length', str(len(body)))]
+            start_response(status, headers)
+            return [body]
+
+        response = Response(json.dumps({'error': 'Server is busy, please try again shortly'}),
+                            status=503, mimetype='application/json', headers={'Retry-After': '1'})
+        return response(environ, start_response)
@@ -1,54 +1,321 @@
-from flask import Flask, jsonify, request, session
+from flask import Flask, Response, g, jsonify, request, session, stream_with_context
 from flask_cors import CORS
-from openai import OpenAI
 from pymongo.mongo_client import MongoClient
+from pymongo.errors import DuplicateKeyError, PyMongoError
 from pymongo.server_api import ServerApi
-from werkzeug.security import generate_password_hash, check_password_hash
 from bson.objectid import ObjectId
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+import hashlib
+import itertools
 import os
 import secrets
 import uuid
-import math
 import re
+import threading
+import time
+
+from admission import AdmissionController, AdmissionMiddleware
+from archive import ARCHIVE_COLLECTION, TERMINAL_STATUSES, ensure_archive, start_archiver
+from bulk import export_lines, export_query, ingest, new_request, validate_request
+from claims import claim_request
+from compression import compression_from_env
+from clients import LazyClient
+from dedup import DUPLICATE, add_report, dedup_index_from_env, signature
+from dispatch import start_dispatcher
+from embeddings import semantic_index_from_env
+from events import (
+    CLAIMED, CREATED, STATUS_CHANGED, EventBus, sse_stream, start_change_stream_watcher, status_event
+)
+from indexes import backfill_geo_points, ensure_indexes, to_geo_point
+from metrics import Metrics, SlowRequestProfiler, TimedJSONProvider
+from passwords import HashPool, PoolSaturated
+from pagination import (
+    apply_distance_cursor, created_at_cursor, created_at_filter, distance_cursor,
+    id_cursor, id_filter, page_args, stream_json_array
+)
+from projections import (
+    HAS_LOCATION, MAP_PIN_SCHEMA, REQUEST_SCHEMA, SUGGESTION_FIELDS_STAGE, map_pin_stage, request_stages
+)
+from scoring import (
+    AGE_SCORES, EARTH_RADIUS_KM, SEMANTIC_MATCH_SCORE, SKILL_MATCH_SCORE, SUGGESTION_LIMIT,
+    SUGGESTION_RADIUS_KM, URGENCY_SCORES, CandidateSet, calculate_distance,
+    rank_candidates, score_request, suggestion_from
+)
+from stats import cell_scope, record, record_many, start_pruner, start_reconciler, summarize
+from suggestion_cache import SuggestionCache
+from tiles import MAX_BBOX_TILES, MAX_ZOOM, TileIndex, tiles_in_bbox
+from user_cache import USER_PROJECTION, UserCache
 
 
 load_dotenv()
 
-MONGO_URI_STRING = os.getenv('MONGO_URI_STRING')
-mongoClient = MongoClient(MONGO_URI_STRING, server_api=ServerApi('1'))
+# About the number of requests this process serves at once (see admission.py)
+ADMISSION_CAPACITY = int(os.getenv('ADMISSION_CAPACITY', 32))
 
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-openai = OpenAI(api_key=OPENAI_API_KEY)
+# Worker processes are forked by create_app(). Callers wait on their hash,
+# so hashing may hold at most half of the request threads.
+password_pool = HashPool(
+    method=os.getenv('PASSWORD_HASH_METHOD', 'scrypt'),
+    workers=int(os.getenv('HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2))),
+    queue_depth=int(os.getenv('HASH_QUEUE_DEPTH', 8)),
+    timeout=float(os.getenv('HASH_TIMEOUT', 10)),
+    max_slots=int(os.getenv('HASH_MAX_SLOTS', ADMISSION_CAPACITY // 2))
+)
+
+metrics = Metrics()
+profiler = None
+if os.getenv('PROFILE_SLOW_MS'):
+    profiler = SlowRequestProfiler(float(os.getenv('PROFILE_SLOW_MS')), os.getenv('PROFILE_DIR', 'profiles'),
+                                   float(os.getenv('PROFILE_INTERVAL_MS', 5)))
+
+MONGO_URI_STRING = os.getenv('MONGO_URI_STRING')
+# Built on the first query, once per process (see clients.py)
+mongo = LazyClient(lambda: MongoClient(MONGO_URI_STRING, server_api=ServerApi('1'),
+                                       event_listeners=[metrics.command_listener]))
 
 app = Flask(__name__)
-CORS(app, supports_credentials=True)
+app.json = TimedJSONProvider(app)
+CORS(app, supports_credentials=True, expose_headers=['X-Next-Cursor'])
 app.secret_key = os.getenv('SECRET_KEY', secrets.token_hex(16))
 
-db = mongoClient["Database"]
+admission = AdmissionController(capacity=ADMISSION_CAPACITY)
+app.wsgi_app = AdmissionMiddleware(app.wsgi_app, admission)
+compression = compression_from_env()
+
+db = mongo["Database"]
 users_collection = db["users"]
 requests_collection = db["requests"]
+counters_collection = db["counters"]
+proposals_collection = db["proposals"]
+archive_collection = db[ARCHIVE_COLLECTION]
+stats_collection = db["stats"]
+
+# Reads reach the archive once requests are moved there (see archive.py)
+ARCHIVE_AFTER_HOURS = os.getenv('ARCHIVE_AFTER_HOURS')
+ARCHIVE_CHECK_INTERVAL = float(os.getenv('ARCHIVE_CHECK_INTERVAL', 30))
+_archive_checked = (False, float('-inf'))
+
+def archive_tiering():
+    """Whether listings must also query the archive
+
+    Requests are never moved back, so once the archive has some this stays
+    on. Until then the database is asked again at most every
+    ARCHIVE_CHECK_INTERVAL seconds, so requests moved by `archive.py` or
+    another process show up without a restart. Lookups by id fall back to
+    the archive whatever this says.
+    """
+    tiered = cached_archive_tiering()
+    if tiered is None:
+        tiered = record_archive_count(archive_collection.estimated_document_count())
+    return tiered
+
+def cached_archive_tiering():
+    """archive_tiering()'s answer if it needs no query, else None"""
+    tiered, checked_at = _archive_checked
+    if tiered or ARCHIVE_AFTER_HOURS:
+        return True
+    if time.monotonic() - checked_at < ARCHIVE_CHECK_INTERVAL:
+        return tiered
+    return None
+
+def record_archive_count(count):
+    """Remember how many requests the archive held; returns whether listings must query it"""
+    global _archive_checked
+    _archive_checked = (count > 0, time.monotonic())
+    return count > 0
+
+EVENT_SOURCE = os.getenv('EVENT_SOURCE', 'bus')
+event_bus = EventBus()
+tile_index = TileIndex()
+event_bus.add_listener(tile_index.on_event)
+# Near-duplicate requests are merged or flagged at insert (see dedup.py)
+dedup_index = dedup_index_from_env()
+if dedup_index:
+    event_bus.add_listener(dedup_index.on_event)
+
+user_cache = UserCache(
+    maxsize=int(os.getenv('USER_CACHE_SIZE', 4096)),
+    ttl=int(os.getenv('USER_CACHE_TTL', 30))
+)
+# Description embeddings for the semantic term in suggestion scores; loaded
+# from their on-disk cache by create_app()
+semantic_index = None
+suggestion_cache = SuggestionCache(
+    maxsize=int(os.getenv('SUGGESTION_CACHE_SIZE', 1024)),
+    ttl=int(os.getenv('SUGGESTION_CACHE_TTL', 300))
+)
+event_bus.add_listener(suggestion_cache.on_event)
+
+# MongoDB reports $geoNear distances in meters on a 6378.1 km sphere. Rescaling
+# by this factor yields km on the same 6371 km sphere calculate_distance uses.
+MONGO_EARTH_RADIUS_M = 6378100
+GEO_DISTANCE_MULTIPLIER = EARTH_RADIUS_KM / MONGO_EARTH_RADIUS_M
+
+# Startup runs once per process, before traffic, from create_app(); requests
+# never run it. /health answers whatever the state of startup.
+def startup_error():
+    """Why this process cannot serve yet, or None once create_app() has run"""
+    pid = os.getpid()
+    if _started_pid == pid:
+        return None
+    if _startup_failed_pid == pid:
+        return 'Service failed to start'
+    return 'Service is not started'
+
+@app.before_request
+def require_started():
+    if request.endpoint == 'health_check':
+        return None
+    error = startup_error()
+    if error:
+        return jsonify({'error': error}), 503
+
+# Instrumentation
+@app.before_request
+def start_request_metrics():
+    g.request_stats = metrics.start_request()
+    if profiler:
+        profiler.watch(g.request_stats)
+
+@app.after_request
+def finish_request_metrics(response):
+    stats = g.get('request_stats')
+    if stats is None:
+        return response
+    method = request.method
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = response.status_code
+    
+    def finish():
+        # Runs once the body has been sent, so streamed responses count in full
+        elapsed = metrics.finish_request(stats, method, route, status)
+        if profiler and profiler.finish(stats, method, route, elapsed):
+            metrics.slow_profiles.inc((method, route))
+    response.call_on_close(finish)
+    return response
+
+@app.after_request
+def compress_response(response):
+    if compression:
+        compression.apply(response, request.accept_encodings)
+    return response
 
 # Helper functions
 def is_valid_email(email):
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points using Haversine formula (in km)"""
-    R = 6371  # Earth's radius in km
-    
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    
-    a = (math.sin(dlat/2) * math.sin(dlat/2) + 
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * 
-         math.sin(dlon/2) * math.sin(dlon/2))
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    distance = R * c
-    
-    return distance
+def geo_near_stage(user_location, query, max_distance=None, min_distance=None):
+    """Build a $geoNear stage that filters, measures (km) and sorts by distance"""
+    stage = {
+        'near': to_geo_point(user_location),
+        'key': 'geo',
+        'distanceField': 'distance',
+        'distanceMultiplier': GEO_DISTANCE_MULTIPLIER,
+        'spherical': True,
+        'query': query
+    }
+    if max_distance:
+        stage['maxDistance'] = max_distance / GEO_DISTANCE_MULTIPLIER
+    if min_distance:
+        stage['minDistance'] = min_distance / GEO_DISTANCE_MULTIPLIER
+    return {'$geoNear': stage}
+
+def publish_event(event_type, req):
+    """Publish a request event unless the change stream is the event source"""
+    if EVENT_SOURCE == 'bus':
+        event_bus.publish(event_type, req)
+
+def find_request(request_id, projection=None):
+    """A request by id from the live collection, falling back to the archive"""
+    help_request = requests_collection.find_one({'_id': ObjectId(request_id)}, projection)
+    if help_request is None:
+        help_request = archive_collection.find_one({'_id': ObjectId(request_id)}, projection)
+    return help_request
+
+def requests_version():
+    """Counter bumped on every write to the requests collection"""
+    counter = counters_collection.find_one({'_id': 'requests'})
+    return counter['version'] if counter else 0
+
+def bump_requests_version():
+    counters_collection.update_one({'_id': 'requests'}, {'$inc': {'version': 1}}, upsert=True)
+
+def merge_report(request_id, urgency, now):
+    """Count one more report on a pending request; False if it is no longer pending"""
+    merged = add_report(requests_collection, ObjectId(request_id), urgency, now)
+    if not merged:
+        return False
+    before, after = merged
+    bump_requests_version()
+    record(stats_collection, before, after)
+    if after['urgency'] != before['urgency']:
+        # Rescored on every map, cached ranking and stream
+        publish_event(STATUS_CHANGED, after)
+    return True
+
+def settle_duplicates(request_id, status, now):
+    """Carry a request's fulfillment or cancellation over to its duplicates
+
+    Duplicates of a fulfilled request are fulfilled with it. When it is
+    cancelled, the oldest duplicate is reopened in its place and the others
+    point at it.
+    """
+    if status not in TERMINAL_STATUSES:
+        return
+    duplicates = list(requests_collection.find(
+        {'duplicate_of': ObjectId(request_id), 'status': DUPLICATE}, {'geo': 0}
+    ).sort('created_at', 1))
+    if not duplicates:
+        return
+    if status == 'fulfilled':
+        update_data = {'status': 'fulfilled', 'fulfilled_at': now, 'updated_at': now}
+        requests_collection.update_many(
+            {'_id': {'$in': [doc['_id'] for doc in duplicates]}, 'status': DUPLICATE}, {'$set': update_data}
+        )
+        record_many(stats_collection, [(doc, dict(doc, **update_data)) for doc in duplicates], now)
+        for doc in duplicates:
+            publish_event(status_event('fulfilled'), dict(doc, **update_data))
+        return
+    first = duplicates[0]
+    update_data = {'status': 'pending', 'duplicate_of': None, 'updated_at': now}
+    result = requests_collection.update_one({'_id': first['_id'], 'status': DUPLICATE}, {'$set': update_data})
+    if not result.modified_count:
+        return
+    if len(duplicates) > 1:
+        requests_collection.update_many(
+            {'_id': {'$in': [doc['_id'] for doc in duplicates[1:]]}, 'status': DUPLICATE},
+            {'$set': {'duplicate_of': first['_id']}}
+        )
+    promoted = dict(first, **update_data)
+    record(stats_collection, first, promoted)
+    if semantic_index:
+        semantic_index.submit([promoted])
+    publish_event(STATUS_CHANGED, promoted)
+
+def make_etag(*parts):
+    """Opaque validator for a response determined by parts"""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+def not_modified(etag):
+    """304 response if the client already holds etag, else None"""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+def split_param(name):
+    """Comma-separated query parameter as a list"""
+    value = request.args.get(name)
+    return [v.strip() for v in value.split(',') if v.strip()] if value else None
+
+def busy_response(error):
+    """503 telling the client when to retry"""
+    response = jsonify({'error': 'Server is busy, please try again shortly'})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
 
 def require_auth(f):
     """Decorator to require authentication"""
@@ -59,11 +326,147 @@ def require_auth(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+def load_user(user_id):
+    """Load a user profile without secrets"""
+    return users_collection.find_one({'_id': ObjectId(user_id)}, USER_PROJECTION)
+
 def get_current_user():
-    """Get current user from session"""
+    """Get current user from session, memoized for the rest of the request"""
     if 'user_id' not in session:
         return None
-    return users_collection.find_one({'_id': ObjectId(session['user_id'])})
+    if 'current_user' not in g:
+        g.current_user = user_cache.get(session['user_id'], load_user)
+    return g.current_user
+
+def requests_pipeline(user, args, tiered):
+    """(pipeline, limit, geo_sorted) for GET /requests; raises ValueError on bad arguments
+
+    tiered is archive_tiering()'s answer, which the caller gets in its own way.
+    """
+    status = args.get('status')
+    help_type = args.get('type')
+    urgency = args.get('urgency')
+    max_distance = args.get('max_distance', type=float)
+    
+    # Build filter
+    filter_query = {}
+    
+    if user['role'] == 'victim':
+        # Victims see only their own requests
+        filter_query['victim_id'] = user['_id']
+    else:
+        # Volunteers see all pending requests by default
+        filter_query['status'] = status or 'pending'
+    
+    if help_type:
+        filter_query['type'] = help_type
+    
+    if urgency:
+        filter_query['urgency'] = urgency
+    
+    limit, cursor = page_args(args)
+    
+    # Nearest first for volunteers with a location, shaped for the response
+    # by the server
+    user_location = user.get('location', {})
+    geo_sorted = user['role'] == 'volunteer' and bool(to_geo_point(user_location))
+    
+    def tier_pipeline():
+        if geo_sorted:
+            stages = [apply_distance_cursor(
+                geo_near_stage(user_location, filter_query, max_distance), cursor, GEO_DISTANCE_MULTIPLIER
+            )]
+        else:
+            stages = [
+                {'$match': dict(filter_query, **created_at_filter(cursor))},
+                {'$sort': {'created_at': -1, '_id': -1}}
+            ]
+        if limit:
+            stages.append({'$limit': limit})
+        return stages
+    
+    pipeline = tier_pipeline()
+    # A victim's history and finished requests may have been archived: take
+    # the best page from each tier, then merge them
+    if tiered and (user['role'] == 'victim' or filter_query['status'] in TERMINAL_STATUSES):
+        pipeline += [
+            {'$unionWith': {'coll': ARCHIVE_COLLECTION, 'pipeline': tier_pipeline()}},
+            {'$sort': {'distance': 1, '_id': 1} if geo_sorted else {'created_at': -1, '_id': -1}}
+        ]
+        if limit:
+            pipeline.append({'$limit': limit})
+    pipeline += request_stages(geo_sorted, keep_raw_distance=bool(limit))
+    return pipeline, limit, geo_sorted
+
+def finish_requests_page(page, limit, geo_sorted):
+    """(response items, next cursor) of a GET /requests page"""
+    next_cursor = None
+    if len(page) == limit:
+        next_cursor = distance_cursor(page, '_d') if geo_sorted else created_at_cursor(page[-1])
+    return REQUEST_SCHEMA.select_many(page), next_cursor
+
+def map_pipeline(user, args):
+    """(pipeline, limit, geo_sorted) for GET /map/data; raises ValueError on bad arguments"""
+    help_type = args.get('type')
+    urgency = args.get('urgency')
+    max_distance = args.get('max_distance', type=float)
+    
+    # Build filter
+    filter_query = {'status': 'pending'}
+    
+    if help_type:
+        filter_query['type'] = help_type
+    
+    if urgency:
+        filter_query['urgency'] = urgency
+    
+    limit, cursor = page_args(args)
+    
+    # Nearest first when the user has a location, projected down to marker
+    # fields by the server
+    user_location = user.get('location', {})
+    geo_sorted = bool(to_geo_point(user_location))
+    if geo_sorted:
+        pipeline = [apply_distance_cursor(
+            geo_near_stage(user_location, filter_query, max_distance), cursor, GEO_DISTANCE_MULTIPLIER
+        )]
+    else:
+        pipeline = [
+            {'$match': dict(filter_query, **HAS_LOCATION, **id_filter(cursor))},
+            {'$sort': {'_id': 1}}
+        ]
+    if limit:
+        pipeline.append({'$limit': limit})
+    pipeline.append(map_pin_stage(keep_raw_distance=bool(limit and geo_sorted)))
+    return pipeline, limit, geo_sorted
+
+def finish_map_page(page, limit, geo_sorted):
+    """(response pins, next cursor) of a GET /map/data page"""
+    next_cursor = None
+    if len(page) == limit:
+        next_cursor = distance_cursor(page, '_d', 'id') if geo_sorted else id_cursor(page[-1]['id'])
+    return MAP_PIN_SCHEMA.select_many(page), next_cursor
+
+def distance_and_score(help_request, user):
+    """Caller's distance (km) to a request and, for volunteers, its score"""
+    user_location = user.get('location', {})
+    request_location = help_request.get('location', {})
+    if not (user_location.get('latitude') and user_location.get('longitude') and
+            request_location.get('latitude') and request_location.get('longitude')):
+        return None, None
+    distance = round(calculate_distance(
+        user_location['latitude'], user_location['longitude'],
+        request_location['latitude'], request_location['longitude']
+    ), 2)
+    score = None
+    if user['role'] == 'volunteer':
+        score = score_request(help_request, distance, user.get('skills', []), datetime.utcnow(), semantic_index)
+    return distance, score
+
+def request_view(help_request, distance, score):
+    """GET /requests/<id> body: the document with its id, distance and score"""
+    return REQUEST_SCHEMA.select(help_request, {'id': str(help_request['_id']), 'distance': distance,
+                                                'score': score})
 
 # Authentication endpoints
 @app.route('/auth/signup', methods=['POST'])
@@ -101,7 +504,7 @@ def signup():
         # Create user
         user_data = {
             'email': email,
-            'password_hash': generate_password_hash(password),
+            'password_hash': password_pool.hash(password),
             'name': name,
             'role': role,
             'phone': data.get('phone', ''),
@@ -112,7 +515,11 @@ def signup():
             'updated_at': datetime.utcnow()
         }
         
-        result = users_collection.insert_one(user_data)
+        try:
+            result = users_collection.insert_one(user_data)
+        except DuplicateKeyError:
+            # Lost a race with a concurrent signup for the same email
+            return jsonify({'error': 'User with this email already exists'}), 409
         user_id = str(result.inserted_id)
         
         # Create session
@@ -125,6 +532,8 @@ def signup():
             'role': role
         }), 201
         
+    except PoolSaturated as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -141,9 +550,19 @@ def login():
         
         # Find user
         user = users_collection.find_one({'email': email})
-        if not user or not check_password_hash(user['password_hash'], password):
+        if not user or not password_pool.check(user['password_hash'], password):
             return jsonify({'error': 'Invalid email or password'}), 401
         
+        # Upgrade hashes made with older cost parameters
+        if password_pool.needs_rehash(user['password_hash']):
+            try:
+                users_collection.update_one(
+                    {'_id': user['_id'], 'password_hash': user['password_hash']},
+                    {'$set': {'password_hash': password_pool.hash(password)}}
+                )
+            except PoolSaturated:
+                pass  # Try again on a later login
+        
         # Create session
         session['user_id'] = str(user['_id'])
         session['role'] = user['role']
@@ -155,6 +574,8 @@ def login():
             'name': user['name']
         }), 200
         
+    except PoolSaturated as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -209,6 +630,11 @@ def update_profile():
             {'$set': update_data}
         )
         
+        user_cache.invalidate(session['user_id'])
+        g.pop('current_user', None)
+        if 'location' in data or 'skills' in data:
+            suggestion_cache.invalidate(session['user_id'])
+        
         return jsonify({'message': 'Profile updated successfully'}), 200
         
     except Exception as e:
@@ -228,48 +654,96 @@ def create_request():
         if user['role'] != 'victim':
             return jsonify({'error': 'Only victims can create help requests'}), 403
         
-        # Validate required fields
-        required_fields = ['type', 'description', 'urgency']
-        for field in required_fields:
-            if not data.get(field):
-                return jsonify({'error': f'{field} is required'}), 400
-        
-        # Validate help type
-        valid_types = ['food', 'water', 'shelter', 'transport', 'medical', 'other']
-        if data['type'] not in valid_types:
-            return jsonify({'error': f'Type must be one of: {", ".join(valid_types)}'}), 400
-        
-        # Validate urgency
-        if data['urgency'] not in ['low', 'medium', 'high']:
-            return jsonify({'error': 'Urgency must be low, medium, or high'}), 400
-        
-        # Use user's location if not provided
-        location = data.get('location', user.get('location', {}))
-        if not location.get('latitude') or not location.get('longitude'):
-            return jsonify({'error': 'Location is required'}), 400
-        
-        request_data = {
-            'victim_id': ObjectId(session['user_id']),
-            'victim_name': user['name'],
-            'victim_phone': user.get('phone', ''),
-            'type': data['type'],
-            'description': data['description'],
-            'urgency': data['urgency'],
-            'location': location,
-            'status': 'pending',
-            'volunteer_id': None,
-            'volunteer_name': None,
-            'created_at': datetime.utcnow(),
-            'updated_at': datetime.utcnow(),
-            'fulfilled_at': None
-        }
+        try:
+            location = validate_request(data, user.get('location', {}))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        request_data = new_request(data, location, user, datetime.utcnow())
+        
+        match = dedup_index.find(request_data, signature(request_data['description'])) if dedup_index else None
+        if match and match[2] == str(user['_id']):
+            # The victim already has this request open: count the report there
+            if merge_report(match[0], request_data['urgency'], request_data['created_at']):
+                return jsonify({
+                    'message': 'Help request matches one you already have open',
+                    'request_id': match[0],
+                    'duplicate_of': match[0]
+                }), 200
+            dedup_index.remove(match[0])
+            match = None
+        if match:
+            # Maybe a neighbor reporting the same need: volunteers decide
+            request_data.update(possible_duplicate_of=ObjectId(match[0]), duplicate_similarity=match[1])
         
         result = requests_collection.insert_one(request_data)
+        bump_requests_version()
+        record(stats_collection, None, request_data)
+        if semantic_index:
+            semantic_index.submit([request_data])
+        publish_event(CREATED, request_data)
         
-        return jsonify({
-            'message': 'Help request created successfully',
-            'request_id': str(result.inserted_id)
-        }), 201
+        body = {'message': 'Help request created successfully', 'request_id': str(result.inserted_id)}
+        if match:
+            body['possible_duplicate_of'] = match[0]
+        return jsonify(body), 201
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/requests/bulk', methods=['POST'])
+@require_auth
+def bulk_create_requests():
+    """Create requests from a JSONL body, one request object per line"""
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        if user['role'] != 'victim':
+            return jsonify({'error': 'Only victims can create help requests'}), 403
+        
+        def on_inserted(docs):
+            bump_requests_version()
+            record_many(stats_collection, [(None, doc) for doc in docs])
+            if semantic_index:
+                semantic_index.submit(docs)
+            for doc in docs:
+                publish_event(CREATED, doc)
+        
+        report = ingest(request.stream, requests_collection, lambda records: [user] * len(records), on_inserted,
+                        dedup_index=dedup_index,
+                        merge=lambda request_id, doc: merge_report(request_id, doc['urgency'], doc['created_at']))
+        return jsonify(report.to_dict()), 207 if report.failed else 201
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/requests/export', methods=['GET'])
+@require_auth
+def export_requests():
+    """Stream requests as JSONL, filtered by status and a created_at window"""
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        # Victims export only their own requests, as in GET /requests
+        try:
+            query = export_query(
+                request.args.get('status'), request.args.get('since'), request.args.get('until'),
+                victim_id=user['_id'] if user['role'] == 'victim' else None
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Live requests first, then archived ones, each oldest first
+        tiers = [requests_collection, archive_collection] if archive_tiering() else [requests_collection]
+        return Response(
+            itertools.chain.from_iterable(export_lines(tier, query) for tier in tiers),
+            mimetype='application/x-ndjson',
+            headers={'Content-Disposition': 'attachment; filename="requests.jsonl"'}
+        )
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -282,113 +756,94 @@ def get_requests():
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Get query parameters
-        status = request.args.get('status')
-        help_type = request.args.get('type')
-        urgency = request.args.get('urgency')
-        max_distance = request.args.get('max_distance', type=float)
+        try:
+            pipeline, limit, geo_sorted = requests_pipeline(user, request.args, archive_tiering())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Build filter
-        filter_query = {}
+        # Unchanged unless a request was written or the user's profile moved
+        etag = make_etag(requests_version(), session['user_id'], user.get('updated_at'),
+                         request.query_string)
+        cached = not_modified(etag)
+        if cached:
+            return cached
         
-        if user['role'] == 'victim':
-            # Victims see only their own requests
-            filter_query['victim_id'] = ObjectId(session['user_id'])
-        else:
-            # Volunteers see all pending requests by default
-            if status:
-                filter_query['status'] = status
-            else:
-                filter_query['status'] = 'pending'
-        
-        if help_type:
-            filter_query['type'] = help_type
+        requests = requests_collection.aggregate(pipeline)
         
-        if urgency:
-            filter_query['urgency'] = urgency
+        # Without a limit, encode documents as the cursor yields them
+        if not limit:
+            body = stream_json_array(requests, lambda doc: app.json.encode(REQUEST_SCHEMA.select(doc)))
+            response = Response(body, mimetype='application/json')
+            response.set_etag(etag, weak=True)
+            return response
         
-        # Get requests
-        requests = list(requests_collection.find(filter_query).sort('created_at', -1))
+        items, next_cursor = finish_requests_page(list(requests), limit, geo_sorted)
         
-        # Calculate distances and filter by distance for volunteers
-        user_location = user.get('location', {})
-        if user['role'] == 'volunteer' and user_location.get('latitude') and user_location.get('longitude'):
-            for req in requests:
-                req_location = req.get('location', {})
-                if req_location.get('latitude') and req_location.get('longitude'):
-                    distance = calculate_distance(
-                        user_location['latitude'], user_location['longitude'],
-                        req_location['latitude'], req_location['longitude']
-                    )
-                    req['distance'] = round(distance, 2)
-                else:
-                    req['distance'] = None
-            
-            # Filter by max distance if specified
-            if max_distance:
-                requests = [req for req in requests if req.get('distance') and req['distance'] <= max_distance]
-            
-            # Sort by distance
-            requests.sort(key=lambda x: x.get('distance', float('inf')))
-        
-        # Convert ObjectIds to strings
-        for req in requests:
-            req['_id'] = str(req['_id'])
-            req['victim_id'] = str(req['victim_id'])
-            if req.get('volunteer_id'):
-                req['volunteer_id'] = str(req['volunteer_id'])
-        
-        return jsonify(requests), 200
+        response = jsonify(items)
+        response.set_etag(etag, weak=True)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response, 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/requests/<request_id>/volunteer', methods=['PUT'])
+@app.route('/requests/<request_id>', methods=['GET'])
 @require_auth
-def volunteer_for_request(request_id):
+def get_request(request_id):
     try:
         user = get_current_user()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        if user['role'] != 'volunteer':
-            return jsonify({'error': 'Only volunteers can offer help'}), 403
+        if not ObjectId.is_valid(request_id):
+            return jsonify({'error': 'Request not found'}), 404
         
-        # Find the request
-        help_request = requests_collection.find_one({'_id': ObjectId(request_id)})
+        help_request = find_request(request_id, {'geo': 0})
         if not help_request:
             return jsonify({'error': 'Request not found'}), 404
         
-        if help_request['status'] != 'pending':
-            return jsonify({'error': 'Request is no longer available'}), 400
+        # Victims see only their own requests
+        if user['role'] == 'victim' and str(help_request['victim_id']) != session['user_id']:
+            return jsonify({'error': 'Not authorized to view this request'}), 403
         
-        # Calculate distance
-        distance = None
-        user_location = user.get('location', {})
-        req_location = help_request.get('location', {})
+        # Distance and score for the caller
+        distance, score = distance_and_score(help_request, user)
         
-        if (user_location.get('latitude') and user_location.get('longitude') and
-            req_location.get('latitude') and req_location.get('longitude')):
-            distance = calculate_distance(
-                user_location['latitude'], user_location['longitude'],
-                req_location['latitude'], req_location['longitude']
-            )
+        etag = make_etag(request_id, help_request.get('updated_at'), distance, score)
+        cached = not_modified(etag)
+        if cached:
+            return cached
         
-        # Update request
-        requests_collection.update_one(
-            {'_id': ObjectId(request_id)},
-            {
-                '$set': {
-                    'status': 'in_progress',
-                    'volunteer_id': ObjectId(session['user_id']),
-                    'volunteer_name': user['name'],
-                    'volunteer_phone': user.get('phone', ''),
-                    'volunteer_distance': round(distance, 2) if distance else None,
-                    'volunteer_location': user.get('location', {}),
-                    'updated_at': datetime.utcnow()
-                }
-            }
-        )
+        response = jsonify(request_view(help_request, distance, score))
+        response.set_etag(etag, weak=True)
+        return response, 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/requests/<request_id>/volunteer', methods=['PUT'])
+@require_auth
+def volunteer_for_request(request_id):
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        if user['role'] != 'volunteer':
+            return jsonify({'error': 'Only volunteers can offer help'}), 403
+        
+        # Claim the request only if it is still pending
+        claimed = claim_request(requests_collection, ObjectId(request_id), ObjectId(session['user_id']), user)
+        if not claimed:
+            if not requests_collection.count_documents({'_id': ObjectId(request_id)}, limit=1):
+                return jsonify({'error': 'Request not found'}), 404
+            return jsonify({'error': 'Request is no longer available'}), 409
+        
+        bump_requests_version()
+        record(stats_collection, dict(claimed, status='pending', volunteer_id=None), claimed)
+        proposals_collection.delete_one({'_id': ObjectId(session['user_id'])})
+        publish_event(CLAIMED, claimed)
         
         return jsonify({'message': 'Successfully volunteered for request'}), 200
         
@@ -412,6 +867,8 @@ def update_request_status(request_id):
         # Find the request
         help_request = requests_collection.find_one({'_id': ObjectId(request_id)})
         if not help_request:
+            if archive_collection.find_one({'_id': ObjectId(request_id)}, {'_id': 1}):
+                return jsonify({'error': 'Cannot change status of archived request'}), 400
             return jsonify({'error': 'Request not found'}), 404
         
         # Check permissions
@@ -427,6 +884,9 @@ def update_request_status(request_id):
         if current_status == 'fulfilled':
             return jsonify({'error': 'Cannot change status of fulfilled request'}), 400
         
+        if current_status == DUPLICATE and new_status not in ['pending', 'cancelled']:
+            return jsonify({'error': 'A duplicate request can only be reopened or cancelled'}), 400
+        
         if new_status == 'fulfilled' and not is_victim:
             return jsonify({'error': 'Only the victim can mark request as fulfilled'}), 403
         
@@ -438,24 +898,111 @@ def update_request_status(request_id):
         
         if new_status == 'fulfilled':
             update_data['fulfilled_at'] = datetime.utcnow()
+        elif new_status == 'pending' and current_status == DUPLICATE:
+            # The victim says it is a separate need
+            update_data['duplicate_of'] = None
         elif new_status == 'pending':
             # Reset volunteer assignment
             update_data['volunteer_id'] = None
             update_data['volunteer_name'] = None
             update_data['volunteer_phone'] = None
             update_data['volunteer_distance'] = None
+            update_data['claimed_at'] = None
         
         requests_collection.update_one(
             {'_id': ObjectId(request_id)},
             {'$set': update_data}
         )
+        if new_status != current_status:
+            settle_duplicates(request_id, new_status, update_data['updated_at'])
+        bump_requests_version()
+        record(stats_collection, help_request, dict(help_request, **update_data))
+        
+        if new_status == 'pending' and current_status == DUPLICATE and semantic_index:
+            semantic_index.submit([help_request])
+        publish_event(status_event(new_status), dict(help_request, **update_data))
         
         return jsonify({'message': 'Request status updated successfully'}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/stats', methods=['GET'])
+@require_auth
+def get_stats():
+    """Dashboard counters for the caller, everyone and the caller's map cell"""
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        scopes = {'user': f"{user['role']}:{user['_id']}", 'all': 'all'}
+        cell = cell_scope(user.get('location'))
+        if cell:
+            scopes['cell'] = cell
+        
+        # Hourly windows roll over even without writes
+        now = datetime.utcnow()
+        etag = make_etag('stats', sorted(scopes.values()), requests_version(), now.strftime('%Y-%m-%dT%H'))
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        docs = {doc['_id']: doc for doc in stats_collection.find({'_id': {'$in': list(scopes.values())}})}
+        response = jsonify({name: summarize(docs.get(scope), now) for name, scope in scopes.items()})
+        response.set_etag(etag, weak=True)
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Map and suggestions
+def beyond_radius_query(user_skills, min_score):
+    """Filter for pending requests past SUGGESTION_RADIUS_KM that could outscore min_score"""
+    bonus_ceiling = AGE_SCORES[0][1] + (SEMANTIC_MATCH_SCORE if semantic_index else 0)
+    any_type = [u for u, points in URGENCY_SCORES.items() if points + bonus_ceiling > min_score]
+    skill_only = [u for u, points in URGENCY_SCORES.items()
+                  if u not in any_type and points + SKILL_MATCH_SCORE + bonus_ceiling > min_score]
+    
+    clauses = []
+    if any_type:
+        clauses.append({'urgency': {'$in': any_type}})
+    if skill_only and user_skills:
+        clauses.append({'urgency': {'$in': skill_only}, 'type': {'$in': user_skills}})
+    if not clauses:
+        return None
+    return {'status': 'pending', '$or': clauses}
+
+def rank_for_volunteer(user_location, user_skills, now, k):
+    """Best k (doc, distance, score) tuples among pending requests"""
+    # Score pending requests within the outermost distance bucket first
+    nearby = list(requests_collection.aggregate([
+        geo_near_stage(user_location, {'status': 'pending'}, SUGGESTION_RADIUS_KM),
+        SUGGESTION_FIELDS_STAGE
+    ]))
+    with metrics.phase('rank'):
+        ranked = rank_candidates(
+            CandidateSet.from_documents(nearby, semantic_index), user_location, user_skills, now, k
+        )
+    
+    # Requests further out score only on urgency, skills and age, so only
+    # those whose ceiling beats the current k-th candidate are fetched
+    min_score = ranked[k - 1][2] if len(ranked) >= k else -1
+    beyond_query = beyond_radius_query(user_skills, min_score)
+    if beyond_query:
+        beyond = list(requests_collection.aggregate([
+            geo_near_stage(user_location, beyond_query, min_distance=SUGGESTION_RADIUS_KM),
+            SUGGESTION_FIELDS_STAGE
+        ]))
+        if beyond:
+            with metrics.phase('rank'):
+                ranked = rank_candidates(
+                    CandidateSet.from_documents(nearby + beyond, semantic_index),
+                    user_location, user_skills, now, k
+                )
+    
+    return ranked
+
 @app.route('/map/data', methods=['GET'])
 @require_auth
 def get_map_data():
@@ -464,61 +1011,102 @@ def get_map_data():
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Get query parameters
-        help_type = request.args.get('type')
-        urgency = request.args.get('urgency')
-        max_distance = request.args.get('max_distance', type=float)
+        try:
+            pipeline, limit, geo_sorted = map_pipeline(user, request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Build filter
-        filter_query = {'status': 'pending'}
+        user_location = user.get('location', {})
+        etag = make_etag(requests_version(), session['user_id'], user.get('updated_at'),
+                         request.query_string)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        pins = requests_collection.aggregate(pipeline)
+        
+        # Without a limit, encode pins as the cursor yields them
+        if not limit:
+            def generate():
+                yield b'{"requests":'
+                yield from stream_json_array(pins, lambda pin: app.json.encode(MAP_PIN_SCHEMA.select(pin)))
+                yield b',"user_location":' + app.json.encode(user_location) + b'}'
+            response = Response(generate(), mimetype='application/json')
+            response.set_etag(etag, weak=True)
+            return response
+        
+        items, next_cursor = finish_map_page(list(pins), limit, geo_sorted)
+        
+        response = jsonify({
+            'requests': items,
+            'user_location': user_location,
+            'next_cursor': next_cursor
+        })
+        response.set_etag(etag, weak=True)
+        return response, 200
         
-        if help_type:
-            filter_query['type'] = help_type
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/map/tiles/<int:zoom>/<int:x>/<int:y>', methods=['GET'])
+@require_auth
+def get_map_tile(zoom, x, y):
+    try:
+        if not (0 <= zoom <= MAX_ZOOM and 0 <= x < 2 ** zoom and 0 <= y < 2 ** zoom):
+            return jsonify({'error': 'Tile out of range'}), 400
         
-        if urgency:
-            filter_query['urgency'] = urgency
+        types = split_param('type')
+        urgencies = split_param('urgency')
         
-        # Get requests
-        requests = list(requests_collection.find(filter_query))
+        # Tiles are the same for every user, so revisits revalidate cheaply
+        etag = make_etag(tile_index.generation, zoom, x, y, tile_index.version(zoom, x, y), types, urgencies)
+        cached = not_modified(etag)
+        if cached:
+            return cached
         
-        # Calculate distances and prepare map data
-        user_location = user.get('location', {})
-        map_data = []
-        
-        for req in requests:
-            req_location = req.get('location', {})
-            if not (req_location.get('latitude') and req_location.get('longitude')):
-                continue
-            
-            distance = None
-            if user_location.get('latitude') and user_location.get('longitude'):
-                distance = calculate_distance(
-                    user_location['latitude'], user_location['longitude'],
-                    req_location['latitude'], req_location['longitude']
-                )
-            
-            # Filter by distance if specified
-            if max_distance and distance and distance > max_distance:
-                continue
-            
-            map_data.append({
-                'id': str(req['_id']),
-                'type': req['type'],
-                'urgency': req['urgency'],
-                'description': req['description'][:100] + '...' if len(req['description']) > 100 else req['description'],
-                'location': req_location,
-                'distance': round(distance, 2) if distance else None,
-                'created_at': req['created_at'].isoformat()
-            })
-        
-        # Sort by distance if available
-        if user_location.get('latitude') and user_location.get('longitude'):
-            map_data.sort(key=lambda x: x.get('distance', float('inf')))
+        response = jsonify(dict(tile_index.tile(zoom, x, y, types, urgencies), zoom=zoom, x=x, y=y))
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response, 200
         
-        return jsonify({
-            'requests': map_data,
-            'user_location': user_location
-        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/map/clusters', methods=['GET'])
+@require_auth
+def get_map_clusters():
+    try:
+        zoom = request.args.get('zoom', type=int)
+        try:
+            west, south, east, north = [float(v) for v in split_param('bbox') or []]
+        except ValueError:
+            return jsonify({'error': 'bbox must be west,south,east,north'}), 400
+        if zoom is None or not 0 <= zoom <= MAX_ZOOM:
+            return jsonify({'error': f'zoom must be between 0 and {MAX_ZOOM}'}), 400
+        if west > east or south > north:
+            return jsonify({'error': 'bbox must be west,south,east,north'}), 400
+        
+        tiles = tiles_in_bbox(west, south, east, north, zoom)
+        if len(tiles) > MAX_BBOX_TILES:
+            return jsonify({'error': 'bbox covers too many tiles at this zoom'}), 400
+        
+        types = split_param('type')
+        urgencies = split_param('urgency')
+        
+        etag = make_etag(tile_index.generation, zoom, types, urgencies,
+                         [(x, y, tile_index.version(zoom, x, y)) for x, y in tiles])
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        result = {'zoom': zoom}
+        for x, y in tiles:
+            for kind, items in tile_index.tile(zoom, x, y, types, urgencies).items():
+                result.setdefault(kind, []).extend(items)
+        
+        response = jsonify(result)
+        response.set_etag(etag, weak=True)
+        return response, 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -541,73 +1129,208 @@ def get_suggestions():
         # Get user skills
         user_skills = user.get('skills', [])
         
-        # Get all pending requests
-        requests = list(requests_collection.find({'status': 'pending'}))
-        
-        suggestions = []
-        for req in requests:
-            req_location = req.get('location', {})
-            if not (req_location.get('latitude') and req_location.get('longitude')):
-                continue
-            
-            distance = calculate_distance(
-                user_location['latitude'], user_location['longitude'],
-                req_location['latitude'], req_location['longitude']
-            )
-            
-            # Calculate relevance score
-            score = 0
-            
-            # Distance score (closer = higher score)
-            if distance <= 5:
-                score += 50
-            elif distance <= 15:
-                score += 30
-            elif distance <= 30:
-                score += 15
-            else:
-                score += 0
-            
-            # Urgency score
-            urgency_scores = {'high': 30, 'medium': 20, 'low': 10}
-            score += urgency_scores.get(req['urgency'], 0)
-            
-            # Skills match score
-            if user_skills and req['type'] in user_skills:
-                score += 20
-            
-            # Time score (newer requests get slight boost)
-            hours_old = (datetime.utcnow() - req['created_at']).total_seconds() / 3600
-            if hours_old < 2:
-                score += 10
-            elif hours_old < 6:
-                score += 5
-            
-            suggestions.append({
-                'id': str(req['_id']),
-                'type': req['type'],
-                'urgency': req['urgency'],
-                'description': req['description'],
-                'victim_name': req['victim_name'],
-                'location': req_location,
-                'distance': round(distance, 2),
-                'score': score,
-                'created_at': req['created_at'].isoformat()
-            })
-        
-        # Sort by score (highest first)
-        suggestions.sort(key=lambda x: x['score'], reverse=True)
+        now = datetime.utcnow()
+        suggestions = suggestion_cache.get(session['user_id'], now)
+        if suggestions is None:
+            ranked = rank_for_volunteer(user_location, user_skills, now, suggestion_cache.depth)
+            suggestion_cache.put(session['user_id'], user_location, user_skills, ranked, now)
+            suggestions = [suggestion_from(*item) for item in ranked[:SUGGESTION_LIMIT]]
+        
+        # Scores move with request age, so validate on what was ranked
+        etag = make_etag([(s['id'], s['score'], s['distance']) for s in suggestions])
+        cached = not_modified(etag)
+        if cached:
+            return cached
         
         # Return top 10 suggestions
-        return jsonify(suggestions[:10]), 200
+        response = jsonify(suggestions)
+        response.set_etag(etag, weak=True)
+        return response, 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/dispatch/proposal', methods=['GET'])
+@require_auth
+def get_dispatch_proposal():
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        if user['role'] != 'volunteer':
+            return jsonify({'error': 'Only volunteers receive proposals'}), 403
+        
+        # Latest dispatch run's request for this volunteer, if still open
+        proposal = proposals_collection.find_one({'_id': ObjectId(session['user_id'])})
+        if not proposal:
+            return jsonify({'error': 'No proposal'}), 404
+        
+        help_request = requests_collection.find_one(
+            {'_id': proposal['request_id'], 'status': 'pending'},
+            SUGGESTION_FIELDS_STAGE['$project']
+        )
+        if not help_request:
+            return jsonify({'error': 'Proposed request is no longer available'}), 404
+        
+        suggestion = suggestion_from(help_request, proposal['distance'], proposal['score'])
+        suggestion['proposed_at'] = proposal['proposed_at'].isoformat()
+        return jsonify(suggestion), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Live updates
+@app.route('/events', methods=['GET'])
+@require_auth
+def stream_events():
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        radius = request.args.get('radius', type=float)
+        user_location = user.get('location', {})
+        if radius and not (user_location.get('latitude') and user_location.get('longitude')):
+            return jsonify({'error': 'Location is required for radius filtering'}), 400
+        
+        subscription = event_bus.subscribe(
+            last_event_id=request.headers.get('Last-Event-ID', type=int),
+            types=split_param('type'),
+            urgencies=split_param('urgency'),
+            center=user_location if user_location.get('latitude') and user_location.get('longitude') else None,
+            radius=radius,
+            # Victims only follow their own requests
+            victim_id=session['user_id'] if user['role'] == 'victim' else None,
+            user_id=session['user_id']
+        )
+        
+        return Response(
+            stream_with_context(sse_stream(event_bus, subscription)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/events/stats', methods=['GET'])
+@require_auth
+def get_event_stats():
+    return jsonify(event_bus.stats()), 200
+
+@app.route('/cache/stats', methods=['GET'])
+@require_auth
+def get_cache_stats():
+    return jsonify({
+        'users': user_cache.stats(),
+        'suggestions': suggestion_cache.stats(),
+        'tiles': tile_index.stats(),
+        'dedup': dedup_index.stats() if dedup_index else None,
+        'password_hashing': password_pool.stats(),
+        'embeddings': semantic_index.stats() if semantic_index else None
+    }), 200
+
+@app.route('/admission/stats', methods=['GET'])
+@require_auth
+def get_admission_stats():
+    return jsonify(admission.stats()), 200
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.exposition(), mimetype='text/plain; version=0.0.4')
+
 # Health check
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()}), 200
 
+def maintain_collections():
+    """One-off upkeep of the stored data, off the startup path"""
+    try:
+        backfill_geo_points(requests_collection)
+        ensure_indexes(db)
+        if ARCHIVE_AFTER_HOURS:
+            ensure_archive(db)
+            # Finished requests leave the live collection; they are neither in the
+            # tile index nor in cached suggestions, so only ETags need to change
+            start_archiver(requests_collection, archive_collection, timedelta(hours=float(ARCHIVE_AFTER_HOURS)),
+                           float(os.getenv('ARCHIVE_INTERVAL', 300)),
+                           on_moved=lambda moved: bump_requests_version())
+        if STATS_RECONCILE_INTERVAL or stats_collection.find_one({'_id': 'all'}, {'_id': 1}) is None:
+            # Counters start from the stored requests, then only need occasional repair
+            start_reconciler([requests_collection, archive_collection], stats_collection,
+                             float(STATS_RECONCILE_INTERVAL) if STATS_RECONCILE_INTERVAL else None)
+        start_pruner(stats_collection, float(os.getenv('STATS_PRUNE_INTERVAL', 3600)))
+    except PyMongoError:
+        app.logger.exception('Startup maintenance failed')
+
+def reoffer_embedded(request_ids):
+    # Semantic points only rise once a description is embedded
+    now = datetime.utcnow()
+    for doc in requests_collection.find({'_id': {'$in': request_ids}, 'status': 'pending'}, {'geo': 0}):
+        suggestion_cache.add_request(doc, now)
+
+STATS_RECONCILE_INTERVAL = os.getenv('STATS_RECONCILE_INTERVAL')
+_started_pid = None
+_startup_failed_pid = None
+_startup_lock = threading.Lock()
+
+def create_app():
+    """Start this process's workers, caches and background threads; returns the app
+
+    Importing this module only declares things: the MongoDB client is built
+    on the first query, and nothing is started. Call create_app() once per
+    serving process, before taking traffic: serve.py, asgi.py and
+    gunicorn.conf.py (post_fork) do. Until it has run, every route but
+    /health answers 503. It runs again in a forked child, so each worker of
+    a pre-fork server starts its own.
+
+    A failed startup is logged and recorded, not retried: the process keeps
+    answering 503 and /health, and should be restarted.
+    """
+    global _started_pid, _startup_failed_pid
+    pid = os.getpid()
+    if pid in (_started_pid, _startup_failed_pid):
+        return app
+    with _startup_lock:
+        if pid in (_started_pid, _startup_failed_pid):
+            return app
+        try:
+            start_process()
+        except Exception:
+            app.logger.exception('Startup failed')
+            _startup_failed_pid = pid
+            return app
+        _started_pid = pid
+    return app
+
+def start_process():
+    """What create_app() starts"""
+    global semantic_index
+    # Hash workers are forked before this process starts any threads of its own
+    password_pool.start()
+    semantic_index = suggestion_cache.semantic = semantic_index_from_env()
+    tile_index.load(requests_collection)
+    if dedup_index:
+        dedup_index.load(requests_collection)
+    threading.Thread(target=maintain_collections, daemon=True).start()
+    if profiler:
+        profiler.start()
+    explain_rate = float(os.getenv('EXPLAIN_SAMPLE_RATE', 0.01))
+    if explain_rate > 0:
+        metrics.start_explainer(mongo, explain_rate)
+    if EVENT_SOURCE == 'change_stream':
+        start_change_stream_watcher(requests_collection, event_bus)
+    if semantic_index:
+        semantic_index.start(
+            backlog=lambda: requests_collection.find({'status': 'pending'}, {'type': 1, 'description': 1}),
+            on_embedded=reoffer_embedded,
+            on_ready=suggestion_cache.clear
+        )
+    if os.getenv('DISPATCH_INTERVAL'):
+        start_dispatcher(requests_collection, users_collection, proposals_collection, event_bus,
+                         float(os.getenv('DISPATCH_INTERVAL')), semantic_index)
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""Hot/cold tiering: archiving finished requests out of the live collection.
+
+Fulfilled and cancelled requests that have not changed for
+ARCHIVE_AFTER_HOURS are moved, in background batches, from `requests` to
+`requests_archive`. The live collection then holds only open work and
+recent history, and its indexes stay small enough to remain in memory
+however long an incident lasts. The archive collection has the same
+indexes and is created with zstd block compression.
+
+A batch first upserts the documents into the archive, then deletes them
+from the live collection, but only if they are still finished and still
+old enough. A request reopened in between (cancelled -> pending) stays
+live and its archive copy is removed. A crash part-way through leaves at
+worst a copy in both tiers, which the next batch finishes moving.
+
+Reads that can reach finished requests query both tiers: a victim's own
+history, listings filtered on a finished status, and single-request
+lookups. Archived requests are read-only.
+
+Run a pass by hand with `python backend/archive.py`, or set
+ARCHIVE_AFTER_HOURS to run it from a thread in the app every
+ARCHIVE_INTERVAL seconds.
+"""
+from datetime import datetime, timedelta
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+from pymongo import ReplaceOne
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from indexes import REQUEST_INDEXES, drop_superseded
+
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_COLLECTION = 'requests_archive'
+TERMINAL_STATUSES = ['fulfilled', 'cancelled']
+DEFAULT_BATCH_SIZE = 1000
+
+
+def ensure_archive(db):
+    """Create the archive collection, compressed and with the live indexes, if missing"""
+    try:
+        db.create_collection(
+            ARCHIVE_COLLECTION,
+            storageEngine={'wiredTiger': {'configString': 'block_compressor=zstd'}}
+        )
+    except CollectionInvalid:
+        pass
+    archive_collection = db[ARCHIVE_COLLECTION]
+    # Archived requests are read with the same queries as live ones
+    archive_collection.create_indexes(REQUEST_INDEXES)
+    drop_superseded(archive_collection)
+    return archive_collection
+
+
+def archivable_query(cutoff):
+    return {'status': {'$in': TERMINAL_STATUSES}, 'updated_at': {'$lt': cutoff}}
+
+
+def archive_batch(requests_collection, archive_collection, cutoff, batch_size=DEFAULT_BATCH_SIZE):
+    """Move one batch of finished requests older than cutoff; returns how many moved"""
+    docs = list(requests_collection.find(archivable_query(cutoff)).limit(batch_size))
+    if not docs:
+        return 0
+    ids = [doc['_id'] for doc in docs]
+
+    archive_collection.bulk_write([ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in docs],
+                                  ordered=False)
+    result = requests_collection.delete_many(dict(archivable_query(cutoff), _id={'$in': ids}))
+
+    if result.deleted_count < len(ids):
+        # Reopened since the copy was taken: the live document wins
+        still_live = [doc['_id'] for doc in requests_collection.find({'_id': {'$in': ids}}, {'_id': 1})]
+        if still_live:
+            archive_collection.delete_many({'_id': {'$in': still_live}})
+    return result.deleted_count
+
+
+def archive_requests(requests_collection, archive_collection, after, batch_size=DEFAULT_BATCH_SIZE,
+                     on_moved=None):
+    """Move every finished request untouched for `after`; returns the total moved"""
+    cutoff = datetime.utcnow() - after
+    total = 0
+    while True:
+        moved = archive_batch(requests_collection, archive_collection, cutoff, batch_size)
+        total += moved
+        if moved and on_moved:
+            on_moved(moved)
+        if moved < batch_size:
+            return total
+
+
+def archive_loop(requests_collection, archive_collection, after, interval, on_moved=None):
+    while True:
+        try:
+            moved = archive_requests(requests_collection, archive_collection, after, on_moved=on_moved)
+            if moved:
+                logger.info('Archived %d requests', moved)
+        except PyMongoError:
+            logger.exception('Archive pass failed')
+        time.sleep(interval)
+
+
+def start_archiver(requests_collection, archive_collection, after, interval, on_moved=None):
+    thread = threading.Thread(
+        target=archive_loop,
+        args=(requests_collection, archive_collection, after, interval, on_moved),
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo.mongo_client import MongoClient
+    from pymongo.server_api import ServerApi
+
+    parser = argparse.ArgumentParser(description='Run one archive pass')
+    parser.add_argument('--after-hours', type=float, default=float(os.getenv('ARCHIVE_AFTER_HOURS', 72)))
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = MongoClient(os.getenv('MONGO_URI_STRING'), server_api=ServerApi('1'))['Database']
+    start = time.perf_counter()
+    moved = archive_requests(db['requests'], ensure_archive(db), timedelta(hours=args.after_hours),
+                             args.batch_size)
+    if moved:
+        db['counters'].update_one({'_id': 'requests'}, {'$inc': {'version': 1}}, upsert=True)
+    print(f'{moved} requests archived in {time.perf_counter() - start:.2f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    sys.exit(main())
@@ -0,0 +1,370 @@
+"""Async (ASGI) serving mode.
+
+Serves the same routes and JSON as the Flask app. The read-heavy and
+streaming endpoints are native async handlers on an AsyncMongoClient:
+GET /requests, /requests/<id>, /map/data, /events and /health. While they
+wait on MongoDB or on events, they do not hold a thread. Every other route
+is handed to the Flask app through asgiref's WSGI adapter, which runs it in
+a thread pool, behind the same admission control as in WSGI mode. Both
+halves share the session cookie, caches, tile index and event bus of this
+process.
+
+Run it with `python serve.py --mode asgi`, or directly with
+`uvicorn asgi:application`. The async client's pool is tuned with
+ASYNC_MONGO_MAX_POOL, ASYNC_MONGO_MIN_POOL and
+ASYNC_MONGO_WAIT_QUEUE_TIMEOUT_MS. The async handlers bound their load
+through that pool rather than through admission control: a request that
+cannot get a connection in time fails fast instead of queueing without
+bound.
+"""
+import asyncio
+from datetime import datetime
+import os
+import queue
+
+from asgiref.wsgi import WsgiToAsgi
+from bson.objectid import ObjectId
+from pymongo import AsyncMongoClient
+from pymongo.server_api import ServerApi
+from quart import Quart, Response, g, jsonify, request, session
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+
+from app import (
+    MONGO_URI_STRING, USER_PROJECTION, app as flask_app, cached_archive_tiering, create_app,
+    distance_and_score, event_bus, finish_map_page, finish_requests_page, make_etag, map_pipeline, metrics,
+    password_pool, record_archive_count, request_view, requests_pipeline, split_param, startup_error, user_cache
+)
+from archive import ARCHIVE_COLLECTION
+from clients import LazyClient
+from events import format_sse
+from pagination import astream_json_array
+from projections import MAP_PIN_SCHEMA, REQUEST_SCHEMA
+
+
+# Built on the first query, once per process (see clients.py)
+asyncMongoClient = LazyClient(lambda: AsyncMongoClient(
+    MONGO_URI_STRING,
+    server_api=ServerApi('1'),
+    maxPoolSize=int(os.getenv('ASYNC_MONGO_MAX_POOL', 100)),
+    minPoolSize=int(os.getenv('ASYNC_MONGO_MIN_POOL', 10)),
+    maxIdleTimeMS=60000,
+    waitQueueTimeoutMS=int(os.getenv('ASYNC_MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000)),
+    event_listeners=[metrics.command_listener]
+))
+db = asyncMongoClient["Database"]
+users_collection = db["users"]
+requests_collection = db["requests"]
+counters_collection = db["counters"]
+archive_collection = db[ARCHIVE_COLLECTION]
+
+async_app = Quart(__name__)
+# Same key and cookie as the Flask app, so either half can read the session
+async_app.secret_key = flask_app.secret_key
+async_app.config['SESSION_COOKIE_NAME'] = flask_app.config['SESSION_COOKIE_NAME']
+
+
+@async_app.before_serving
+async def start_app():
+    # Hash workers are forked from the main thread, before any thread of ours
+    # exists; the rest of startup runs off the loop
+    try:
+        password_pool.start()
+    except Exception:
+        # create_app() tries again, and records the failure
+        flask_app.logger.exception('Starting password hashing failed')
+    await asyncio.to_thread(create_app)
+    if startup_error() is None:
+        await archive_tiering()
+
+
+@async_app.before_request
+async def require_started():
+    if request.endpoint == 'health_check':
+        return None
+    error = startup_error()
+    if error:
+        return jsonify({'error': error}), 503
+
+
+@async_app.before_request
+async def start_request_metrics():
+    g.request_stats = metrics.start_request()
+
+@async_app.after_request
+async def finish_request_metrics(response):
+    # Streamed bodies are still being sent here, so only their setup is timed
+    stats = g.get('request_stats')
+    if stats is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.finish_request(stats, request.method, route, response.status_code)
+    return response
+
+@async_app.after_request
+async def add_cors_headers(response):
+    """What flask_cors adds on the Flask side (credentials, reflected origin)"""
+    origin = request.headers.get('Origin')
+    if origin:
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.headers['Access-Control-Allow-Credentials'] = 'true'
+        response.headers['Access-Control-Expose-Headers'] = 'X-Next-Cursor'
+        response.vary.add('Origin')
+    return response
+
+
+# Helper functions
+def json_response(data, status=200):
+    """Encode with the Flask app's JSON provider so both modes return identical bodies"""
+    return Response(flask_app.json.encode(data), status=status, mimetype='application/json')
+
+async def requests_version():
+    """Counter bumped on every write to the requests collection"""
+    counter = await counters_collection.find_one({'_id': 'requests'})
+    return counter['version'] if counter else 0
+
+async def archive_tiering():
+    """app.archive_tiering(), counting the archive on the async client when a check is due"""
+    tiered = cached_archive_tiering()
+    if tiered is None:
+        tiered = record_archive_count(await archive_collection.estimated_document_count())
+    return tiered
+
+def not_modified(etag):
+    """304 response if the client already holds etag, else None"""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response('', status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+def require_auth(f):
+    """Decorator to require authentication"""
+    async def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return jsonify({'error': 'Authentication required'}), 401
+        return await f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+async def get_current_user():
+    """Get current user from session, memoized for the rest of the request"""
+    if 'user_id' not in session:
+        return None
+    if 'current_user' not in g:
+        user = user_cache.peek(session['user_id'])
+        if user is None:
+            user = await users_collection.find_one({'_id': ObjectId(session['user_id'])}, USER_PROJECTION)
+            if user is not None:
+                user_cache.put(session['user_id'], user)
+        g.current_user = user
+    return g.current_user
+
+
+@async_app.route('/requests', methods=['GET'])
+@require_auth
+async def get_requests():
+    try:
+        user = await get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+
+        try:
+            pipeline, limit, geo_sorted = requests_pipeline(user, request.args, await archive_tiering())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        etag = make_etag(await requests_version(), session['user_id'], user.get('updated_at'),
+                         request.query_string)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        requests = await requests_collection.aggregate(pipeline)
+
+        if not limit:
+            body = astream_json_array(requests, lambda doc: flask_app.json.encode(REQUEST_SCHEMA.select(doc)))
+            response = Response(body, mimetype='application/json')
+            response.set_etag(etag, weak=True)
+            return response
+
+        items, next_cursor = finish_requests_page(await requests.to_list(), limit, geo_sorted)
+
+        response = json_response(items)
+        response.set_etag(etag, weak=True)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@async_app.route('/requests/<request_id>', methods=['GET'])
+@require_auth
+async def get_request(request_id):
+    try:
+        user = await get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+
+        if not ObjectId.is_valid(request_id):
+            return jsonify({'error': 'Request not found'}), 404
+
+        help_request = await requests_collection.find_one({'_id': ObjectId(request_id)}, {'geo': 0})
+        if help_request is None:
+            help_request = await archive_collection.find_one({'_id': ObjectId(request_id)}, {'geo': 0})
+        if not help_request:
+            return jsonify({'error': 'Request not found'}), 404
+
+        if user['role'] == 'victim' and str(help_request['victim_id']) != session['user_id']:
+            return jsonify({'error': 'Not authorized to view this request'}), 403
+
+        distance, score = distance_and_score(help_request, user)
+
+        etag = make_etag(request_id, help_request.get('updated_at'), distance, score)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        response = json_response(request_view(help_request, distance, score))
+        response.set_etag(etag, weak=True)
+        return response
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@async_app.route('/map/data', methods=['GET'])
+@require_auth
+async def get_map_data():
+    try:
+        user = await get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+
+        try:
+            pipeline, limit, geo_sorted = map_pipeline(user, request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        user_location = user.get('location', {})
+        etag = make_etag(await requests_version(), session['user_id'], user.get('updated_at'),
+                         request.query_string)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        pins = await requests_collection.aggregate(pipeline)
+
+        if not limit:
+            async def generate():
+                yield b'{"requests":'
+                encode = flask_app.json.encode
+                async for chunk in astream_json_array(pins, lambda pin: encode(MAP_PIN_SCHEMA.select(pin))):
+                    yield chunk
+                yield b',"user_location":' + flask_app.json.encode(user_location) + b'}'
+            response = Response(generate(), mimetype='application/json')
+            response.set_etag(etag, weak=True)
+            return response
+
+        items, next_cursor = finish_map_page(await pins.to_list(), limit, geo_sorted)
+
+        response = json_response({
+            'requests': items,
+            'user_location': user_location,
+            'next_cursor': next_cursor
+        })
+        response.set_etag(etag, weak=True)
+        return response
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+async def async_sse_stream(bus, subscription, wakeup, heartbeat=15):
+    """sse_stream for the event loop: waits on wakeup instead of blocking a thread"""
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            if subscription.overflowed and subscription.queue.empty():
+                yield f'id: {bus.last_event_id}\nevent: resync\ndata: {{}}\n\n'
+                return
+            try:
+                event, distance = subscription.queue.get_nowait()
+            except queue.Empty:
+                wakeup.clear()
+                # An event may have landed between get_nowait and clear
+                if subscription.queue.empty() and not subscription.overflowed:
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), heartbeat)
+                    except asyncio.TimeoutError:
+                        yield ': keepalive\n\n'
+                continue
+            bus.delivered()
+            yield format_sse(event, distance)
+    finally:
+        bus.unsubscribe(subscription)
+
+@async_app.route('/events', methods=['GET'])
+@require_auth
+async def stream_events():
+    try:
+        user = await get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+
+        radius = request.args.get('radius', type=float)
+        user_location = user.get('location', {})
+        if radius and not (user_location.get('latitude') and user_location.get('longitude')):
+            return jsonify({'error': 'Location is required for radius filtering'}), 400
+
+        # Events are published from worker threads; hop onto the loop to wake the stream
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        subscription = event_bus.subscribe(
+            last_event_id=request.headers.get('Last-Event-ID', type=int),
+            types=split_param('type'),
+            urgencies=split_param('urgency'),
+            center=user_location if user_location.get('latitude') and user_location.get('longitude') else None,
+            radius=radius,
+            victim_id=session['user_id'] if user['role'] == 'victim' else None,
+            user_id=session['user_id'],
+            notify=lambda: loop.call_soon_threadsafe(wakeup.set)
+        )
+
+        response = Response(
+            async_sse_stream(event_bus, subscription, wakeup),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        response.timeout = None
+        return response
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@async_app.route('/health', methods=['GET'])
+async def health_check():
+    return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()}), 200
+
+
+wsgi_fallback = WsgiToAsgi(flask_app.wsgi_app)
+_async_routes = async_app.url_map.bind('localhost')
+_flask_routes = flask_app.url_map.bind('localhost')
+
+
+def handled_async(scope):
+    """True if the async app has the handler Flask would route this request to"""
+    if scope['method'] not in ('GET', 'HEAD'):
+        return False
+    try:
+        endpoint, _ = _async_routes.match(scope['path'], method=scope['method'])
+        flask_endpoint, _ = _flask_routes.match(scope['path'], method=scope['method'])
+    except (NotFound, MethodNotAllowed):
+        return False
+    # e.g. /requests/export is a route of its own in Flask, not /requests/<request_id>
+    return endpoint == flask_endpoint
+
+
+async def application(scope, receive, send):
+    """ASGI entry point: async handlers where they exist, the Flask app otherwise"""
+    if scope['type'] == 'http' and not handled_async(scope):
+        await wsgi_fallback(scope, receive, send)
+    else:
+        await async_app(scope, receive, send)
@@ -0,0 +1,152 @@
+"""Concurrency harness for PUT /requests/<id>/volunteer claims.
+
+Fires many simultaneous claims at a handful of pending requests and checks
+that each request is claimed exactly once, then reports claim latency
+percentiles. Runs the old find/check/update sequence alongside the atomic
+claim so the difference is visible.
+
+Usage:
+    python backend/benchmarks/bench_claims.py                      # in-memory stand-in
+    python backend/benchmarks/bench_claims.py --mongo-uri mongodb://localhost:27017
+
+The in-memory stand-in is mongomock with a lock around each operation,
+modelling MongoDB's single-document atomicity, plus a simulated round trip;
+only real MongoDB latencies are meaningful.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson.objectid import ObjectId  # noqa: E402
+
+from claims import claim_request  # noqa: E402
+
+
+class LockedCollection:
+    """mongomock collection whose operations are individually atomic
+
+    Each call first sleeps for a simulated network round trip, outside the
+    lock, so interleavings look like they would against a real server.
+    """
+
+    def __init__(self, collection, rtt):
+        self._collection = collection
+        self._lock = threading.Lock()
+        self._rtt = rtt
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            time.sleep(self._rtt)
+            with self._lock:
+                return attr(*args, **kwargs)
+        return locked
+
+
+def legacy_claim(collection, request_id, volunteer_id, volunteer):
+    """The previous find_one / status check / update_one sequence"""
+    help_request = collection.find_one({'_id': request_id})
+    if not help_request or help_request['status'] != 'pending':
+        return None
+    collection.update_one(
+        {'_id': request_id},
+        {'$set': {'status': 'in_progress', 'volunteer_id': volunteer_id,
+                  'volunteer_name': volunteer['name'], 'updated_at': datetime.utcnow()}}
+    )
+    return collection.find_one({'_id': request_id})
+
+
+def seed(collection, n_requests):
+    collection.delete_many({})
+    ids = [ObjectId() for _ in range(n_requests)]
+    collection.insert_many([{
+        '_id': request_id,
+        'type': 'medical',
+        'urgency': 'high',
+        'description': 'bench',
+        'location': {'latitude': 29.76, 'longitude': -95.37},
+        'status': 'pending',
+        'created_at': datetime.utcnow()
+    } for request_id in ids])
+    return ids
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(collection, claim, n_requests, n_volunteers):
+    request_ids = seed(collection, n_requests)
+    volunteers = [(ObjectId(), {'name': f'volunteer {i}', 'phone': '', 'location': {}})
+                  for i in range(n_volunteers)]
+    barrier = threading.Barrier(n_volunteers)
+
+    def attempt(i):
+        volunteer_id, volunteer = volunteers[i]
+        request_id = request_ids[i % n_requests]
+        barrier.wait()
+        start = time.perf_counter()
+        claimed = claim(collection, request_id, volunteer_id, volunteer)
+        return request_id, volunteer_id, claimed is not None, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=n_volunteers) as pool:
+        results = list(pool.map(attempt, range(n_volunteers)))
+
+    winners = {}
+    for request_id, volunteer_id, won, _ in results:
+        if won:
+            winners.setdefault(request_id, []).append(volunteer_id)
+
+    # Exactly once: one winner per request, and it is the one stored
+    exactly_once = all(
+        len(winners.get(request_id, [])) == 1 and
+        collection.find_one({'_id': request_id})['volunteer_id'] == winners[request_id][0]
+        for request_id in request_ids
+    )
+    latencies = [r[3] * 1000 for r in results]
+    return {
+        'claims': len(results),
+        'winners': sum(len(w) for w in winners.values()),
+        'exactly_once': exactly_once,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p90_ms': round(percentile(latencies, 90), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(max(latencies), 3),
+        'mean_ms': round(statistics.mean(latencies), 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mongo-uri', help='run against a real MongoDB instead of the in-memory stand-in')
+    parser.add_argument('--requests', type=int, default=10)
+    parser.add_argument('--volunteers', type=int, default=300)
+    parser.add_argument('--rtt-ms', type=float, default=1.0, help='simulated round trip for the stand-in')
+    args = parser.parse_args()
+
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        collection = MongoClient(args.mongo_uri)['cascade_bench']['claims']
+    else:
+        import mongomock
+        collection = LockedCollection(mongomock.MongoClient()['cascade_bench']['claims'],
+                                      args.rtt_ms / 1000)
+
+    for name, claim in [('legacy', legacy_claim), ('atomic', claim_request)]:
+        result = run(collection, claim, args.requests, args.volunteers)
+        print(name, ' '.join(f'{key}={value}' for key, value in result.items()))
+
+
+if __name__ == '__main__':
+    main()
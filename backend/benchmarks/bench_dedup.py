@@ -0,0 +1,191 @@
+"""Benchmark: near-duplicate detection on synthetic requests.
+
+Builds pending requests around a city center. Each request has a
+description of 6 to 20 words from a shared vocabulary, so unrelated
+requests of the same type often share words. A fraction of them
+(--dup-rate) get copies sent as separate requests. Each copy is moved
+by up to 150 m and has its text altered in one of these ways: words
+dropped, words added, a few typos, or the words reordered.
+
+Another fraction (--neighbor-rate) get a neighbor: a different household
+within 150 m asking for the same type of help in a short stock phrase
+("need water"), as the request itself then does. Neighbors are separate
+needs, not copies. Short texts like these are where MinHash cannot tell
+two people apart, which is why the app only annotates cross-victim
+matches (see dedup.py).
+
+For each threshold, sweep() runs over the requests and copies in
+creation order, as `python backend/dedup.py` does. It reports:
+
+- precision: the share of flagged requests that are copies;
+- recall: the share of copies that are flagged;
+- neighbors: the share of neighbors wrongly flagged;
+- sweep/s: requests per second through the sweep, signatures included.
+
+Then, with every request indexed, it times signature(), find() and add()
+one request at a time. It gives the median and p99 in µs.
+
+Usage: python backend/benchmarks/bench_dedup.py [--requests 20000] [--dup-rate 0.2] [--neighbor-rate 0.05]
+       [thresholds...]
+"""
+from datetime import datetime, timedelta
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup import DEFAULT_THRESHOLD, DedupIndex, signature, sweep  # noqa: E402
+
+TYPES = ['food', 'water', 'shelter', 'transport', 'medical', 'other']
+WORDS = ['need', 'help', 'family', 'flooded', 'road', 'elderly', 'insulin', 'water', 'ride', 'hospital',
+         'roof', 'tarp', 'baby', 'formula', 'stranded', 'oxygen', 'groceries', 'blankets', 'dog', 'medicine',
+         'mother', 'generator', 'power', 'out', 'since', 'yesterday', 'apartment', 'second', 'floor', 'car',
+         'wheelchair', 'diapers', 'three', 'kids', 'no', 'food', 'left', 'shelter', 'please', 'urgent',
+         'street', 'blocked', 'trees', 'down', 'cannot', 'leave', 'house', 'neighbor', 'sick', 'fever']
+STOCK_PHRASES = {
+    'food': ['need food', 'need food for family', 'no food left'],
+    'water': ['need water', 'need drinking water', 'need water please'],
+    'shelter': ['need shelter', 'house flooded need shelter', 'need a place to stay'],
+    'transport': ['need a ride', 'need ride to hospital', 'stranded need ride'],
+    'medical': ['need medicine', 'need insulin', 'need a doctor'],
+    'other': ['need help', 'please help', 'need help urgent']
+}
+
+
+def jitter(lat, lon, meters, rng):
+    """A point up to meters away from (lat, lon)"""
+    distance, bearing = meters * math.sqrt(rng.random()), rng.uniform(0, 2 * math.pi)
+    dlat = distance * math.cos(bearing) / 111320
+    dlon = distance * math.sin(bearing) / (111320 * math.cos(math.radians(lat)))
+    return lat + dlat, lon + dlon
+
+
+def typo(word, rng):
+    if len(word) < 3:
+        return word
+    i = rng.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def reword(words, rng):
+    """The words of a description as someone else might write it"""
+    words = list(words)
+    change = rng.choice(['drop', 'add', 'typo', 'reorder'])
+    if change == 'drop':
+        for _ in range(max(1, len(words) // 5)):
+            words.pop(rng.randrange(len(words)))
+    elif change == 'add':
+        for _ in range(max(1, len(words) // 5)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(WORDS))
+    elif change == 'typo':
+        for i in rng.sample(range(len(words)), max(1, len(words) // 6)):
+            words[i] = typo(words[i], rng)
+    else:
+        rng.shuffle(words)
+    return words
+
+
+def make_requests(n, dup_rate, neighbor_rate, rng):
+    """(docs, {copy id: id of the request it copies}, ids of the neighbors)"""
+    started = datetime.utcnow() - timedelta(days=1)
+    docs, copies, neighbors = [], {}, set()
+    for i in range(n):
+        lat, lon = 29.76 + rng.gauss(0, 0.1), -95.37 + rng.gauss(0, 0.1)
+        kind = rng.choice(TYPES)
+        has_neighbor = rng.random() < neighbor_rate
+        if has_neighbor:
+            words = rng.choice(STOCK_PHRASES[kind]).split()
+        else:
+            words = rng.choices(WORDS, k=rng.randint(6, 20))
+        doc = {
+            '_id': f'r{i}',
+            'victim_id': f'v{i}',
+            'type': kind,
+            'description': ' '.join(words),
+            'location': {'latitude': lat, 'longitude': lon},
+            'status': 'pending',
+            'created_at': started + timedelta(seconds=i)
+        }
+        docs.append(doc)
+        if rng.random() < dup_rate:
+            copy_lat, copy_lon = jitter(lat, lon, 150, rng)
+            copy = dict(doc, _id=f'd{i}', victim_id=f'w{i}', description=' '.join(reword(words, rng)),
+                        location={'latitude': copy_lat, 'longitude': copy_lon},
+                        created_at=doc['created_at'] + timedelta(minutes=rng.uniform(1, 60)))
+            docs.append(copy)
+            copies[copy['_id']] = doc['_id']
+        if has_neighbor:
+            neighbor_lat, neighbor_lon = jitter(lat, lon, 150, rng)
+            neighbor = dict(doc, _id=f'n{i}', victim_id=f'n{i}', description=rng.choice(STOCK_PHRASES[kind]),
+                            location={'latitude': neighbor_lat, 'longitude': neighbor_lon},
+                            created_at=doc['created_at'] + timedelta(minutes=rng.uniform(1, 60)))
+            docs.append(neighbor)
+            neighbors.add(neighbor['_id'])
+    return docs, copies, neighbors
+
+
+def percentile(values, fraction):
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def time_each(fn, items):
+    """µs per call of fn on each item"""
+    times = []
+    for item in items:
+        started = time.perf_counter()
+        fn(item)
+        times.append((time.perf_counter() - started) * 1e6)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('thresholds', nargs='*', type=float, default=[0.3, 0.4, DEFAULT_THRESHOLD, 0.6, 0.7])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--dup-rate', type=float, default=0.2)
+    parser.add_argument('--neighbor-rate', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    docs, copies, neighbors = make_requests(args.requests, args.dup_rate, args.neighbor_rate, rng)
+    print(f'{len(docs)} requests, {len(copies)} of them copies, {len(neighbors)} neighbors')
+
+    print(f"{'threshold':>9} {'flagged':>8} {'precision':>9} {'recall':>7} {'neighbors':>9} {'sweep/s':>9}")
+    for threshold in sorted(args.thresholds):
+        index = DedupIndex(threshold=threshold)
+        started = time.perf_counter()
+        found = sweep(docs, index)
+        seconds = time.perf_counter() - started
+        flagged = {doc['_id'] for doc, *_ in found}
+        hits = len(flagged & copies.keys())
+        precision = hits / len(flagged) if flagged else 1.0
+        recall = hits / len(copies) if copies else 1.0
+        wrong = len(flagged & neighbors) / len(neighbors) if neighbors else 0.0
+        print(f'{threshold:>9.2f} {len(flagged):>8} {precision:>9.3f} {recall:>7.3f} {wrong:>9.3f} '
+              f'{len(docs) / seconds:>9.0f}')
+
+    index = DedupIndex()
+    sigs = {doc['_id']: signature(doc['description']) for doc in docs}
+    for doc in docs:
+        index.add(doc, sigs[doc['_id']])
+    probes = rng.sample(docs, min(2000, len(docs)))
+    rows = [
+        ('signature', time_each(lambda doc: signature(doc['description']), probes)),
+        ('find', time_each(lambda doc: index.find(doc, sigs[doc['_id']]), probes)),
+        ('add', time_each(lambda doc: index.add(doc, sigs[doc['_id']]), probes))
+    ]
+    stats = index.stats()
+    print(f"\n{stats['indexed']} indexed in {stats['buckets']} buckets")
+    print(f"{'step':>9} {'median µs':>10} {'p99 µs':>8}")
+    for name, times in rows:
+        print(f'{name:>9} {statistics.median(times):>10.1f} {percentile(times, 0.99):>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Dispatch at surge sizes: pull-based suggestions vs greedy vs global assignment.
+
+For each (volunteers, requests) size, volunteers and requests are scattered
+around one city. Three policies are compared:
+
+- pull: every volunteer takes their own top suggestion, as /suggestions does
+  today; volunteers landing on the same request are counted as collisions;
+- greedy: volunteers in random order each take their best request that is
+  still free;
+- dispatch: the auction from dispatch.py.
+
+The dual bound column is an upper bound on the best possible total score, computed
+from the auction prices. It equals the dispatch total when the assignment is
+optimal. `--verify` also checks the auction against exhaustive search on
+small random instances.
+
+Usage: python backend/benchmarks/bench_dispatch.py [--verify] [VOLUNTEERSxREQUESTS ...]
+"""
+from datetime import datetime, timedelta
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from dispatch import auction, candidate_edges  # noqa: E402
+from scoring import CandidateSet  # noqa: E402
+
+TYPES = ['food', 'water', 'shelter', 'transport', 'medical', 'other']
+URGENCIES = ['low', 'medium', 'high']
+CENTER = (29.76, -95.37)
+
+
+def make_requests(n, rng, now):
+    return [{
+        '_id': i,
+        'type': rng.choice(TYPES),
+        'urgency': rng.choice(URGENCIES),
+        'location': {
+            'latitude': CENTER[0] + rng.gauss(0, 0.3),
+            'longitude': CENTER[1] + rng.gauss(0, 0.3)
+        },
+        'created_at': now - timedelta(minutes=rng.uniform(0, 12 * 60))
+    } for i in range(n)]
+
+
+def make_volunteers(m, rng):
+    return [(CENTER[0] + rng.gauss(0, 0.3), CENTER[1] + rng.gauss(0, 0.3), rng.sample(TYPES, 2))
+            for _ in range(m)]
+
+
+def pull(indptr, cols, scores):
+    """Total score and collisions when each volunteer takes their own best request"""
+    taken = {}
+    for i in range(len(indptr) - 1):
+        if indptr[i] < indptr[i + 1]:
+            # Rows are ordered best first
+            taken.setdefault(cols[indptr[i]], []).append(scores[indptr[i]])
+    total = sum(max(s) for s in taken.values())
+    collisions = sum(len(s) - 1 for s in taken.values())
+    return total, len(taken), collisions
+
+
+def greedy(indptr, cols, scores, rng):
+    order = list(range(len(indptr) - 1))
+    rng.shuffle(order)
+    free_taken = set()
+    total = 0
+    for i in order:
+        for e in range(indptr[i], indptr[i + 1]):
+            if cols[e] not in free_taken:
+                free_taken.add(cols[e])
+                total += scores[e]
+                break
+    return total, len(free_taken)
+
+
+def assignment_total(indptr, cols, scores, assignment):
+    total = 0
+    for i in np.flatnonzero(assignment >= 0):
+        row = slice(indptr[i], indptr[i + 1])
+        total += int(scores[row][cols[row] == assignment[i]][0])
+    return total
+
+
+def dual_bound(indptr, cols, scores, prices):
+    """Upper bound on the optimal total from the auction prices"""
+    scale = len(indptr)
+    bound = int(prices.sum())
+    for i in range(len(indptr) - 1):
+        row = slice(indptr[i], indptr[i + 1])
+        if indptr[i] < indptr[i + 1]:
+            bound += max(int((scores[row] * scale - prices[cols[row]]).max()), 0)
+    return bound / scale
+
+
+def exhaustive(indptr, cols, scores):
+    m = len(indptr) - 1
+    options = [[(None, 0)] + [(cols[e], scores[e]) for e in range(indptr[i], indptr[i + 1])]
+               for i in range(m)]
+    best = 0
+    for choice in itertools.product(*options):
+        objects = [c for c, _ in choice if c is not None]
+        if len(objects) == len(set(objects)):
+            best = max(best, sum(s for _, s in choice))
+    return best
+
+
+def verify(trials, rng):
+    """Auction total vs exhaustive search on small dense instances"""
+    for trial in range(trials):
+        m, n = rng.randint(1, 5), rng.randint(1, 6)
+        rows = [sorted(rng.sample(range(n), rng.randint(0, n))) for _ in range(m)]
+        indptr = np.cumsum([0] + [len(r) for r in rows])
+        cols = np.array([c for r in rows for c in r], dtype=np.intp)
+        scores = np.array([rng.choice([25, 40, 55, 60, 75, 110]) for _ in cols], dtype=np.int64)
+        assignment, _ = auction(indptr, cols, scores, n)
+        got, expected = assignment_total(indptr, cols, scores, assignment), exhaustive(indptr, cols, scores)
+        if got != expected:
+            print(f'trial {trial}: auction {got} != exhaustive {expected}')
+            return False
+    print(f'{trials} small instances: auction matches exhaustive search')
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sizes', nargs='*', default=['1000x10000', '2000x20000', '5000x50000'])
+    parser.add_argument('--verify', action='store_true')
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    if args.verify and not verify(300, rng):
+        return 1
+
+    print(f"{'size':>12} {'edges':>8} {'edges s':>8} {'solve s':>8} "
+          f"{'pull total':>11} {'covered':>8} {'collide':>8} {'greedy':>8} {'covered':>8} "
+          f"{'dispatch':>9} {'covered':>8} {'dual bound':>11}")
+    for size in args.sizes:
+        m, n = (int(x) for x in size.split('x'))
+        now = datetime.utcnow()
+        candidates = CandidateSet.from_documents(make_requests(n, rng, now))
+        volunteers = make_volunteers(m, rng)
+
+        start = time.perf_counter()
+        indptr, cols, scores, _ = candidate_edges(candidates, volunteers, now)
+        edges_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        assignment, prices = auction(indptr, cols, scores, n)
+        solve_time = time.perf_counter() - start
+
+        pull_total, pull_covered, collisions = pull(indptr, cols, scores)
+        greedy_total, greedy_covered = greedy(indptr, cols, scores, rng)
+        total = assignment_total(indptr, cols, scores, assignment)
+        bound = dual_bound(indptr, cols, scores, prices)
+
+        print(f"{size:>12} {len(cols):>8} {edges_time:>8.2f} {solve_time:>8.2f} "
+              f"{pull_total:>11} {pull_covered:>8} {collisions:>8} {greedy_total:>8} {greedy_covered:>8} "
+              f"{total:>9} {int((assignment >= 0).sum()):>8} {bound:>11.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Bytes transferred and client CPU per request: Python shaping vs pipeline pushdown.
+
+Seeds a scratch database with synthetic pending requests, then runs the
+/map/data, /requests and /suggestions fetches both ways:
+
+- before: fetch whole documents and reshape them in Python, as the
+  endpoints used to;
+- after: the $project/$set stages from projections.py.
+
+Bytes are the BSON size of the documents returned; CPU is process time
+spent fetching and shaping. Needs a local MongoDB (the pipeline operators
+are not implemented by mongomock).
+
+Usage: python backend/benchmarks/bench_projection.py [--mongo-uri URI] [--requests N]
+"""
+from datetime import datetime, timedelta
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bson  # noqa: E402
+from bson.objectid import ObjectId  # noqa: E402
+from pymongo import GEOSPHERE, MongoClient  # noqa: E402
+
+from projections import SUGGESTION_FIELDS_STAGE, map_pin_stage, request_stages  # noqa: E402
+
+TYPES = ['food', 'water', 'shelter', 'transport', 'medical', 'other']
+URGENCIES = ['low', 'medium', 'high']
+CENTER = (29.76, -95.37)
+NEAR = {'type': 'Point', 'coordinates': [CENTER[1], CENTER[0]]}
+
+
+def seed(collection, n, rng):
+    collection.drop()
+    now = datetime.utcnow()
+    docs = []
+    for _ in range(n):
+        lat, lon = CENTER[0] + rng.gauss(0, 0.2), CENTER[1] + rng.gauss(0, 0.2)
+        docs.append({
+            'victim_id': ObjectId(),
+            'victim_name': 'Synthetic Victim',
+            'victim_phone': '+1 555 0100',
+            'type': rng.choice(TYPES),
+            'description': ' '.join(rng.choice(['water', 'roof', 'flooded', 'need', 'help', 'insulin',
+                                                'children', 'elderly', 'road', 'blocked'])
+                                    for _ in range(rng.randint(5, 60))),
+            'urgency': rng.choice(URGENCIES),
+            'location': {'latitude': lat, 'longitude': lon, 'address': f'{lat:.6f}, {lon:.6f}'},
+            'geo': {'type': 'Point', 'coordinates': [lon, lat]},
+            'status': 'pending',
+            'volunteer_id': None,
+            'volunteer_name': None,
+            'created_at': now - timedelta(minutes=rng.uniform(0, 600)),
+            'updated_at': now,
+            'fulfilled_at': None
+        })
+    collection.insert_many(docs)
+    collection.create_index([('geo', GEOSPHERE)])
+
+
+def geo_near():
+    return {'$geoNear': {'near': NEAR, 'key': 'geo', 'distanceField': 'distance', 'spherical': True,
+                         'distanceMultiplier': 6371 / 6378100, 'query': {'status': 'pending'}}}
+
+
+def old_map(collection):
+    out = []
+    fetched = list(collection.aggregate([geo_near()]))
+    for req in fetched:
+        distance = req.get('distance')
+        out.append({
+            'id': str(req['_id']), 'type': req['type'], 'urgency': req['urgency'],
+            'description': req['description'][:100] + '...' if len(req['description']) > 100 else req['description'],
+            'location': req['location'], 'distance': round(distance, 2) if distance else None,
+            'created_at': req['created_at'].isoformat()
+        })
+    return fetched, out
+
+
+def new_map(collection):
+    fetched = list(collection.aggregate([geo_near(), map_pin_stage()]))
+    return fetched, fetched
+
+
+def old_requests(collection):
+    fetched = list(collection.aggregate([geo_near()]))
+    for req in fetched:
+        req['distance'] = round(req['distance'], 2)
+    out = []
+    for req in fetched:
+        req = dict(req)
+        req.pop('geo', None)
+        req['_id'] = str(req['_id'])
+        req['victim_id'] = str(req['victim_id'])
+        if req.get('volunteer_id'):
+            req['volunteer_id'] = str(req['volunteer_id'])
+        out.append(req)
+    return fetched, out
+
+
+def new_requests(collection):
+    fetched = list(collection.aggregate([geo_near()] + request_stages(True)))
+    return fetched, fetched
+
+
+def old_suggestions(collection):
+    fetched = list(collection.aggregate([geo_near()]))
+    return fetched, fetched
+
+
+def new_suggestions(collection):
+    fetched = list(collection.aggregate([geo_near(), SUGGESTION_FIELDS_STAGE]))
+    return fetched, fetched
+
+
+def measure(fn, collection, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.process_time()
+        fetched, _ = fn(collection)
+        best = min(best, time.process_time() - start)
+    return sum(len(bson.encode(doc)) for doc in fetched), best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017')
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    collection = MongoClient(args.mongo_uri)['cascade_bench']['projection']
+    seed(collection, args.requests, random.Random(7))
+
+    print(f"{'endpoint':<13} {'bytes before':>13} {'bytes after':>12} {'saved':>6} "
+          f"{'cpu ms before':>14} {'cpu ms after':>13}")
+    for name, before, after in [('/map/data', old_map, new_map),
+                                ('/requests', old_requests, new_requests),
+                                ('/suggestions', old_suggestions, new_suggestions)]:
+        bytes_before, cpu_before = measure(before, collection, args.repeat)
+        bytes_after, cpu_after = measure(after, collection, args.repeat)
+        print(f"{name:<13} {bytes_before:>13} {bytes_after:>12} {1 - bytes_after / bytes_before:>6.0%} "
+              f"{cpu_before * 1000:>14.1f} {cpu_after * 1000:>13.1f}")
+
+    collection.drop()
+
+
+if __name__ == '__main__':
+    main()
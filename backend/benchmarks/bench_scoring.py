@@ -0,0 +1,91 @@
+"""Micro-benchmark: per-document suggestion loop vs the vectorized engine.
+
+- loop: the original per-document scoring, sort and slice;
+- load: CandidateSet.from_documents, which get_suggestions pays on every
+  request that misses the suggestion cache;
+- vector: scoring and top-k on the loaded set;
+- speedup: loop against load plus vector, which is what the live path
+  pays; score-only leaves the load out.
+
+Usage: python backend/benchmarks/bench_scoring.py [sizes...]
+"""
+from datetime import datetime, timedelta
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scoring import (  # noqa: E402
+    SUGGESTION_LIMIT, CandidateSet, calculate_distance, score_request, top_k
+)
+
+TYPES = ['food', 'water', 'shelter', 'transport', 'medical', 'other']
+URGENCIES = ['low', 'medium', 'high']
+CENTER = (29.76, -95.37)
+
+
+def make_requests(n, rng):
+    now = datetime.utcnow()
+    return [{
+        '_id': i,
+        'type': rng.choice(TYPES),
+        'urgency': rng.choice(URGENCIES),
+        'description': 'synthetic request',
+        'victim_name': 'victim',
+        'location': {
+            'latitude': CENTER[0] + rng.gauss(0, 0.3),
+            'longitude': CENTER[1] + rng.gauss(0, 0.3)
+        },
+        'created_at': now - timedelta(minutes=rng.uniform(0, 12 * 60))
+    } for i in range(n)]
+
+
+def per_document(requests, lat, lon, skills, now):
+    """The original get_suggestions loop: score everything, sort, slice"""
+    scored = []
+    for i, req in enumerate(requests):
+        distance = calculate_distance(lat, lon, req['location']['latitude'], req['location']['longitude'])
+        scored.append((score_request(req, distance, skills, now), i))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return [i for _, i in scored[:SUGGESTION_LIMIT]]
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(sizes):
+    rng = random.Random(42)
+    skills = ['food', 'medical']
+    lat, lon = CENTER
+    volunteers = [(CENTER[0] + rng.gauss(0, 0.3), CENTER[1] + rng.gauss(0, 0.3), rng.sample(TYPES, 2))
+                  for _ in range(100)]
+
+    print(f"{'requests':>9} {'loop ms':>9} {'load ms':>9} {'vector ms':>10} {'speedup':>8} "
+          f"{'score-only':>11} {'100 vols ms':>12} {'match':>6}")
+    for n in sizes:
+        requests = make_requests(n, rng)
+        now = datetime.utcnow()
+        repeat = 5 if n <= 10000 else 2
+
+        loop_time, expected = best_of(lambda: per_document(requests, lat, lon, skills, now), repeat)
+        load_time, candidates = best_of(lambda: CandidateSet.from_documents(requests), repeat)
+        vector_time, ranked = best_of(
+            lambda: top_k(candidates.score(lat, lon, skills, now)[0]).tolist(), repeat
+        )
+        batch_time, _ = best_of(lambda: top_k(candidates.score_many(volunteers, now)[0]), 1)
+
+        print(f"{n:>9} {loop_time * 1000:>9.2f} {load_time * 1000:>9.2f} {vector_time * 1000:>10.2f} "
+              f"{loop_time / (load_time + vector_time):>7.1f}x {loop_time / vector_time:>10.1f}x "
+              f"{batch_time * 1000:>12.2f} {str(ranked == expected):>6}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
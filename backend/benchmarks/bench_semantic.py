@@ -0,0 +1,91 @@
+"""Micro-benchmark: the semantic term in suggestion scoring, offline.
+
+Embeds synthetic request descriptions with the local hashing provider, then
+times, for each size:
+
+- embed: embedding every description in batches (done in the background
+  by the app, never on a suggestion call);
+- lookup: finding the stored vectors for a candidate set by content hash;
+- score: CandidateSet.score for one volunteer, without and with the term;
+- 100 vols: CandidateSet.score_many for 100 volunteers with the term;
+
+and checks that the vectorized scores match score_request.
+
+Usage: python backend/benchmarks/bench_semantic.py [sizes...]
+"""
+from datetime import datetime, timedelta
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embeddings import HashingEmbedder, SemanticIndex, VectorStore  # noqa: E402
+from scoring import CandidateSet, calculate_distance, score_request  # noqa: E402
+
+TYPES = ['food', 'water', 'shelter', 'transport', 'medical', 'other']
+URGENCIES = ['low', 'medium', 'high']
+CENTER = (29.76, -95.37)
+WORDS = ['need', 'help', 'family', 'flooded', 'road', 'elderly', 'insulin', 'water', 'ride', 'hospital',
+         'roof', 'tarp', 'baby', 'formula', 'stranded', 'oxygen', 'groceries', 'blankets', 'dog', 'medicine']
+
+
+def make_requests(n, rng):
+    now = datetime.utcnow()
+    return [{
+        '_id': i,
+        'type': rng.choice(TYPES),
+        'urgency': rng.choice(URGENCIES),
+        'description': ' '.join(rng.choices(WORDS, k=rng.randint(4, 16))) + f' #{i}',
+        'victim_name': 'victim',
+        'location': {
+            'latitude': CENTER[0] + rng.gauss(0, 0.3),
+            'longitude': CENTER[1] + rng.gauss(0, 0.3)
+        },
+        'created_at': now - timedelta(minutes=rng.uniform(0, 12 * 60))
+    } for i in range(n)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main(sizes):
+    rng = random.Random(42)
+    lat, lon = CENTER
+    skills = ['medical', 'transport']
+    volunteers = [(CENTER[0] + rng.gauss(0, 0.3), CENTER[1] + rng.gauss(0, 0.3), rng.sample(TYPES, 2))
+                  for _ in range(100)]
+
+    print(f"{'requests':>9} {'embed ms':>9} {'lookup ms':>10} {'score ms':>9} {'+term ms':>9} "
+          f"{'100 vols ms':>12} {'match':>6}")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for n in sizes:
+            requests = make_requests(n, rng)
+            now = datetime.utcnow()
+            embedder = HashingEmbedder()
+            semantic = SemanticIndex(embedder, VectorStore(embedder.dim, os.path.join(cache_dir, f'{n}.vec')))
+
+            embed_time, _ = timed(lambda: semantic.warm(requests))
+            lookup_time, candidates = timed(lambda: CandidateSet.from_documents(requests, semantic))
+            plain = CandidateSet.from_documents(requests)
+            plain_time, _ = timed(lambda: plain.score(lat, lon, skills, now))
+            term_time, (scores, _) = timed(lambda: candidates.score(lat, lon, skills, now))
+            batch_time, _ = timed(lambda: candidates.score_many(volunteers, now))
+
+            sample = range(0, n, max(1, n // 200))
+            expected = [score_request(requests[i], calculate_distance(
+                lat, lon, requests[i]['location']['latitude'], requests[i]['location']['longitude']
+            ), skills, now, semantic) for i in sample]
+            match = expected == [int(scores[i]) for i in sample]
+
+            print(f"{n:>9} {embed_time * 1000:>9.1f} {lookup_time * 1000:>10.2f} {plain_time * 1000:>9.2f} "
+                  f"{term_time * 1000:>9.2f} {batch_time * 1000:>12.2f} {str(match):>6}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,146 @@
+"""Micro-benchmark: encoding a GET /requests page, old path against new.
+
+Builds synthetic request documents shaped the way the requests pipeline
+returns them: string ids, BSON dates as datetimes, and the raw distance
+`_d` that pages keep for their cursor. Then, for each page size, times:
+
+- flask: the previous path. It pops `_d` from every document, then
+  encodes with Flask's default JSON provider (sort_keys, the standard
+  library) and encodes the str to bytes;
+- json: REQUEST_SCHEMA.select_many, then dumps() on the standard library
+  fallback;
+- orjson: the same on orjson, when it is installed;
+
+and, for the orjson body, gzip and brotli (when installed) at the levels
+the app uses. Throughput is bytes of JSON out per second. The best of
+--repeat runs is reported. Peak KB is the most memory traced (tracemalloc)
+above the input while one encode runs. All the paths must produce the same
+JSON.
+
+Usage: python backend/benchmarks/bench_serialization.py [--repeat 5] [sizes...]
+"""
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson.objectid import ObjectId  # noqa: E402
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from compression import ResponseCompression, brotli  # noqa: E402
+from projections import REQUEST_SCHEMA  # noqa: E402
+from serialization import json_dumps, orjson_dumps  # noqa: E402
+
+TYPES = ['food', 'water', 'shelter', 'transport', 'medical', 'other']
+URGENCIES = ['low', 'medium', 'high']
+WORDS = ['need', 'help', 'family', 'flooded', 'road', 'elderly', 'insulin', 'water', 'ride', 'hospital',
+         'roof', 'tarp', 'baby', 'formula', 'stranded', 'oxygen', 'groceries', 'blankets', 'dog', 'medicine']
+
+
+def make_page(n, rng):
+    now = datetime.utcnow()
+    page = []
+    for i in range(n):
+        created = now - timedelta(minutes=rng.uniform(0, 12 * 60))
+        distance = rng.uniform(0, 50)
+        page.append({
+            '_id': str(ObjectId()),
+            'victim_id': str(ObjectId()),
+            'victim_name': f'victim {i}',
+            'victim_phone': '555-0100',
+            'type': rng.choice(TYPES),
+            'description': ' '.join(rng.choices(WORDS, k=rng.randint(4, 24))),
+            'urgency': rng.choice(URGENCIES),
+            'location': {'latitude': 29.76 + rng.gauss(0, 0.3), 'longitude': -95.37 + rng.gauss(0, 0.3)},
+            'status': 'pending',
+            'volunteer_id': None,
+            'volunteer_name': None,
+            'created_at': created,
+            'updated_at': created,
+            'fulfilled_at': None,
+            'distance': round(distance, 2),
+            '_d': distance
+        })
+    return page
+
+
+def flask_path(provider):
+    def encode(page):
+        for req in page:
+            req.pop('_d', None)
+        return provider.dumps(page).encode()
+    return encode
+
+
+def schema_path(dumps):
+    return lambda page: dumps(REQUEST_SCHEMA.select_many(page))
+
+
+def measure(encode, page, repeat):
+    """(best seconds, output bytes, peak KB traced, output)"""
+    best = float('inf')
+    for _ in range(repeat):
+        # The old path pops `_d`, so each run gets fresh dicts
+        docs = [dict(doc) for doc in page]
+        started = time.perf_counter()
+        output = encode(docs)
+        best = min(best, time.perf_counter() - started)
+
+    docs = [dict(doc) for doc in page]
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    encode(docs)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return best, len(output), peak / 1024, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    provider = DefaultJSONProvider(Flask(__name__))
+    paths = [('flask', flask_path(provider)), ('json', schema_path(json_dumps))]
+    if orjson_dumps:
+        paths.append(('orjson', schema_path(orjson_dumps)))
+    compression = ResponseCompression()
+    encodings = ['gzip', 'br'] if brotli else ['gzip']
+
+    print(f"{'docs':>7} {'path':>8} {'ms':>9} {'MB/s':>8} {'peak KB':>9} {'bytes':>10} {'same':>5}")
+    for n in args.sizes:
+        page = make_page(n, rng)
+        expected = None
+        body = None
+        for name, encode in paths:
+            seconds, size, peak, output = measure(encode, page, args.repeat)
+            parsed = json.loads(output)
+            if expected is None:
+                expected = parsed
+            body = output
+            print(f'{n:>7} {name:>8} {seconds * 1000:>9.2f} {size / seconds / 1e6:>8.1f} {peak:>9.0f} '
+                  f'{size:>10} {str(parsed == expected):>5}')
+        for encoding in encodings:
+            best = float('inf')
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                compressed = compression.compress(encoding, body)
+                best = min(best, time.perf_counter() - started)
+            print(f'{n:>7} {encoding:>8} {best * 1000:>9.2f} {len(body) / best / 1e6:>8.1f} {"":>9} '
+                  f'{len(compressed):>10} {"":>5}')
+    if not brotli:
+        print('brotli is not installed; br was skipped')
+
+
+if __name__ == '__main__':
+    main()
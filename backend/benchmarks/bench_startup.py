@@ -0,0 +1,146 @@
+"""Startup benchmark: import time and time to first response.
+
+Each run starts a fresh interpreter that times, in order:
+
+- import: `import app`, which only declares routes, clients and caches;
+- start: create_app(), which forks the hash workers, loads the embedding
+  cache and the tile index, and starts the background threads;
+- /health: the first response, through the test client;
+- first query: the first response that reads MongoDB (a failed login).
+
+With no --mongo-uri, the app's client is swapped for mongomock after the
+import is timed, so the import still includes pymongo. --serve also times
+`python serve.py` from spawn until /health answers over HTTP; it needs
+--mongo-uri. --importtime lists the slowest modules from
+`python -X importtime -c "import app"`.
+
+Usage: python backend/benchmarks/bench_startup.py [--runs 5] [--mongo-uri URI] [--serve] [--importtime]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STEPS = ['import', 'start', 'health', 'query']
+
+
+def probe(mongo_uri):
+    """Runs in the child: prints step timings in ms as JSON"""
+    sys.path.insert(0, BACKEND)
+    timings = {}
+    started = time.perf_counter()
+
+    def lap(step):
+        nonlocal started
+        now = time.perf_counter()
+        timings[step] = round((now - started) * 1000, 1)
+        started = now
+
+    import app as backend
+    lap('import')
+    if not mongo_uri:
+        import mongomock
+        store = mongomock.MongoClient()
+        backend.MongoClient = lambda *a, **k: store
+        started = time.perf_counter()
+    backend.create_app()
+    lap('start')
+    client = backend.app.test_client()
+    client.get('/health').close()
+    lap('health')
+    client.post('/auth/login', json={'email': 'nobody@example.com', 'password': 'x'}).close()
+    lap('query')
+    print(json.dumps(timings))
+
+
+def run_probe(env):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--probe'], cwd=BACKEND, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def time_serve(env, port):
+    """Seconds from spawning serve.py to its first 200 on /health"""
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, 'serve.py', '--port', str(port)], cwd=BACKEND, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < 60:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=5) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise SystemExit('server did not come up')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def slowest_imports(env, count=15):
+    """(cumulative ms, module) of the slowest modules `import app` pulls in"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=BACKEND, env=env,
+                            check=True, capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        name = module.rstrip()
+        # Modules imported by app itself; what they import is counted in them
+        if len(name) - len(name.lstrip()) == 3:
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--mongo-uri', default=os.getenv('BENCH_MONGO_URI'))
+    parser.add_argument('--serve', action='store_true', help='also time serve.py until /health answers')
+    parser.add_argument('--port', type=int, default=5200)
+    parser.add_argument('--importtime', action='store_true', help='list the slowest imports')
+    parser.add_argument('--probe', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe(os.getenv('MONGO_URI_STRING'))
+        return 0
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, EMBEDDING_CACHE_DIR=cache_dir)
+        env.setdefault('EMBEDDING_PROVIDER', 'hashing')
+        if args.mongo_uri:
+            env['MONGO_URI_STRING'] = args.mongo_uri
+        else:
+            env.pop('MONGO_URI_STRING', None)
+
+        runs = [run_probe(env) for _ in range(args.runs)]
+        print(f"{'step':>8} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+        for step in STEPS + ['total']:
+            values = [sum(run.values()) if step == 'total' else run[step] for run in runs]
+            print(f'{step:>8} {statistics.median(values):>10.1f} {min(values):>8.1f} {max(values):>8.1f}')
+
+        if args.serve:
+            if not args.mongo_uri:
+                raise SystemExit('--serve needs --mongo-uri')
+            seconds = [time_serve(env, args.port) for _ in range(args.runs)]
+            print(f'serve.py to first /health: median {statistics.median(seconds) * 1000:.0f} ms')
+
+        if args.importtime:
+            print(f"\n{'cumulative ms':>13}  module")
+            for ms, module in slowest_imports(env):
+                print(f'{ms:>13.1f}  {module}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Load test: GET /requests latency before and during a login storm.
+
+Against a running server, this creates two throwaway accounts. It then
+probes GET /requests sequentially for --duration seconds on its own. Next
+it probes again while --storm threads log in as fast as they can. Latency
+percentiles for both phases are printed, with the login outcomes. With
+hashing in the bounded pool, the probe percentiles should barely move and
+excess logins should come back as 503 with Retry-After instead of queueing.
+Storm clients wait out Retry-After before trying again.
+
+Usage: python backend/benchmarks/load_auth_storm.py [--url URL] [--storm N] [--duration S]
+"""
+from http.cookiejar import CookieJar
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+
+def client():
+    return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+
+def call(opener, url, body=None):
+    """(status, seconds, Retry-After) for one request"""
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with opener.open(req, timeout=60) as response:
+            response.read()
+            status, retry_after = response.status, None
+    except urllib.error.HTTPError as e:
+        e.read()
+        status, retry_after = e.code, e.headers.get('Retry-After')
+    return status, time.perf_counter() - start, retry_after
+
+
+def signup(opener, url, role):
+    email = f'load-{uuid.uuid4().hex[:12]}@example.com'
+    status, _, _ = call(opener, f'{url}/auth/signup',
+                        {'email': email, 'password': 'load-test-password', 'name': 'Load Test', 'role': role})
+    if status != 201:
+        raise SystemExit(f'signup failed with {status}')
+    return email
+
+
+def probe(opener, url, duration):
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        status, elapsed, _ = call(opener, f'{url}/requests')
+        if status == 200:
+            latencies.append(elapsed)
+    return latencies
+
+
+def storm(url, email, stop, outcomes, lock):
+    opener = client()
+    while not stop.is_set():
+        status, elapsed, retry_after = call(opener, f'{url}/auth/login',
+                                            {'email': email, 'password': 'load-test-password'})
+        with lock:
+            outcomes.setdefault(status, []).append(elapsed)
+        if retry_after:
+            # Well-behaved clients back off as told
+            stop.wait(float(retry_after))
+
+
+def summary(latencies):
+    if len(latencies) < 2:
+        return 'n/a'
+    q = statistics.quantiles(latencies, n=100)
+    return (f'n={len(latencies):<5} p50={q[49] * 1000:7.1f}ms p95={q[94] * 1000:7.1f}ms '
+            f'p99={q[98] * 1000:7.1f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--storm', type=int, default=32, help='concurrent login threads')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per phase')
+    args = parser.parse_args()
+
+    prober = client()
+    signup(prober, args.url, 'victim')
+    storm_email = signup(client(), args.url, 'volunteer')
+
+    baseline = probe(prober, args.url, args.duration)
+
+    stop = threading.Event()
+    outcomes, lock = {}, threading.Lock()
+    threads = [threading.Thread(target=storm, args=(args.url, storm_email, stop, outcomes, lock), daemon=True)
+               for _ in range(args.storm)]
+    for thread in threads:
+        thread.start()
+    during = probe(prober, args.url, args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(f'GET /requests alone:        {summary(baseline)}')
+    print(f'GET /requests during storm: {summary(during)}')
+    for status, latencies in sorted(outcomes.items()):
+        print(f'POST /auth/login {status}: {len(latencies) / args.duration:7.1f}/s  {summary(latencies)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
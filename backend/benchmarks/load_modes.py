@@ -0,0 +1,182 @@
+"""Load test: the read endpoints in WSGI mode versus ASGI mode.
+
+For each mode, this starts `serve.py --mode <mode>` on its own port against
+the MongoDB in MONGO_URI_STRING (point it at a local instance). It then
+seeds a victim with --requests help requests and a volunteer with a
+location. Each endpoint is driven by --concurrency client threads for
+--duration seconds, while --sse idle event streams stay open the whole
+time. Requests/sec and p50/p99 latency are printed per endpoint and mode.
+Admission control sheds part of the WSGI load at high concurrency; raise
+ADMISSION_CAPACITY above --concurrency to compare raw throughput.
+
+Usage: python backend/benchmarks/load_modes.py [--modes wsgi,asgi] [--concurrency N]
+                                               [--duration S] [--sse N] [--requests N]
+"""
+from http.cookiejar import CookieJar
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CENTER = (40.7128, -74.0060)
+
+
+def client():
+    return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+
+def call(opener, url, body=None, method=None):
+    """(status, seconds, parsed JSON body or None) for one request"""
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with opener.open(req, timeout=60) as response:
+            raw = response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        raw = e.read()
+        status = e.code
+    elapsed = time.perf_counter() - start
+    try:
+        return status, elapsed, json.loads(raw)
+    except ValueError:
+        return status, elapsed, None
+
+
+def account(url, role):
+    opener = client()
+    status, _, _ = call(opener, f'{url}/auth/signup', {
+        'email': f'load-{uuid.uuid4().hex[:12]}@example.com', 'password': 'load-test-password',
+        'name': 'Load Test', 'role': role
+    })
+    if status != 201:
+        raise SystemExit(f'signup failed with {status}')
+    call(opener, f'{url}/profile', {
+        'location': {'latitude': CENTER[0], 'longitude': CENTER[1]}, 'skills': ['medical']
+    }, method='PUT')
+    return opener
+
+
+def seed(url, count):
+    """A volunteer session and the ids of count new requests"""
+    victim = account(url, 'victim')
+    rng = random.Random(7)
+    ids = []
+    for i in range(count):
+        status, _, body = call(victim, f'{url}/requests', {
+            'type': rng.choice(['food', 'water', 'shelter', 'transport', 'medical', 'other']),
+            'urgency': rng.choice(['low', 'medium', 'high']),
+            'description': f'Load test request {i}',
+            'location': {'latitude': CENTER[0] + rng.uniform(-0.2, 0.2),
+                         'longitude': CENTER[1] + rng.uniform(-0.2, 0.2)}
+        })
+        if status == 201:
+            ids.append(body['request_id'])
+    return account(url, 'volunteer'), ids
+
+
+def hold_stream(url, opener, stop):
+    """An idle SSE client: open /events and read until told to stop"""
+    try:
+        with opener.open(f'{url}/events', timeout=60) as response:
+            while not stop.is_set():
+                if not response.readline():
+                    return
+    except OSError:
+        pass
+
+
+def drive(url, opener, paths, concurrency, duration):
+    """(requests/sec, latencies, errors) with concurrency threads for duration seconds"""
+    latencies, errors, lock = [], [0], threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            status, elapsed, _ = call(opener, url + rng.choice(paths))
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(latencies) / duration, latencies, errors[0]
+
+
+def start_server(mode, port):
+    server = subprocess.Popen([sys.executable, 'serve.py', '--mode', mode, '--port', str(port)], cwd=BACKEND)
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(300):
+        try:
+            if call(client(), f'{url}/health')[0] == 200:
+                return server, url
+        except OSError:
+            pass
+        time.sleep(0.1)
+    server.kill()
+    raise SystemExit(f'{mode} server did not come up')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='wsgi,asgi')
+    parser.add_argument('--concurrency', type=int, default=32, help='client threads per endpoint')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per endpoint')
+    parser.add_argument('--sse', type=int, default=50, help='idle event streams held open')
+    parser.add_argument('--requests', type=int, default=300, help='help requests to seed')
+    parser.add_argument('--port', type=int, default=5100)
+    args = parser.parse_args()
+
+    print(f"{'mode':<5} {'endpoint':<18} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for offset, mode in enumerate(args.modes.split(',')):
+        server, url = start_server(mode, args.port + offset)
+        try:
+            volunteer, ids = seed(url, args.requests)
+            endpoints = [
+                ('/health', ['/health']),
+                ('/requests', ['/requests?limit=50']),
+                ('/requests/<id>', [f'/requests/{i}' for i in ids]),
+                ('/map/data', ['/map/data?limit=200']),
+                ('/suggestions', ['/suggestions'])
+            ]
+
+            stop = threading.Event()
+            streams = [threading.Thread(target=hold_stream, args=(url, volunteer, stop), daemon=True)
+                       for _ in range(args.sse)]
+            for stream in streams:
+                stream.start()
+
+            for name, paths in endpoints:
+                rate, latencies, errors = drive(url, volunteer, paths, args.concurrency, args.duration)
+                if len(latencies) >= 2:
+                    q = statistics.quantiles(latencies, n=100)
+                    p50, p99 = f'{q[49] * 1000:8.1f}', f'{q[98] * 1000:8.1f}'
+                else:
+                    p50 = p99 = f"{'n/a':>8}"
+                print(f'{mode:<5} {name:<18} {rate:8.1f} {p50} {p99} {errors:7d}')
+            stop.set()
+        finally:
+            server.terminate()
+            server.wait()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,314 @@
+"""Benchmark suite: the main routes against a synthetic disaster dataset.
+
+This generates a dataset (see synthetic.py), loads it, then imports the app
+against that database. Each route is driven through the app with
+--concurrency client threads for --duration seconds:
+
+- login: POST /auth/login
+- requests_victim: GET /requests as a victim
+- requests_volunteer: GET /requests?limit=50 as a volunteer
+- map: GET /map/data?limit=500
+- suggestions: GET /suggestions
+- claim and status: PUT /requests/<id>/volunteer on a pending request,
+  then PUT /requests/<id>/status back to pending, so the dataset does not
+  drift
+
+Throughput, latency percentiles, status codes and process memory are
+written as JSON. Results carry the commit they were measured at, and
+--compare prints the change against an earlier results file.
+
+Clients call the WSGI app in-process, admission control included (its
+capacity defaults to twice --concurrency here). That measures the
+backend's own cost without HTTP overhead. With no --mongo-uri, the data
+lives in mongomock. The stand-in lacks $geoNear and $round, so only login
+and the victim listing run there, and its timings are not representative
+of MongoDB.
+
+Usage:
+    python backend/benchmarks/suite.py                                   # in-memory stand-in
+    python backend/benchmarks/suite.py --mongo-uri mongodb://localhost:27017 --reset \\
+        --out results/$(git rev-parse --short HEAD).json --compare results/base.json
+"""
+from datetime import datetime
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from synthetic import (  # noqa: E402
+    PASSWORD, TYPES, URGENCIES, Dataset, DatasetConfig, load, parse_mix
+)
+
+COLLECTIONS = ['users', 'requests', 'counters', 'proposals']
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BACKEND,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def memory():
+    """Current and peak resident set size in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        current = None
+    return {'rss_mb': round(current, 1) if current else None, 'max_rss_mb': round(peak, 1)}
+
+
+def prepare_database(args):
+    """Client for the target database, emptied and loaded with a fresh dataset"""
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(args.mongo_uri)
+    else:
+        import mongomock
+        import pymongo.mongo_client
+        client = mongomock.MongoClient()
+        # The app builds its own client; hand it the same in-memory store
+        pymongo.mongo_client.MongoClient = lambda *a, **k: client
+
+    db = client['Database']
+    if db['users'].estimated_document_count() and not args.reset:
+        raise SystemExit('Database already holds users; pass --reset to drop the app collections first')
+    for name in COLLECTIONS:
+        db[name].drop()
+
+    config = DatasetConfig(
+        volunteers=args.volunteers, victims=args.victims, requests=args.requests,
+        incidents=args.incidents, seed=args.seed,
+        type_mix=parse_mix(args.types, TYPES) if args.types else None,
+        urgency_mix=parse_mix(args.urgencies, URGENCIES) if args.urgencies else None
+    )
+    method = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+    dataset = Dataset(config, generate_password_hash(PASSWORD, method=method))
+    load(db, dataset)
+    return dataset
+
+
+class Client:
+    """A test client signed in as one user, like a browser session"""
+
+    def __init__(self, app, user=None):
+        self.http = app.test_client()
+        if user:
+            with self.http.session_transaction() as session:
+                session['user_id'] = str(user['_id'])
+                session['role'] = user['role']
+
+    def call(self, method, path, body=None):
+        started = time.perf_counter()
+        response = self.http.open(path, method=method, json=body)
+        response.get_data()
+        response.close()
+        return response.status_code, time.perf_counter() - started
+
+
+def make_routes(app, victims, volunteers, pending_ids):
+    """name -> (needs MongoDB itself, factory building one worker's step function)"""
+
+    def login(rng):
+        client = Client(app)
+        return lambda: [('login',) + client.call('POST', '/auth/login', {
+            'email': rng.choice(volunteers)['email'], 'password': PASSWORD
+        })]
+
+    def as_user(users, path):
+        def factory(rng):
+            client = Client(app, rng.choice(users))
+            return lambda: [(None,) + client.call('GET', path)]
+        return factory
+
+    # Workers take turns through the pending requests so they do not race for the same one
+    pending = itertools.cycle(pending_ids)
+    pending_lock = threading.Lock()
+
+    def claim_release(rng):
+        client = Client(app, rng.choice(volunteers))
+
+        def step():
+            with pending_lock:
+                request_id = next(pending)
+            status, elapsed = client.call('PUT', f'/requests/{request_id}/volunteer')
+            results = [('claim', status, elapsed)]
+            if status == 200:
+                results.append(('status',) + client.call('PUT', f'/requests/{request_id}/status',
+                                                         {'status': 'pending'}))
+            return results
+        return step
+
+    return {
+        'login': (False, login),
+        'requests_victim': (False, as_user(victims, '/requests')),
+        'requests_volunteer': (True, as_user(volunteers, '/requests?limit=50')),
+        'map': (True, as_user(volunteers, '/map/data?limit=500')),
+        'suggestions': (True, as_user(volunteers, '/suggestions')),
+        'claim': (True, claim_release)
+    }
+
+
+def drive(name, factory, concurrency, duration, seed):
+    """Samples per label: {label: [(status, seconds), ...]}"""
+    samples, lock = {}, threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(i):
+        step = factory(random.Random(seed * 1000 + i))
+        local = []
+        while time.perf_counter() < deadline:
+            local.extend(step())
+        with lock:
+            for label, status, elapsed in local:
+                samples.setdefault(label or name, []).append((status, elapsed))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def summarize(samples, duration):
+    latencies = sorted(elapsed for status, elapsed in samples if status < 400)
+    statuses = {}
+    for status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    result = {
+        'requests': len(samples),
+        'ok': len(latencies),
+        'errors': len(samples) - len(latencies),
+        'statuses': statuses,
+        'rps': round(len(latencies) / duration, 1)
+    }
+    if len(latencies) >= 2:
+        q = statistics.quantiles(latencies, n=100)
+        result.update({
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+            'p50_ms': round(q[49] * 1000, 3),
+            'p95_ms': round(q[94] * 1000, 3),
+            'p99_ms': round(q[98] * 1000, 3)
+        })
+    return result
+
+
+def compare(results, baseline):
+    """Print per-route changes against an earlier results file"""
+    print(f"\nvs {baseline.get('commit', '?')[:12]}:", file=sys.stderr)
+    for name, route in results['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if not before or 'rps' not in route or 'rps' not in before:
+            continue
+        changes = []
+        for key in ('rps', 'p50_ms', 'p99_ms'):
+            if route.get(key) and before.get(key):
+                changes.append(f'{key} {(route[key] / before[key] - 1) * 100:+6.1f}%')
+        print(f'  {name:<20} ' + '  '.join(changes), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mongo-uri', help='local MongoDB; omit for the in-memory stand-in')
+    parser.add_argument('--reset', action='store_true', help='drop existing app collections first')
+    parser.add_argument('--volunteers', type=int, default=2000)
+    parser.add_argument('--victims', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--incidents', type=int, default=4)
+    parser.add_argument('--types', help='type mix, e.g. food=3,water=3,medical=1')
+    parser.add_argument('--urgencies', help='urgency mix, e.g. high=1,medium=2,low=2')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per route')
+    parser.add_argument('--routes', help='comma-separated subset of routes to run')
+    parser.add_argument('--out', help='write results JSON here instead of stdout')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    if args.mongo_uri:
+        os.environ['MONGO_URI_STRING'] = args.mongo_uri
+    os.environ.setdefault('OPENAI_API_KEY', 'unused-by-benchmarks')
+    os.environ.setdefault('ADMISSION_CAPACITY', str(args.concurrency * 2))
+    # Suggestions are scored with their semantic term, on the local embedder
+    os.environ.setdefault('EMBEDDING_PROVIDER', 'hashing')
+
+    started = time.perf_counter()
+    dataset = prepare_database(args)
+    summary = dataset.summary()
+    victims = [{'_id': u['_id'], 'role': u['role'], 'email': u['email']} for u in dataset.victims]
+    volunteers = [{'_id': u['_id'], 'role': u['role'], 'email': u['email']} for u in dataset.volunteers]
+    pending_ids = [str(r['_id']) for r in dataset.requests if r['status'] == 'pending']
+    del dataset
+    gc.collect()
+    load_seconds = time.perf_counter() - started
+
+    import app as backend
+    routes = make_routes(backend.create_app(), victims, volunteers, pending_ids)
+    selected = args.routes.split(',') if args.routes else list(routes)
+
+    commit, dirty = git_commit()
+    results = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'backend': 'mongodb' if args.mongo_uri else 'mongomock',
+        'dataset': summary,
+        'load_seconds': round(load_seconds, 2),
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'routes': {},
+        'memory': {'after_load': memory()}
+    }
+
+    print(f"{'route':<20} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}", file=sys.stderr)
+    for name in selected:
+        needs_mongodb, factory = routes[name]
+        if needs_mongodb and not args.mongo_uri:
+            results['routes'][name] = {'skipped': 'uses operators the in-memory stand-in lacks ($geoNear, $round)'}
+            print(f'{name:<20} skipped (needs MongoDB)', file=sys.stderr)
+            continue
+        for label, samples in drive(name, factory, args.concurrency, args.duration, args.seed).items():
+            route = results['routes'][label] = summarize(samples, args.duration)
+            print(f"{label:<20} {route['rps']:8.1f} {route.get('p50_ms', 0):8.2f} {route.get('p95_ms', 0):8.2f} "
+                  f"{route.get('p99_ms', 0):8.2f} {route['errors']:7d}", file=sys.stderr)
+        results['memory'][name] = memory()
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
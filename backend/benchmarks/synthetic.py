@@ -0,0 +1,193 @@
+"""Synthetic disaster-scale datasets for benchmarks.
+
+A dataset is a handful of incidents inside a region. Each incident has an
+epicenter, a spread and a share of the affected population:
+
+- victims live close to an epicenter;
+- most volunteers converge on the incidents from further out, and the
+  rest are spread across the whole region;
+- requests go to every victim in turn, then to random victims, with
+  type and urgency drawn from configurable mixes;
+- requests are created over the hours after the incidents. Most are still
+  pending, and some are in progress or fulfilled.
+
+Documents follow the app's schema (GeoJSON `geo` included), so `load` can
+insert them directly. The same seed always gives the same dataset, ids
+included, with times relative to when it was generated.
+"""
+from datetime import datetime, timedelta
+import math
+import random
+
+from bson.objectid import ObjectId
+
+
+TYPES = ['food', 'water', 'shelter', 'transport', 'medical', 'other']
+URGENCIES = ['low', 'medium', 'high']
+
+DEFAULT_TYPE_MIX = {'food': 25, 'water': 25, 'shelter': 15, 'transport': 10, 'medical': 15, 'other': 10}
+DEFAULT_URGENCY_MIX = {'low': 30, 'medium': 40, 'high': 30}
+DEFAULT_STATUS_MIX = {'pending': 70, 'in_progress': 20, 'fulfilled': 10}
+
+KM_PER_DEGREE = 111.32
+PASSWORD = 'bench-password'
+
+
+class DatasetConfig:
+    """Sizes, region and mixes of a synthetic dataset"""
+
+    def __init__(self, volunteers=2000, victims=5000, requests=10000, incidents=4,
+                 center=(29.76, -95.37), region_km=120, seed=1, type_mix=None,
+                 urgency_mix=None, status_mix=None, hours=12):
+        self.volunteers = volunteers
+        self.victims = victims
+        self.requests = requests
+        self.incidents = incidents
+        self.center = center
+        self.region_km = region_km
+        self.seed = seed
+        self.type_mix = type_mix or dict(DEFAULT_TYPE_MIX)
+        self.urgency_mix = urgency_mix or dict(DEFAULT_URGENCY_MIX)
+        self.status_mix = status_mix or dict(DEFAULT_STATUS_MIX)
+        self.hours = hours
+
+
+def parse_mix(text, allowed):
+    """'food=3,water=2' as a weight dict; raises ValueError on unknown keys"""
+    mix = {}
+    for part in text.split(','):
+        key, _, weight = part.partition('=')
+        key = key.strip()
+        if key not in allowed:
+            raise ValueError(f'{key!r} is not one of {", ".join(allowed)}')
+        mix[key] = float(weight or 1)
+    return mix
+
+
+def _offset(center, rng, sigma_km):
+    """Point scattered around center with a Gaussian spread in km"""
+    lat = center[0] + rng.gauss(0, sigma_km) / KM_PER_DEGREE
+    lon = center[1] + rng.gauss(0, sigma_km) / (KM_PER_DEGREE * math.cos(math.radians(center[0])))
+    return round(lat, 6), round(lon, 6)
+
+
+def _location(point):
+    return {'latitude': point[0], 'longitude': point[1]}
+
+
+def _geo(point):
+    return {'type': 'Point', 'coordinates': [point[1], point[0]]}
+
+
+def _object_id(rng):
+    return ObjectId(rng.getrandbits(96).to_bytes(12, 'big'))
+
+
+def _choose(rng, mix):
+    return rng.choices(list(mix), weights=list(mix.values()))[0]
+
+
+class Dataset:
+    """Users and requests generated from a DatasetConfig"""
+
+    def __init__(self, config, password_hash, now=None):
+        self.config = config
+        self.now = now or datetime.utcnow()
+        rng = random.Random(config.seed)
+
+        self.incidents = []
+        for _ in range(config.incidents):
+            epicenter = _offset(config.center, rng, config.region_km / 2)
+            self.incidents.append({
+                'epicenter': epicenter,
+                'spread_km': rng.uniform(2, 12),
+                'weight': rng.uniform(1, 4)
+            })
+        weights = [incident['weight'] for incident in self.incidents]
+
+        self.victims = []
+        for i in range(config.victims):
+            incident = rng.choices(self.incidents, weights=weights)[0]
+            point = _offset(incident['epicenter'], rng, incident['spread_km'])
+            self.victims.append(self._user(i, 'victim', point, [], password_hash, rng))
+
+        self.volunteers = []
+        for i in range(config.volunteers):
+            if rng.random() < 0.7:
+                incident = rng.choices(self.incidents, weights=weights)[0]
+                point = _offset(incident['epicenter'], rng, incident['spread_km'] * 3)
+            else:
+                point = _offset(config.center, rng, config.region_km / 2)
+            skills = rng.sample(TYPES, rng.randint(0, 3))
+            self.volunteers.append(self._user(i, 'volunteer', point, skills, password_hash, rng))
+
+        self.requests = []
+        for i in range(config.requests):
+            victim = self.victims[i % len(self.victims)] if i < len(self.victims) else rng.choice(self.victims)
+            self.requests.append(self._request(i, victim, rng))
+
+    def _user(self, i, role, point, skills, password_hash, rng):
+        return {
+            '_id': _object_id(rng),
+            'email': f'{role}-{i}@bench.example.com',
+            'password_hash': password_hash,
+            'name': f'Bench {role.title()} {i}',
+            'role': role,
+            'phone': '',
+            'location': _location(point),
+            'skills': skills,
+            'profile_complete': True,
+            'created_at': self.now - timedelta(days=1),
+            'updated_at': self.now - timedelta(days=1)
+        }
+
+    def _request(self, i, victim, rng):
+        config = self.config
+        # Most requests arrive early, tailing off over the following hours
+        created_at = self.now - timedelta(hours=config.hours * (1 - min(rng.expovariate(3), 1)))
+        point = _offset((victim['location']['latitude'], victim['location']['longitude']), rng, 0.3)
+        status = _choose(rng, config.status_mix)
+        volunteer = rng.choice(self.volunteers) if status != 'pending' and self.volunteers else None
+        if volunteer is None:
+            status = 'pending'
+        return {
+            '_id': _object_id(rng),
+            'victim_id': victim['_id'],
+            'victim_name': victim['name'],
+            'victim_phone': '',
+            'type': _choose(rng, config.type_mix),
+            'description': f'Synthetic request {i}: ' + ' '.join(rng.choices(
+                ['need', 'help', 'family', 'flooded', 'road', 'elderly', 'supplies', 'urgent'], k=12)),
+            'urgency': _choose(rng, config.urgency_mix),
+            'location': _location(point),
+            'geo': _geo(point),
+            'status': status,
+            'volunteer_id': volunteer['_id'] if volunteer else None,
+            'volunteer_name': volunteer['name'] if volunteer else None,
+            'created_at': created_at,
+            'updated_at': created_at,
+            'fulfilled_at': created_at + timedelta(hours=1) if status == 'fulfilled' else None
+        }
+
+    def summary(self):
+        pending = sum(1 for r in self.requests if r['status'] == 'pending')
+        return {
+            'seed': self.config.seed,
+            'volunteers': len(self.volunteers),
+            'victims': len(self.victims),
+            'requests': len(self.requests),
+            'pending': pending,
+            'incidents': len(self.incidents),
+            'type_mix': self.config.type_mix,
+            'urgency_mix': self.config.urgency_mix
+        }
+
+
+def load(db, dataset, batch_size=5000):
+    """Insert a dataset into the app's collections"""
+    users = dataset.victims + dataset.volunteers
+    for start in range(0, len(users), batch_size):
+        db['users'].insert_many(users[start:start + batch_size], ordered=False)
+    for start in range(0, len(dataset.requests), batch_size):
+        db['requests'].insert_many(dataset.requests[start:start + batch_size], ordered=False)
+    db['counters'].update_one({'_id': 'requests'}, {'$inc': {'version': 1}}, upsert=True)
@@ -0,0 +1,339 @@
+"""Bulk ingest and export of help requests as JSON Lines.
+
+Each line of an import is one request object, with the fields POST
+/requests takes: type, description, urgency and optionally location.
+Records are validated with the same rules as create_request (both use
+validate_request). Valid records are written with unordered insert_many
+in batches of at most `batch_size`. A bad line, or a failed insert, is
+reported with its line number and does not stop the rest of the batch.
+Input is read line by line, so memory stays bounded whatever the size of
+the upload.
+
+With a dedup index, each record is checked as create_request checks a
+new request (see dedup.py): a victim's own copy of an open request is
+merged into it, and a match from someone else is annotated. Records are
+indexed as they are accepted, so copies within one import are caught too.
+
+Exports stream the stored documents, minus `geo`, one JSON object per
+line, from a cursor: live requests oldest first, then archived ones. Ids are strings and dates are
+ISO 8601.
+
+POST /requests/bulk and GET /requests/export use this from the app. For
+files handed over by field teams and partner agencies, run:
+
+    python backend/bulk.py import requests.jsonl --victim-email field@team.org
+    python backend/bulk.py export --status pending --since 2024-01-01T00:00:00 -o out.jsonl
+
+Records imported from the command line can name their victim with
+`victim_email`. They are checked against the pending requests loaded into
+a dedup index unless DEDUP=off. The version counter is bumped and the
+dashboard counters are updated, so ETags change at once. A running app with EVENT_SOURCE=bus
+adds them to its map tiles and cached suggestions only after a restart;
+with EVENT_SOURCE=change_stream it sees them as they are inserted.
+"""
+from datetime import datetime
+import argparse
+import json
+import os
+import sys
+
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+
+from dedup import add_report, dedup_index_from_env, signature
+from indexes import to_geo_point
+from scoring import URGENCY_SCORES
+from serialization import dumps
+from stats import record_many
+
+
+REQUEST_TYPES = ['food', 'water', 'shelter', 'transport', 'medical', 'other']
+URGENCY_LEVELS = ['low', 'medium', 'high']
+STATUSES = ['pending', 'in_progress', 'fulfilled', 'cancelled', 'duplicate']
+
+DEFAULT_BATCH_SIZE = 500
+
+# Per-record errors listed in a report; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+def validate_request(data, default_location):
+    """Location for a new request; raises ValueError with the reason it is invalid"""
+    if not isinstance(data, dict):
+        raise ValueError('Request must be a JSON object')
+
+    # Validate required fields
+    for field in ['type', 'description', 'urgency']:
+        if not data.get(field):
+            raise ValueError(f'{field} is required')
+
+    # Validate help type
+    if data['type'] not in REQUEST_TYPES:
+        raise ValueError(f'Type must be one of: {", ".join(REQUEST_TYPES)}')
+
+    # Validate urgency
+    if data['urgency'] not in URGENCY_LEVELS:
+        raise ValueError('Urgency must be low, medium, or high')
+
+    # Use the victim's location if not provided
+    location = data.get('location', default_location or {})
+    if not isinstance(location, dict) or not location.get('latitude') or not location.get('longitude'):
+        raise ValueError('Location is required')
+    return location
+
+
+def new_request(data, location, victim, now):
+    """Document for a new pending request, as create_request stores it"""
+    return {
+        'victim_id': victim['_id'],
+        'victim_name': victim['name'],
+        'victim_phone': victim.get('phone', ''),
+        'type': data['type'],
+        'description': data['description'],
+        'urgency': data['urgency'],
+        'location': location,
+        'geo': to_geo_point(location),
+        'status': 'pending',
+        'volunteer_id': None,
+        'volunteer_name': None,
+        'created_at': now,
+        'updated_at': now,
+        'fulfilled_at': None
+    }
+
+
+class IngestReport:
+    """Counts and per-line errors of one import"""
+
+    def __init__(self):
+        self.received = 0
+        self.inserted = 0
+        self.merged = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def to_dict(self):
+        return {
+            'received': self.received,
+            'inserted': self.inserted,
+            'merged': self.merged,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+
+def ingest(lines, requests_collection, resolve_victim, on_inserted=None, batch_size=DEFAULT_BATCH_SIZE,
+           dedup_index=None, merge=None):
+    """Validate and insert JSONL request records
+
+    resolve_victim(records) gets the parsed records of a batch and returns
+    one victim document (or an error string) per record, so lookups can be
+    batched too. on_inserted(docs) is called after each batch with the
+    documents that were written. With a dedup_index, merge(request_id, doc)
+    folds a victim's copy into their open request and returns False if
+    that request is no longer pending.
+    """
+    report = IngestReport()
+    batch = []
+    # Accepted records of the batch being built, by id, until they are inserted
+    accepted = {}
+
+    def check_duplicate(doc):
+        """False if doc was merged; otherwise annotates and indexes it"""
+        sig = signature(doc['description'])
+        match = dedup_index.find(doc, sig)
+        if match and match[2] == str(doc['victim_id']):
+            original = accepted.get(match[0])
+            if original is not None:
+                original['reports'] = original.get('reports', 0) + 1
+                original['urgency'] = max(original['urgency'], doc['urgency'], key=URGENCY_SCORES.get)
+                report.merged += 1
+                return False
+            if merge(match[0], doc):
+                report.merged += 1
+                return False
+            dedup_index.remove(match[0])
+            match = None
+        if match:
+            doc.update(possible_duplicate_of=ObjectId(match[0]), duplicate_similarity=match[1])
+        # Later records of this import are checked against it too
+        doc['_id'] = ObjectId()
+        dedup_index.add(doc, sig)
+        accepted[str(doc['_id'])] = doc
+        return True
+
+    def flush():
+        if not batch:
+            return
+        victims = resolve_victim([record for _, record in batch])
+        now = datetime.utcnow()
+        docs, doc_lines = [], []
+        for (line, record), victim in zip(batch, victims):
+            if isinstance(victim, str):
+                report.error(line, victim)
+                continue
+            try:
+                location = validate_request(record, victim.get('location'))
+            except ValueError as e:
+                report.error(line, str(e))
+                continue
+            doc = new_request(record, location, victim, now)
+            if dedup_index and not check_duplicate(doc):
+                continue
+            docs.append(doc)
+            doc_lines.append(line)
+        batch.clear()
+        accepted.clear()
+        if not docs:
+            return
+
+        failed = set()
+        try:
+            requests_collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                failed.add(write_error['index'])
+                report.error(doc_lines[write_error['index']], write_error.get('errmsg', 'Insert failed'))
+        written = [doc for i, doc in enumerate(docs) if i not in failed]
+        if dedup_index:
+            for i in failed:
+                dedup_index.remove(docs[i]['_id'])
+        report.inserted += len(written)
+        if written and on_inserted:
+            on_inserted(written)
+
+    for number, raw in enumerate(lines, start=1):
+        raw = raw.decode() if isinstance(raw, bytes) else raw
+        if not raw.strip():
+            continue
+        report.received += 1
+        try:
+            batch.append((number, json.loads(raw)))
+        except ValueError:
+            report.error(number, 'Invalid JSON')
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return report
+
+
+def export_query(status=None, since=None, until=None, victim_id=None):
+    """Filter for an export; raises ValueError on a bad status or date"""
+    query = {}
+    if status:
+        statuses = [s.strip() for s in status.split(',')]
+        for s in statuses:
+            if s not in STATUSES:
+                raise ValueError(f'Status must be one of: {", ".join(STATUSES)}')
+        query['status'] = statuses[0] if len(statuses) == 1 else {'$in': statuses}
+    window = {}
+    for op, value in (('$gte', since), ('$lt', until)):
+        if value:
+            try:
+                window[op] = datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f'{value!r} is not an ISO 8601 date')
+    if window:
+        query['created_at'] = window
+    if victim_id:
+        query['victim_id'] = victim_id
+    return query
+
+
+def export_lines(requests_collection, query, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield one JSON line (bytes) per matching request, oldest first"""
+    cursor = requests_collection.find(query, {'geo': 0}, batch_size=batch_size).sort(
+        [('created_at', 1), ('_id', 1)])
+    for doc in cursor:
+        yield dumps(doc, iso_dates=True) + b'\n'
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo.mongo_client import MongoClient
+    from pymongo.server_api import ServerApi
+
+    from archive import ARCHIVE_COLLECTION
+
+    parser = argparse.ArgumentParser(description='Import or export help requests as JSON Lines')
+    commands = parser.add_subparsers(dest='command', required=True)
+    importer = commands.add_parser('import', help='insert requests from a JSONL file (- for stdin)')
+    importer.add_argument('file')
+    importer.add_argument('--victim-email', help='victim for records without victim_email')
+    importer.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    exporter = commands.add_parser('export', help='write requests as JSONL')
+    exporter.add_argument('--status', help='comma-separated statuses')
+    exporter.add_argument('--since', help='created at or after (ISO 8601, UTC)')
+    exporter.add_argument('--until', help='created before (ISO 8601, UTC)')
+    exporter.add_argument('-o', '--output', help='file to write (default stdout)')
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = MongoClient(os.getenv('MONGO_URI_STRING'), server_api=ServerApi('1'))['Database']
+
+    if args.command == 'export':
+        try:
+            query = export_query(args.status, args.since, args.until)
+        except ValueError as e:
+            parser.error(str(e))
+        out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            # Live requests first, then archived ones, as GET /requests/export does
+            for tier in (db['requests'], db[ARCHIVE_COLLECTION]):
+                for line in export_lines(tier, query):
+                    out.write(line)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+        return 0
+
+    def resolve_victims(records):
+        emails = {(r.get('victim_email') if isinstance(r, dict) else None) or args.victim_email
+                  for r in records}
+        emails.discard(None)
+        users = {u['email']: u for u in db['users'].find(
+            {'email': {'$in': [e.lower().strip() for e in emails]}, 'role': 'victim'},
+            {'password_hash': 0}
+        )}
+        victims = []
+        for record in records:
+            email = (record.get('victim_email') if isinstance(record, dict) else None) or args.victim_email
+            if not email:
+                victims.append('victim_email is required')
+            else:
+                victims.append(users.get(email.lower().strip()) or f'No victim account for {email}')
+        return victims
+
+    def merge(request_id, doc):
+        merged = add_report(db['requests'], ObjectId(request_id), doc['urgency'], doc['created_at'])
+        if merged:
+            record_many(db['stats'], [merged])
+        return bool(merged)
+
+    dedup_index = dedup_index_from_env()
+    if dedup_index:
+        dedup_index.load(db['requests'])
+    source = sys.stdin if args.file == '-' else open(args.file)
+    try:
+        report = ingest(source, db['requests'], resolve_victims,
+                        lambda docs: record_many(db['stats'], [(None, doc) for doc in docs]),
+                        batch_size=args.batch_size, dedup_index=dedup_index, merge=merge)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    if report.inserted or report.merged:
+        db['counters'].update_one({'_id': 'requests'}, {'$inc': {'version': 1}}, upsert=True)
+    json.dump(report.to_dict(), sys.stdout, indent=2)
+    print()
+    return 0 if not report.failed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""Atomic volunteer claims on help requests.
+
+A claim is a single conditional find_one_and_update on status 'pending', so
+when several volunteers race for the same request exactly one of them wins
+and everyone else gets None back. The volunteer's distance is computed by the
+server inside the same update.
+"""
+from datetime import datetime
+import math
+
+from pymongo import ReturnDocument
+
+from scoring import EARTH_RADIUS_KM
+
+
+def distance_expression(location):
+    """Aggregation expression for the haversine distance (km) from location to the request"""
+    lat = float(location['latitude'])
+    lon = float(location['longitude'])
+    req_lat = {'$toDouble': '$location.latitude'}
+    req_lon = {'$toDouble': '$location.longitude'}
+
+    half_dlat = {'$divide': [{'$degreesToRadians': {'$subtract': [req_lat, lat]}}, 2]}
+    half_dlon = {'$divide': [{'$degreesToRadians': {'$subtract': [req_lon, lon]}}, 2]}
+    a = {'$add': [
+        {'$pow': [{'$sin': half_dlat}, 2]},
+        {'$multiply': [
+            math.cos(math.radians(lat)),
+            {'$cos': {'$degreesToRadians': req_lat}},
+            {'$pow': [{'$sin': half_dlon}, 2]}
+        ]}
+    ]}
+    c = {'$multiply': [2, {'$atan2': [{'$sqrt': a}, {'$sqrt': {'$subtract': [1, a]}}]}]}
+
+    return {'$round': [{'$multiply': [EARTH_RADIUS_KM, c]}, 2]}
+
+
+def claim_request(collection, request_id, volunteer_id, volunteer):
+    """Claim a pending request for a volunteer; returns the claimed document or None"""
+    location = volunteer.get('location', {})
+    if location.get('latitude') and location.get('longitude'):
+        distance = distance_expression(location)
+    else:
+        distance = {'$literal': None}
+
+    now = datetime.utcnow()
+    return collection.find_one_and_update(
+        {'_id': request_id, 'status': 'pending'},
+        [{'$set': {
+            'status': 'in_progress',
+            'volunteer_id': {'$literal': volunteer_id},
+            'volunteer_name': {'$literal': volunteer['name']},
+            'volunteer_phone': {'$literal': volunteer.get('phone', '')},
+            'volunteer_distance': distance,
+            'volunteer_location': {'$literal': location},
+            'claimed_at': {'$literal': now},
+            'updated_at': {'$literal': now}
+        }}],
+        return_document=ReturnDocument.AFTER
+    )
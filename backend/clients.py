@@ -0,0 +1,84 @@
+"""Lazily built, per-process database clients.
+
+A MongoClient starts monitor threads and opens connections as soon as it is
+built, and must not be carried across fork(). LazyClient defers building it
+until the first query, shares it between the threads of a process, and
+builds a fresh one in a forked child (e.g. a pre-fork server's worker), so
+the module that declares the collections can be imported without config,
+network or threads.
+
+LazyDatabase and LazyCollection stand in for pymongo's Database and
+Collection. They resolve to the real objects on every attribute access, and
+can be passed to any code that takes a collection.
+"""
+import os
+import threading
+
+
+class LazyClient:
+    """One client per process, built by factory() on first use"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    # A client inherited over fork is unusable; never close it here
+                    self._client = self._factory()
+                    self._pid = pid
+        return self._client
+
+    @property
+    def built(self):
+        return self._pid == os.getpid()
+
+    def __getitem__(self, name):
+        return LazyDatabase(self, name)
+
+
+class LazyDatabase:
+    def __init__(self, client, name):
+        self._lazy_client = client
+        self.name = name
+        self._resolved = (None, None)
+
+    def resolve(self):
+        client = self._lazy_client.get()
+        owner, database = self._resolved
+        if owner is not client:
+            database = client[self.name]
+            self._resolved = (client, database)
+        return database
+
+    def __getitem__(self, name):
+        return LazyCollection(self, name)
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+
+class LazyCollection:
+    def __init__(self, database, name):
+        self._lazy_database = database
+        self.name = name
+        self._resolved = (None, None)
+
+    def resolve(self):
+        database = self._lazy_database.resolve()
+        owner, collection = self._resolved
+        if owner is not database:
+            collection = database[self.name]
+            self._resolved = (database, collection)
+        return collection
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self):
+        return f'LazyCollection({self._lazy_database.name!r}, {self.name!r})'
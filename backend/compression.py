@@ -0,0 +1,94 @@
+"""Response compression negotiated with the client's Accept-Encoding.
+
+JSON and JSON Lines responses are compressed with brotli (br) when the
+brotli package is installed and the client accepts it, or with gzip. The
+client's q-values decide between the two, and brotli wins a tie. Bodies
+under COMPRESS_MIN_BYTES are sent as they are. Streamed bodies are
+compressed chunk by chunk as they are sent, whatever their size. Event
+streams are never compressed, since buffering would hold events back.
+
+Compression is on by default; RESPONSE_COMPRESSION=off turns it off, e.g.
+behind a proxy that compresses. COMPRESS_GZIP_LEVEL (default 5) and
+COMPRESS_BROTLI_QUALITY (default 4) trade CPU for size. Only the Flask
+app's responses are compressed. In ASGI mode, the async handlers' bodies
+are left to the server.
+"""
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE = {'application/json', 'application/x-ndjson'}
+
+
+class _Gzip:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def process(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+def _stream(chunks, compressor):
+    for chunk in chunks:
+        out = compressor.process(chunk.encode() if isinstance(chunk, str) else chunk)
+        if out:
+            yield out
+    yield compressor.finish()
+
+
+class ResponseCompression:
+    """Compresses eligible responses for the encodings a request accepts"""
+
+    def __init__(self, min_bytes=1024, gzip_level=5, brotli_quality=4):
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = ['br', 'gzip'] if brotli else ['gzip']
+
+    def compressor(self, encoding):
+        if encoding == 'br':
+            return brotli.Compressor(quality=self.brotli_quality)
+        return _Gzip(self.gzip_level)
+
+    def compress(self, encoding, data):
+        compressor = self.compressor(encoding)
+        return compressor.process(data) + compressor.finish()
+
+    def apply(self, response, accept_encodings):
+        """Compress response in place if it is worth it and the client accepts it"""
+        if (response.status_code != 200 or response.direct_passthrough
+                or response.mimetype not in COMPRESSIBLE or 'Content-Encoding' in response.headers):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+        if response.is_streamed:
+            response.response = _stream(response.response, self.compressor(encoding))
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_bytes:
+                return response
+            response.set_data(self.compress(encoding, data))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+def compression_from_env():
+    """ResponseCompression configured from the environment, or None if disabled"""
+    if os.getenv('RESPONSE_COMPRESSION', 'on').lower() in ('off', 'false', '0', 'no'):
+        return None
+    return ResponseCompression(
+        min_bytes=int(os.getenv('COMPRESS_MIN_BYTES', 1024)),
+        gzip_level=int(os.getenv('COMPRESS_GZIP_LEVEL', 5)),
+        brotli_quality=int(os.getenv('COMPRESS_BROTLI_QUALITY', 4))
+    )
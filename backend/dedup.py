@@ -0,0 +1,338 @@
+"""Near-duplicate detection for help requests.
+
+In a crisis the same need is often reported several times, by the same
+victim or by neighbors. DedupIndex keeps every pending request, bucketed by geohash cell and type, with a MinHash
+signature of its description. A new request is compared only with the
+requests of its type in its own cell and the 8 around it. Among those, a
+match must lie within DEDUP_RADIUS_M and its estimated Jaccard similarity
+of word and character 4-gram shingles must reach DEDUP_THRESHOLD.
+
+create_request acts on a match at insert time:
+
+- if the same victim sent it, it is merged: nothing is inserted, the
+  open request's `reports` count goes up, and its urgency is raised if
+  the new copy is more urgent (see add_report);
+- otherwise it stays pending, annotated with `possible_duplicate_of` and
+  `duplicate_similarity`. Neighbors typing "need water" read the same to
+  MinHash, so only a volunteer can tell two households apart.
+
+Only a victim's own copies ever get status 'duplicate' (from a sweep,
+with `duplicate_of`). They follow their original: fulfilled with it, and
+the oldest is reopened when it is cancelled. Their victim can reopen or
+cancel them at any time.
+
+Bulk imports are checked the same way, record by record, against the
+index and the records before them in the import.
+
+The index is loaded from the pending requests at startup and kept current
+from the event bus, like the tile index. With several worker processes,
+use EVENT_SOURCE=change_stream so each sees the others' inserts. Two
+copies sent at the same instant can both get in; a sweep catches them.
+
+Sweep the existing pending requests with `python backend/dedup.py`. It
+lists the duplicates it finds, oldest request kept, and marks them as
+above with --apply. DEDUP=off turns detection off.
+"""
+from datetime import datetime
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import zlib
+
+import numpy as np
+from pymongo import ReturnDocument
+
+from scoring import URGENCY_SCORES, calculate_distance
+
+
+DUPLICATE = 'duplicate'
+DEFAULT_PRECISION = 6
+DEFAULT_RADIUS_M = 300
+DEFAULT_THRESHOLD = 0.5
+NUM_HASHES = 64
+SHINGLE_SIZE = 4
+INDEX_FIELDS = {'victim_id': 1, 'type': 1, 'description': 1, 'location': 1, 'status': 1, 'created_at': 1}
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_TOKEN = re.compile(r'\w+')
+
+# Multiply-shift hash family: one odd multiplier and one offset per hash
+_rng = np.random.default_rng(20240601)
+_MULTIPLIERS = _rng.integers(1, 2 ** 63, NUM_HASHES, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_OFFSETS = _rng.integers(0, 2 ** 63, NUM_HASHES, dtype=np.uint64)
+
+
+def _cell(lat, lon, precision):
+    """(x, y) of the geohash cell holding a point, counted from the south-west"""
+    bits = 5 * precision
+    lon_bits, lat_bits = (bits + 1) // 2, bits // 2
+    x = min(int((lon + 180) / 360 * (1 << lon_bits)), (1 << lon_bits) - 1)
+    y = min(int((lat + 90) / 180 * (1 << lat_bits)), (1 << lat_bits) - 1)
+    return x, y
+
+
+def _geohash_of_cell(x, y, precision):
+    bits = 5 * precision
+    lon_bits, lat_bits = (bits + 1) // 2, bits // 2
+    code = 0
+    for i in range(bits):
+        # Bits alternate longitude, latitude, most significant first
+        if i % 2 == 0:
+            lon_bits -= 1
+            code = code << 1 | (x >> lon_bits) & 1
+        else:
+            lat_bits -= 1
+            code = code << 1 | (y >> lat_bits) & 1
+    return ''.join(_BASE32[code >> shift & 31] for shift in range(bits - 5, -1, -5))
+
+
+def geohash(lat, lon, precision=DEFAULT_PRECISION):
+    return _geohash_of_cell(*_cell(lat, lon, precision), precision)
+
+
+def neighborhood(lat, lon, precision=DEFAULT_PRECISION):
+    """(x, y) of the geohash cell holding a point and of the cells around it"""
+    x, y = _cell(lat, lon, precision)
+    lon_cells, lat_cells = 1 << (5 * precision + 1) // 2, 1 << 5 * precision // 2
+    return [((x + dx) % lon_cells, y + dy)
+            for dy in (-1, 0, 1) if 0 <= y + dy < lat_cells
+            for dx in (-1, 0, 1)]
+
+
+def shingles(text):
+    """Words and character 4-grams of a description, lowercased"""
+    words = _TOKEN.findall((text or '').lower())
+    joined = ' '.join(words)
+    grams = {joined[i:i + SHINGLE_SIZE] for i in range(len(joined) - SHINGLE_SIZE + 1)}
+    grams.update(words)
+    return grams or {joined}
+
+
+def signature(text):
+    """MinHash signature (NUM_HASHES uint32) of a description's shingles"""
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles(text)), dtype=np.uint64)
+    mixed = hashes[None, :] * _MULTIPLIERS[:, None] + _OFFSETS[:, None]
+    return (mixed >> np.uint64(32)).astype(np.uint32).min(axis=1)
+
+
+def similarity(a, b):
+    """Jaccard similarity estimated from two signatures"""
+    return int(np.count_nonzero(a == b)) / NUM_HASHES
+
+
+def _point(doc):
+    location = doc.get('location') or {}
+    try:
+        lat, lon = float(location['latitude']), float(location['longitude'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (lat or lon):
+        return None
+    return lat, lon
+
+
+class DedupIndex:
+    """Pending requests by geohash cell and type, with description signatures"""
+
+    def __init__(self, precision=DEFAULT_PRECISION, radius_m=DEFAULT_RADIUS_M, threshold=DEFAULT_THRESHOLD):
+        self.precision = precision
+        self.radius_km = radius_m / 1000
+        self.threshold = threshold
+        self._buckets = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(['lookups', 'matches', 'added', 'removed'], 0)
+
+    def find(self, doc, sig=None):
+        """(request id, similarity, victim id) of the closest match for a new request, or None"""
+        point = _point(doc)
+        if point is None:
+            return None
+        if sig is None:
+            sig = signature(doc.get('description'))
+        self.counters['lookups'] += 1
+        best = None
+        with self._lock:
+            candidates = [entry for x, y in neighborhood(*point, self.precision)
+                          for entry in self._buckets.get((x, y, doc.get('type')), {}).values()]
+        for request_id, lat, lon, other, victim_id in candidates:
+            score = similarity(sig, other)
+            if score < self.threshold or (best and score <= best[1]):
+                continue
+            if calculate_distance(point[0], point[1], lat, lon) <= self.radius_km:
+                best = (request_id, score, victim_id)
+        if best:
+            self.counters['matches'] += 1
+        return best
+
+    def add(self, doc, sig=None):
+        """Index a pending request; doc needs _id (or id), type, description and location"""
+        point = _point(doc)
+        if point is None:
+            return
+        if sig is None:
+            sig = signature(doc.get('description'))
+        request_id = str(doc.get('_id') or doc['id'])
+        key = (*_cell(*point, self.precision), doc.get('type'))
+        entry = (request_id, point[0], point[1], sig, str(doc.get('victim_id')))
+        with self._lock:
+            self._remove(request_id)
+            self._buckets.setdefault(key, {})[request_id] = entry
+            self._entries[request_id] = key
+            self.counters['added'] += 1
+
+    def remove(self, request_id):
+        with self._lock:
+            self._remove(str(request_id))
+
+    def _remove(self, request_id):
+        key = self._entries.pop(request_id, None)
+        if key is None:
+            return
+        bucket = self._buckets[key]
+        del bucket[request_id]
+        if not bucket:
+            del self._buckets[key]
+        self.counters['removed'] += 1
+
+    def load(self, requests_collection):
+        """Index every pending request, dropping any other; reloading refreshes"""
+        loaded = set()
+        for doc in requests_collection.find({'status': 'pending'}, INDEX_FIELDS):
+            loaded.add(str(doc['_id']))
+            self.add(doc)
+        with self._lock:
+            for request_id in [r for r in self._entries if r not in loaded]:
+                self._remove(request_id)
+
+    def on_event(self, event):
+        """EventBus listener: pending requests are indexed, any other status is dropped"""
+        if event.get('recipient'):
+            return
+        payload = event['request']
+        if payload['status'] == 'pending':
+            self.add(payload)
+        else:
+            self.remove(payload['id'])
+
+    def stats(self):
+        return dict(self.counters, indexed=len(self._entries), buckets=len(self._buckets),
+                    precision=self.precision, radius_m=self.radius_km * 1000, threshold=self.threshold)
+
+
+def dedup_index_from_env():
+    """DedupIndex configured from the environment, or None if disabled"""
+    if os.getenv('DEDUP', 'on').lower() in ('off', 'false', '0', 'no'):
+        return None
+    return DedupIndex(
+        precision=int(os.getenv('DEDUP_GEOHASH_PRECISION', DEFAULT_PRECISION)),
+        radius_m=float(os.getenv('DEDUP_RADIUS_M', DEFAULT_RADIUS_M)),
+        threshold=float(os.getenv('DEDUP_THRESHOLD', DEFAULT_THRESHOLD))
+    )
+
+
+def add_report(requests_collection, request_id, urgency, now):
+    """Count one more report on a pending request; (before, after), or None if it is no longer pending
+
+    A report more urgent than the request raises its urgency to match.
+    """
+    update = {'$inc': {'reports': 1}, '$set': {'updated_at': now}}
+    less_urgent = [u for u, score in URGENCY_SCORES.items() if score < URGENCY_SCORES[urgency]]
+    before = None
+    if less_urgent:
+        before = requests_collection.find_one_and_update(
+            {'_id': request_id, 'status': 'pending', 'urgency': {'$in': less_urgent}},
+            {'$inc': update['$inc'], '$set': dict(update['$set'], urgency=urgency)},
+            projection={'geo': 0}, return_document=ReturnDocument.BEFORE
+        )
+    if before is not None:
+        return before, dict(before, reports=before.get('reports', 0) + 1, urgency=urgency, updated_at=now)
+    before = requests_collection.find_one_and_update(
+        {'_id': request_id, 'status': 'pending'}, update,
+        projection={'geo': 0}, return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
+        return None
+    return before, dict(before, reports=before.get('reports', 0) + 1, updated_at=now)
+
+
+def sweep(docs, index):
+    """(duplicate doc, original id, similarity, same victim) for docs, oldest first, against index
+
+    Requests with no match are added to the index, so each duplicate points
+    at the oldest request of its group.
+    """
+    found = []
+    for doc in sorted(docs, key=lambda d: d['created_at']):
+        sig = signature(doc.get('description'))
+        match = index.find(doc, sig)
+        if match:
+            found.append((doc, match[0], match[1], match[2] == str(doc.get('victim_id'))))
+        else:
+            index.add(doc, sig)
+    return found
+
+
+def mark_duplicates(requests_collection, found, now=None):
+    """Apply a sweep to the requests still pending; returns [(before, after)] of those changed
+
+    A victim's own copies get status 'duplicate'; the rest are annotated.
+    Each is updated on its own, so only the ones still pending are returned.
+    """
+    now = now or datetime.utcnow()
+    changed = []
+    for doc, original, score, same_victim in found:
+        if same_victim:
+            update = {'status': DUPLICATE, 'duplicate_of': original}
+        else:
+            update = {'possible_duplicate_of': original}
+        update.update(duplicate_similarity=score, updated_at=now)
+        result = requests_collection.update_one({'_id': doc['_id'], 'status': 'pending'}, {'$set': update})
+        if result.modified_count:
+            changed.append((doc, dict(doc, **update)))
+    return changed
+
+
+def main():
+    from dotenv import load_dotenv
+    from bson.objectid import ObjectId
+    from pymongo.mongo_client import MongoClient
+    from pymongo.server_api import ServerApi
+
+    from stats import STATS_FIELDS, record_many
+
+    parser = argparse.ArgumentParser(description='Find near-duplicate pending requests')
+    parser.add_argument('--apply', action='store_true', help='mark the duplicates found')
+    parser.add_argument('--threshold', type=float, help='estimated Jaccard similarity (default DEDUP_THRESHOLD)')
+    args = parser.parse_args()
+
+    load_dotenv()
+    index = dedup_index_from_env() or DedupIndex()
+    if args.threshold is not None:
+        index.threshold = args.threshold
+    db = MongoClient(os.getenv('MONGO_URI_STRING'), server_api=ServerApi('1'))['Database']
+    docs = list(db['requests'].find({'status': 'pending'}, dict(INDEX_FIELDS, **STATS_FIELDS)))
+    found = sweep(docs, index)
+    for doc, original, score, same_victim in found:
+        print(json.dumps({'id': str(doc['_id']), 'duplicate_of': original, 'similarity': score,
+                          'same_victim': same_victim, 'geohash': geohash(*_point(doc), index.precision)}))
+
+    if args.apply and found:
+        now = datetime.utcnow()
+        found = [(doc, ObjectId(original), score, same) for doc, original, score, same in found]
+        changed = mark_duplicates(db['requests'], found, now)
+        # Only the ones still pending were changed; annotations leave the counters alone
+        record_many(db['stats'], changed, now)
+        if changed:
+            db['counters'].update_one({'_id': 'requests'}, {'$inc': {'version': 1}}, upsert=True)
+        print(f'{len(changed)} of {len(docs)} pending requests marked as duplicates', file=sys.stderr)
+    else:
+        print(f'{len(found)} of {len(docs)} pending requests are likely duplicates', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
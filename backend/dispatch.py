@@ -0,0 +1,370 @@
+"""Batch dispatch: one global volunteer-to-request assignment.
+
+/suggestions ranks requests for each volunteer on their own, so during a
+surge many volunteers are pointed at the same few high-urgency requests.
+A dispatch run instead scores every available volunteer against the pending
+requests within DISPATCH_RADIUS_KM, using the same terms as /suggestions,
+and picks the assignment that maximizes the total score. Each volunteer gets
+at most one request and each request at most one volunteer.
+
+Candidates are pruned to the best CANDIDATES_PER_VOLUNTEER requests in
+range of each volunteer, so the assignment is optimal over those edges. It
+is solved with a forward/reverse auction with epsilon scaling. Scores are
+integers, so the final epsilon makes the result exact on that graph.
+
+Proposals are stored in the `proposals` collection, one document per
+volunteer. Each proposed volunteer also gets a `request.proposed` event on
+the event bus. Run once with `python backend/dispatch.py`, or set
+DISPATCH_INTERVAL (seconds) to run it from a thread in the app. With several
+workers, schedule the command rather than running it in every process.
+"""
+from datetime import datetime
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+import numpy as np
+from pymongo import ReplaceOne
+
+from embeddings import semantic_index_from_env
+from events import PROPOSED
+from projections import HAS_LOCATION
+from scoring import (
+    AGE_SCORES, DISTANCE_SCORES, EARTH_RADIUS_KM, SKILL_MATCH_SCORE,
+    SUGGESTION_RADIUS_KM, URGENCY_SCORES, CandidateSet, top_k
+)
+
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_RADIUS_KM = SUGGESTION_RADIUS_KM
+CANDIDATES_PER_VOLUNTEER = 64
+
+KM_PER_DEGREE_LAT = EARTH_RADIUS_KM * np.pi / 180
+
+
+def distance_tiers(radius, semantic_ceiling=0):
+    """Search radii (km), nearest first, with the best score reachable beyond each
+
+    A volunteer whose k-th best score within a tier already reaches that
+    ceiling needs nothing further out.
+    """
+    best_static = max(URGENCY_SCORES.values()) + SKILL_MATCH_SCORE + AGE_SCORES[0][1] + semantic_ceiling
+    limits = [limit for limit, _ in DISTANCE_SCORES if limit < radius] + [radius]
+    tiers = []
+    for limit in limits:
+        further = [points for bucket, points in DISTANCE_SCORES if bucket > limit]
+        tiers.append((limit, (further[0] if further else 0) + best_static))
+    return tiers
+
+
+class CellGrid:
+    """Requests bucketed into cells at least cell_km wide up to max_lat degrees"""
+
+    def __init__(self, lat, lon, cell_km, max_lat):
+        self.lat_step = cell_km / KM_PER_DEGREE_LAT
+        self.lon_step = self.lat_step / max(np.cos(np.radians(min(max_lat, 89.0))), 0.01)
+
+        cells = {}
+        for i, key in enumerate(zip(*self.keys(lat, lon))):
+            cells.setdefault(key, []).append(i)
+        self.cells = {key: np.array(members, dtype=np.intp) for key, members in cells.items()}
+
+    def keys(self, lat, lon):
+        return (np.floor(np.asarray(lat) / self.lat_step).astype(np.int64).tolist(),
+                np.floor(np.asarray(lon) / self.lon_step).astype(np.int64).tolist())
+
+    def around(self, key, reach):
+        """Indices in the cells within reach cells of key"""
+        x, y = key
+        found = [self.cells[(x + dx, y + dy)]
+                 for dx in range(-reach, reach + 1) for dy in range(-reach, reach + 1)
+                 if (x + dx, y + dy) in self.cells]
+        return np.concatenate(found) if found else np.empty(0, dtype=np.intp)
+
+
+def candidate_edges(candidates, volunteers, now, radius=DISPATCH_RADIUS_KM,
+                    per_volunteer=CANDIDATES_PER_VOLUNTEER):
+    """Sparse volunteer x request scores as CSR arrays
+
+    `volunteers` is a list of (latitude, longitude, skills) tuples, as for
+    CandidateSet.score_many. Returns (indptr, cols, scores, distances), where
+    row i lists the best per_volunteer requests within radius of volunteer i,
+    highest score first.
+
+    Volunteers are grouped by grid cell and searched outwards one distance
+    bucket at a time, so in a dense area only the nearest requests are scored.
+    """
+    m = len(volunteers)
+    rows = [(np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int64), np.empty(0))] * m
+    if not m or not len(candidates):
+        return _to_csr(rows)
+
+    vol_lat = np.array([float(v[0]) for v in volunteers])
+    vol_lon = np.array([float(v[1]) for v in volunteers])
+    tiers = distance_tiers(radius, candidates.semantic_ceiling)
+    cell_km = tiers[0][0]
+    max_lat = max(np.abs(candidates.lat).max(), np.abs(vol_lat).max())
+    grid = CellGrid(candidates.lat, candidates.lon, cell_km, max_lat)
+
+    groups = {}
+    for i, key in enumerate(zip(*grid.keys(vol_lat, vol_lon))):
+        groups.setdefault(key, []).append(i)
+
+    for key, members in groups.items():
+        for t, (limit, ceiling) in enumerate(tiers):
+            last = t == len(tiers) - 1
+            nearby = grid.around(key, int(np.ceil(limit / cell_km)))
+            if not len(nearby):
+                continue
+
+            scores, distances = candidates.take(nearby).score_many([volunteers[i] for i in members], now)
+            scores = np.where(distances <= limit, scores, -1)
+            best = top_k(scores, per_volunteer)
+
+            # Keep volunteers whose k-th best here beats anything further out
+            remaining = []
+            for row, i in enumerate(members):
+                kept = best[row][scores[row, best[row]] >= 0]
+                if last or (len(kept) == per_volunteer and scores[row, kept[-1]] >= ceiling):
+                    rows[i] = (nearby[kept], scores[row, kept], distances[row, kept])
+                else:
+                    remaining.append(i)
+            members = remaining
+            if not members:
+                break
+
+    return _to_csr(rows)
+
+
+def _to_csr(rows):
+    indptr = np.zeros(len(rows) + 1, dtype=np.intp)
+    indptr[1:] = np.cumsum([len(r[0]) for r in rows])
+    if not rows:
+        return indptr, np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int64), np.empty(0)
+    return (indptr,
+            np.concatenate([r[0] for r in rows]).astype(np.intp),
+            np.concatenate([r[1] for r in rows]).astype(np.int64),
+            np.concatenate([r[2] for r in rows]).astype(np.float64))
+
+
+def auction(indptr, cols, benefit, n_objects):
+    """Maximum-benefit assignment over sparse non-negative integer benefits
+
+    Rows (persons) are matched to at most one column (object) each, and a
+    person may stay unassigned at value 0. Returns (assignment, prices):
+    assignment[i] is the object for person i or -1; prices are in units of
+    benefit * (persons + 1).
+
+    Each epsilon phase runs a forward auction, in which all unassigned persons
+    bid at once, then a reverse pass that brings the prices of objects left
+    unassigned back to zero. Benefits are multiplied by persons + 1 first,
+    so ending within persons * epsilon of the optimum at epsilon 1 means
+    being exactly optimal.
+    """
+    m = len(indptr) - 1
+    counts = np.diff(indptr)
+    weight = np.asarray(benefit, dtype=np.int64) * (m + 1)
+    prices = np.zeros(n_objects, dtype=np.int64)
+    assignment = np.full(m, -1, dtype=np.intp)
+    if not len(weight):
+        return assignment, prices
+
+    # Persons bidding on each object, for the reverse pass
+    rows = np.repeat(np.arange(m), counts)
+    by_object = np.argsort(cols, kind='stable')
+    object_ptr = np.searchsorted(cols[by_object], np.arange(n_objects + 1))
+
+    eps = max(int(weight.max()) // 4, 1)
+    while True:
+        assignment[:] = -1
+        owner = np.full(n_objects, -1, dtype=np.intp)
+        _forward(indptr, cols, weight, counts, prices, assignment, owner, eps)
+        _reverse(indptr, cols, weight, rows, by_object, object_ptr, prices, assignment, owner, eps)
+        if eps == 1:
+            return assignment, prices
+        eps = max(eps // 5, 1)
+
+
+def _forward(indptr, cols, weight, counts, prices, assignment, owner, eps):
+    """Auction until every person holds an object or prefers none"""
+    active = np.flatnonzero(counts > 0)
+    while len(active):
+        # Every edge of every active person, grouped by person
+        lengths = counts[active]
+        seg_starts = np.cumsum(lengths) - lengths
+        seg = np.repeat(np.arange(len(active)), lengths)
+        edges = np.repeat(indptr[active] - seg_starts, lengths) + np.arange(lengths.sum())
+        values = weight[edges] - prices[cols[edges]]
+
+        # Best and second-best value per person; staying unassigned is worth 0
+        best = np.maximum.reduceat(values, seg_starts)
+        at_best = np.flatnonzero(values == best[seg])
+        _, first = np.unique(seg[at_best], return_index=True)
+        best_pos = at_best[first]
+        values[best_pos] = np.iinfo(np.int64).min
+        second = np.maximum(np.maximum.reduceat(values, seg_starts), 0)
+
+        # Persons for whom no object beats staying unassigned drop out
+        bidding = best > 0
+        bidders = active[bidding]
+        objects = cols[edges[best_pos[bidding]]]
+        bids = prices[objects] + best[bidding] - second[bidding] + eps
+
+        # Highest bid per object wins, ties to the lowest person index
+        order = np.lexsort((bidders, -bids, objects))
+        objects, bidders, bids = objects[order], bidders[order], bids[order]
+        wins = np.ones(len(objects), dtype=bool)
+        wins[1:] = objects[1:] != objects[:-1]
+        won, winners = objects[wins], bidders[wins]
+
+        outbid = owner[won]
+        outbid = outbid[outbid >= 0]
+        assignment[outbid] = -1
+        owner[won] = winners
+        assignment[winners] = won
+        prices[won] = bids[wins]
+
+        active = np.concatenate([bidders[~wins], outbid])
+
+
+def _reverse(indptr, cols, weight, rows, by_object, object_ptr, prices, assignment, owner, eps):
+    """Lower the price of every unassigned object to zero, reassigning as needed
+
+    Objects priced in earlier phases can end a phase unassigned; the result
+    is only optimal once all of them are free again.
+    """
+    profit = np.zeros(len(assignment), dtype=np.int64)
+    for i in np.flatnonzero(assignment >= 0):
+        row = slice(indptr[i], indptr[i + 1])
+        profit[i] = weight[row][cols[row] == assignment[i]][0] - prices[assignment[i]]
+
+    pending = list(np.flatnonzero((owner < 0) & (prices > 0)))
+    while pending:
+        j = pending.pop()
+        edges = by_object[object_ptr[j]:object_ptr[j + 1]]
+        persons = rows[edges]
+        values = weight[edges] - profit[persons]
+        top = np.argmax(values)
+        if values[top] <= eps:
+            prices[j] = 0
+            continue
+
+        values[top] = np.iinfo(np.int64).min
+        second = values.max() if len(values) > 1 else 0
+        prices[j] = max(0, second - eps)
+
+        i = persons[top]
+        previous = assignment[i]
+        profit[i] = weight[edges[top]] - prices[j]
+        assignment[i] = j
+        owner[j] = i
+        if previous >= 0:
+            owner[previous] = -1
+            if prices[previous] > 0:
+                pending.append(previous)
+
+
+def assign(candidates, volunteers, now, radius=DISPATCH_RADIUS_KM, per_volunteer=CANDIDATES_PER_VOLUNTEER):
+    """Optimal (volunteer index, candidate index, score, distance) assignments"""
+    indptr, cols, scores, distances = candidate_edges(candidates, volunteers, now, radius, per_volunteer)
+    assignment, _ = auction(indptr, cols, scores, len(candidates))
+
+    result = []
+    for i in np.flatnonzero(assignment >= 0):
+        row = slice(indptr[i], indptr[i + 1])
+        edge = indptr[i] + np.flatnonzero(cols[row] == assignment[i])[0]
+        result.append((int(i), int(assignment[i]), int(scores[edge]), float(distances[edge])))
+    return result
+
+
+def available_volunteers(users_collection, requests_collection):
+    """Volunteers with a location who are not already helping with a request"""
+    busy = set(requests_collection.distinct('volunteer_id', {'status': 'in_progress'}))
+    users = users_collection.find(
+        dict({'role': 'volunteer'}, **HAS_LOCATION),
+        {'location': 1, 'skills': 1}
+    )
+    return [user for user in users if user['_id'] not in busy]
+
+
+def run_dispatch(requests_collection, users_collection, proposals_collection, bus=None, now=None,
+                 semantic=None):
+    """Solve one dispatch round, store the proposals and notify the volunteers
+
+    Returns the number of proposals made.
+    """
+    now = now or datetime.utcnow()
+    candidates = CandidateSet.from_documents(
+        list(requests_collection.find({'status': 'pending'}, {'geo': 0})), semantic
+    )
+    users = available_volunteers(users_collection, requests_collection)
+    volunteers = [(u['location']['latitude'], u['location']['longitude'], u.get('skills', []))
+                  for u in users]
+
+    assignments = assign(candidates, volunteers, now)
+
+    run_id = uuid.uuid4().hex
+    proposals = [ReplaceOne({'_id': users[i]['_id']}, {
+        'request_id': candidates.docs[j]['_id'],
+        'score': score,
+        'distance': round(distance, 2),
+        'run_id': run_id,
+        'proposed_at': now
+    }, upsert=True) for i, j, score, distance in assignments]
+    if proposals:
+        proposals_collection.bulk_write(proposals, ordered=False)
+    proposals_collection.delete_many({'run_id': {'$ne': run_id}})
+
+    if bus is not None:
+        for i, j, _, _ in assignments:
+            bus.publish(PROPOSED, candidates.docs[j], recipient=str(users[i]['_id']))
+
+    return len(assignments)
+
+
+def dispatch_loop(requests_collection, users_collection, proposals_collection, bus, interval, semantic=None):
+    while True:
+        try:
+            run_dispatch(requests_collection, users_collection, proposals_collection, bus, semantic=semantic)
+        except Exception:
+            # e.g. a request with a malformed location; the next run tries again
+            logger.exception('Dispatch run failed')
+        time.sleep(interval)
+
+
+def start_dispatcher(requests_collection, users_collection, proposals_collection, bus, interval, semantic=None):
+    thread = threading.Thread(
+        target=dispatch_loop,
+        args=(requests_collection, users_collection, proposals_collection, bus, interval, semantic),
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo.mongo_client import MongoClient
+    from pymongo.server_api import ServerApi
+
+    argparse.ArgumentParser(description='Run one dispatch round').parse_args()
+
+    load_dotenv()
+    db = MongoClient(os.getenv('MONGO_URI_STRING'), server_api=ServerApi('1'))['Database']
+    start = time.perf_counter()
+    semantic = semantic_index_from_env()
+    if semantic:
+        semantic.warm(db['requests'].find({'status': 'pending'}, {'type': 1, 'description': 1}))
+    count = run_dispatch(db['requests'], db['users'], db['proposals'], semantic=semantic)
+    print(f'{count} proposals in {time.perf_counter() - start:.2f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    sys.exit(main())
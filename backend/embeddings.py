@@ -0,0 +1,357 @@
+"""Semantic matching of request descriptions to volunteer skills.
+
+Each request's type and description are embedded once, by a background
+thread that works in batches. Vectors are float32 rows of one growable
+matrix, keyed by a hash of the provider and the text. They are appended to
+an on-disk cache, so a restart or a second worker does not embed the same
+text again. A volunteer's profile is the normalized mean of the vectors of
+their skills' descriptions. Scoring takes the dot product of the profile
+with every candidate at once (see CandidateSet in scoring.py), and never
+calls the model: a text not embedded yet scores no semantic points and is
+queued.
+
+Providers are chosen with EMBEDDING_PROVIDER:
+
+- none (default): no semantic term;
+- hashing: signed feature hashing of words and character trigrams;
+  deterministic, local and fast, for development, tests and benchmarks,
+  which opt in to it;
+- openai: the embeddings API, with EMBEDDING_MODEL (text-embedding-3-small)
+  and OPENAI_API_KEY;
+- module:factory: any callable returning an object with `name`, `dim` and
+  `embed(texts)` -> float32 array of unit rows.
+
+The cache lives in EMBEDDING_CACHE_DIR (default `backend/embeddings`), one
+file per provider and dimension.
+"""
+import hashlib
+import importlib
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIM = 256
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'embeddings')
+
+# What each skill covers, embedded to build volunteer profiles
+SKILL_DESCRIPTIONS = {
+    'food': 'food: meals, groceries, cooking, hungry family needs something to eat, baby formula',
+    'water': 'water: drinking water, bottled water, thirsty, dehydrated, no clean water supply',
+    'shelter': 'shelter: place to stay, roof damaged, tent, blankets, evacuated from home, housing',
+    'transport': 'transport: ride, car, drive to hospital or shelter, evacuation, pickup, stranded, boat',
+    'medical': 'medical: medicine, insulin, prescription, first aid, injury, doctor, nurse, oxygen',
+    'other': 'other: general help, assistance, supplies, cleanup, phone charging, pets'
+}
+
+_TOKEN = re.compile(r'\w+')
+
+
+def normalize(vectors):
+    """Rows scaled to unit length, as float32; zero rows stay zero"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def request_text(doc):
+    return f"{doc.get('type', '')}: {doc.get('description', '')}"
+
+
+class HashingEmbedder:
+    """Deterministic local embedder: signed feature hashing of words and trigrams"""
+
+    def __init__(self, dim=DEFAULT_DIM):
+        self.dim = dim
+        self.name = 'hashing'
+
+    def _features(self, text):
+        words = _TOKEN.findall(text.lower())
+        for word in words:
+            yield word, 1.0
+            padded = f'#{word}#'
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], 0.5
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], 'little') % self.dim
+                vectors[row, bucket] += weight if digest[4] & 1 else -weight
+        return normalize(vectors)
+
+
+class OpenAIEmbedder:
+    """Embeddings API, asking for compact `dim`-sized vectors"""
+
+    def __init__(self, model='text-embedding-3-small', dim=DEFAULT_DIM, api_key=None):
+        from openai import OpenAI
+        self.client = OpenAI(api_key=api_key)
+        self.model = model
+        self.dim = dim
+        self.name = f'openai-{model}'
+
+    def embed(self, texts):
+        response = self.client.embeddings.create(model=self.model, input=list(texts), dimensions=self.dim)
+        return normalize([item.embedding for item in response.data])
+
+
+def make_embedder(provider):
+    """Embedder for an EMBEDDING_PROVIDER value, or None for 'none'"""
+    dim = int(os.getenv('EMBEDDING_DIM', DEFAULT_DIM))
+    if provider == 'none':
+        return None
+    if provider == 'hashing':
+        return HashingEmbedder(dim)
+    if provider == 'openai':
+        return OpenAIEmbedder(os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small'), dim,
+                              os.getenv('OPENAI_API_KEY'))
+    module, _, factory = provider.partition(':')
+    if not factory:
+        raise ValueError(f'Unknown embedding provider {provider!r}')
+    return getattr(importlib.import_module(module), factory)()
+
+
+class VectorStore:
+    """float32 vectors by content key in one growable matrix, backed by an append-only file
+
+    Each file record is the 20-byte key followed by the vector, written with a
+    single append under an exclusive lock, so concurrent writers do not
+    interleave records. A record cut short by a crash is cut off the file
+    by the next load or append, so the records after it stay aligned.
+    """
+
+    def __init__(self, dim, path=None, capacity=1024):
+        self.dim = dim
+        self.path = path
+        self._record = np.dtype([('key', 'u1', (20,)), ('vector', '<f4', (dim,))])
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._rows = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, 'r+b') as f:
+            _lock(f)
+            size = self._align(f) // self._record.itemsize
+            f.seek(0)
+            records = np.fromfile(f, dtype=self._record, count=size)
+        self._append([key.tobytes() for key in records['key']], records['vector'])
+        logger.info('Loaded %d cached embeddings from %s', len(self._rows), self.path)
+
+    def _align(self, f):
+        """Drop a partial record from the end of the open file; returns its length"""
+        end = f.seek(0, os.SEEK_END)
+        torn = end % self._record.itemsize
+        if torn:
+            logger.warning('Dropping %d bytes of a partly written embedding from %s', torn, self.path)
+            f.truncate(end - torn)
+        return end - torn
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def rows(self, keys):
+        """Row of each key, -1 where it has no vector yet"""
+        return np.fromiter((self._rows.get(key, -1) for key in keys), dtype=np.intp, count=len(keys))
+
+    def take(self, rows):
+        """Vectors for rows, zero where the row is -1"""
+        matrix = self._matrix
+        vectors = matrix[np.maximum(rows, 0)]
+        vectors[rows < 0] = 0
+        return vectors
+
+    def add(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            fresh = [i for i, key in enumerate(keys) if key not in self._rows]
+            if not fresh:
+                return
+            self._append([keys[i] for i in fresh], vectors[fresh])
+        if self.path:
+            records = np.empty(len(fresh), dtype=self._record)
+            records['key'] = np.frombuffer(b''.join(keys[i] for i in fresh), dtype=np.uint8).reshape(-1, 20)
+            records['vector'] = vectors[fresh]
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'ab') as f:
+                _lock(f)
+                self._align(f)
+                f.write(records.tobytes())
+
+    def _append(self, keys, vectors):
+        start = self._size
+        if start + len(keys) > len(self._matrix):
+            grown = np.zeros((max(2 * len(self._matrix), start + len(keys)), self.dim), dtype=np.float32)
+            grown[:start] = self._matrix[:start]
+            self._matrix = grown
+        self._matrix[start:start + len(keys)] = vectors
+        self._size += len(keys)
+        # Rows become visible only once their vectors are in place; a key
+        # appended twice to the file (by two workers) keeps its first row
+        for offset, key in enumerate(keys):
+            self._rows.setdefault(key, start + offset)
+
+
+def _lock(f):
+    """Hold an exclusive lock on an open file until it is closed, where supported"""
+    if fcntl:
+        fcntl.flock(f, fcntl.LOCK_EX)
+
+
+class SemanticIndex:
+    """Request and skill vectors, filled in the background by one embedder"""
+
+    def __init__(self, embedder, store, batch_size=DEFAULT_BATCH_SIZE, max_queue=10000):
+        self.embedder = embedder
+        self.store = store
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._queued = set()
+        self._queued_lock = threading.Lock()
+        self._profiles = {}
+        self.counters = dict.fromkeys(['embedded', 'batches', 'misses', 'dropped', 'errors'], 0)
+
+    def key(self, text):
+        return hashlib.sha1(f'{self.embedder.name}\0{text}'.encode()).digest()
+
+    def vectors(self, docs):
+        """One row per request document; zero for those not embedded yet, which are queued"""
+        keys = [self.key(request_text(doc)) for doc in docs]
+        rows = self.store.rows(keys)
+        missing = np.flatnonzero(rows < 0)
+        if len(missing):
+            self.counters['misses'] += len(missing)
+            self.submit([docs[i] for i in missing])
+        return self.store.take(rows)
+
+    def profile(self, skills):
+        """Unit vector for a set of skills, or None until their descriptions are embedded"""
+        skills = frozenset(skills or [])
+        if skills in self._profiles:
+            return self._profiles[skills]
+        texts = [SKILL_DESCRIPTIONS[s] for s in sorted(skills) if s in SKILL_DESCRIPTIONS]
+        if not texts:
+            return None
+        rows = self.store.rows([self.key(text) for text in texts])
+        if (rows < 0).any():
+            return None
+        profile = normalize(self.store.take(rows).mean(axis=0))
+        self._profiles[skills] = profile
+        return profile
+
+    def similarity(self, req, skills):
+        """Cosine similarity of one request to a set of skills (0 if unknown)"""
+        profile = self.profile(skills)
+        if profile is None:
+            return 0.0
+        return self.vectors([req])[0] @ profile
+
+    def submit(self, docs):
+        """Queue request documents for embedding; never blocks"""
+        for doc in docs:
+            text = request_text(doc)
+            key = self.key(text)
+            with self._queued_lock:
+                if key in self.store or key in self._queued:
+                    continue
+                self._queued.add(key)
+            try:
+                self._queue.put_nowait((key, text, doc.get('_id')))
+            except queue.Full:
+                with self._queued_lock:
+                    self._queued.discard(key)
+                self.counters['dropped'] += 1
+
+    def embed_now(self, items):
+        """Embed (key, text) pairs that are not stored yet, in batches; calls the model"""
+        items = [(key, text) for key, text in items if key not in self.store]
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            self.store.add([key for key, _ in batch], self.embedder.embed([text for _, text in batch]))
+            self.counters['embedded'] += len(batch)
+            self.counters['batches'] += 1
+
+    def warm(self, docs=()):
+        """Embed the skill descriptions and the given requests before returning"""
+        self.embed_now([(self.key(text), text) for text in SKILL_DESCRIPTIONS.values()])
+        self.embed_now((self.key(request_text(doc)), request_text(doc)) for doc in docs)
+
+    def start(self, backlog=None, on_embedded=None, on_ready=None):
+        """Embed in a background thread
+
+        backlog() returns requests to embed once the skills are ready, e.g.
+        the pending ones. on_ready() is called once volunteer profiles are
+        available, and on_embedded(request_ids) after each batch.
+        """
+        thread = threading.Thread(target=self._run, args=(backlog, on_embedded, on_ready), daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self, backlog, on_embedded, on_ready):
+        while True:
+            try:
+                self.warm()
+                break
+            except Exception:
+                logger.exception('Could not embed the skill descriptions; retrying')
+                self.counters['errors'] += 1
+                time.sleep(30)
+        if on_ready:
+            on_ready()
+        if backlog:
+            self.submit(backlog())
+
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.embed_now([(key, text) for key, text, _ in batch])
+            except Exception:
+                logger.exception('Embedding batch of %d failed', len(batch))
+                self.counters['errors'] += 1
+                continue
+            finally:
+                with self._queued_lock:
+                    self._queued.difference_update(key for key, _, _ in batch)
+            if on_embedded:
+                on_embedded([request_id for _, _, request_id in batch if request_id is not None])
+
+    def stats(self):
+        return dict(self.counters, provider=self.embedder.name, dim=self.embedder.dim,
+                    stored=len(self.store), queued=self._queue.qsize())
+
+
+def semantic_index_from_env():
+    """SemanticIndex configured from the environment, or None if disabled"""
+    embedder = make_embedder(os.getenv('EMBEDDING_PROVIDER', 'none'))
+    if embedder is None:
+        return None
+    cache_dir = os.getenv('EMBEDDING_CACHE_DIR', DEFAULT_CACHE_DIR)
+    path = os.path.join(cache_dir, f'{embedder.name}-{embedder.dim}.vec') if cache_dir else None
+    return SemanticIndex(embedder, VectorStore(embedder.dim, path),
+                         batch_size=int(os.getenv('EMBEDDING_BATCH_SIZE', DEFAULT_BATCH_SIZE)))
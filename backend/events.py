@@ -0,0 +1,253 @@
+"""Request lifecycle events pushed to clients over Server-Sent Events.
+
+The write endpoints publish onto an in-process EventBus. With several
+worker processes, set EVENT_SOURCE=change_stream instead: one thread per
+process then tails the MongoDB change stream on the requests collection
+(replica set required) and publishes every write, whichever worker made it.
+
+Each subscriber gets a small bounded queue. A subscriber that falls too far
+behind is sent a `resync` event and disconnected; EventSource reconnects
+with Last-Event-ID and missed events are replayed from a short history.
+
+A stream only parks on its queue between events, so serve the app with a
+cooperative worker (e.g. `gunicorn -c gunicorn.conf.py -k gevent app:app`)
+to hold thousands of idle connections without a thread each.
+"""
+from collections import deque
+import json
+import logging
+import queue
+import threading
+import time
+
+from pymongo.errors import PyMongoError
+
+from scoring import calculate_distance
+
+
+logger = logging.getLogger(__name__)
+
+
+CREATED = 'request.created'
+CLAIMED = 'request.claimed'
+STATUS_CHANGED = 'request.status_changed'
+FULFILLED = 'request.fulfilled'
+# Sent only to the volunteer a dispatch run proposes for the request
+PROPOSED = 'request.proposed'
+
+
+def status_event(status):
+    """Event type published when a request moves to status"""
+    if status == 'in_progress':
+        return CLAIMED
+    if status == 'fulfilled':
+        return FULFILLED
+    return STATUS_CHANGED
+
+
+def event_payload(req):
+    """Public fields of a request, enough for clients to apply the change locally"""
+    return {
+        'id': str(req['_id']),
+        'type': req['type'],
+        'urgency': req['urgency'],
+        'status': req['status'],
+        'description': req['description'],
+        'location': req.get('location', {}),
+        'victim_id': str(req['victim_id']),
+        'victim_name': req.get('victim_name'),
+        'volunteer_id': str(req['volunteer_id']) if req.get('volunteer_id') else None,
+        'volunteer_name': req.get('volunteer_name'),
+        'created_at': req['created_at'].isoformat(),
+        'updated_at': req['updated_at'].isoformat() if req.get('updated_at') else None
+    }
+
+
+class Subscription:
+    """One client's filters and pending events"""
+
+    def __init__(self, types=None, urgencies=None, center=None, radius=None,
+                 victim_id=None, user_id=None, notify=None, maxsize=256):
+        self.types = set(types) if types else None
+        self.urgencies = set(urgencies) if urgencies else None
+        self.center = center
+        self.radius = radius
+        self.victim_id = victim_id
+        self.user_id = user_id
+        # Called from the publishing thread after each queued event or overflow
+        self.notify = notify
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+
+    def distance_to(self, payload):
+        location = payload['location']
+        if not (self.center and location.get('latitude') and location.get('longitude')):
+            return None
+        return calculate_distance(
+            float(self.center['latitude']), float(self.center['longitude']),
+            float(location['latitude']), float(location['longitude'])
+        )
+
+    def matches(self, payload, distance):
+        if self.victim_id and payload['victim_id'] != self.victim_id:
+            return False
+        if self.types and payload['type'] not in self.types:
+            return False
+        if self.urgencies and payload['urgency'] not in self.urgencies:
+            return False
+        if self.radius and (distance is None or distance > self.radius):
+            return False
+        return True
+
+    def offer(self, event):
+        """Queue an event if it passes the filters; False once the client has fallen behind"""
+        if event.get('recipient') and event['recipient'] != self.user_id:
+            return True
+        distance = self.distance_to(event['request'])
+        if not self.matches(event['request'], distance):
+            return True
+        try:
+            self.queue.put_nowait((event, distance))
+        except queue.Full:
+            self.overflowed = True
+        if self.notify:
+            self.notify()
+        return not self.overflowed
+
+
+class EventBus:
+    """Fan-out of request events to subscriptions, with a replay history"""
+
+    def __init__(self, history=1000):
+        self._subscriptions = set()
+        self._listeners = []
+        self._history = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._counters = dict.fromkeys(['published', 'delivered', 'overflows', 'listener_errors'], 0)
+
+    def publish(self, event_type, req, recipient=None):
+        """Send an event about a request document to every matching subscriber
+
+        With a recipient (a user id), only that user's subscriptions get it.
+        """
+        payload = event_payload(req)
+        with self._lock:
+            event = {'id': self._next_id, 'event': event_type, 'request': payload}
+            if recipient:
+                event['recipient'] = recipient
+            self._next_id += 1
+            self._history.append(event)
+            subscriptions = list(self._subscriptions)
+            self._counters['published'] += 1
+
+        # The write is already committed: a failing listener must not fail
+        # the request or keep the event from the others
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception:
+                logger.exception('Event listener %r failed on event %d', listener, event['id'])
+                with self._lock:
+                    self._counters['listener_errors'] += 1
+
+        for subscription in subscriptions:
+            if subscription.overflowed:
+                continue
+            if not subscription.offer(event):
+                with self._lock:
+                    self._counters['overflows'] += 1
+        return event
+
+    def add_listener(self, listener):
+        """Call listener(event) in the publishing thread for every event"""
+        self._listeners.append(listener)
+
+    def subscribe(self, last_event_id=None, **filters):
+        """Register a subscription, replaying events after last_event_id"""
+        subscription = Subscription(**filters)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            missed = []
+            if last_event_id is not None:
+                missed = [e for e in self._history if e['id'] > last_event_id]
+                oldest = missed[0]['id'] if missed else self._next_id
+                if oldest > last_event_id + 1 or last_event_id >= self._next_id:
+                    # History no longer reaches back, or ids restarted with the process
+                    subscription.overflowed = True
+                    missed = []
+        for event in missed:
+            subscription.offer(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    @property
+    def last_event_id(self):
+        with self._lock:
+            return self._next_id - 1
+
+    def delivered(self):
+        with self._lock:
+            self._counters['delivered'] += 1
+
+    def stats(self):
+        """Counters plus current subscriber count, for monitoring"""
+        with self._lock:
+            return dict(self._counters, subscribers=len(self._subscriptions),
+                        last_event_id=self._next_id - 1)
+
+
+def format_sse(event, distance=None):
+    """Encode an event as a Server-Sent Events frame"""
+    data = dict(event['request'], distance=round(distance, 2) if distance is not None else None)
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def sse_stream(bus, subscription, heartbeat=15):
+    """Yield SSE frames for a subscription until the client goes away"""
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            if subscription.overflowed and subscription.queue.empty():
+                # Advance the client's Last-Event-ID so its reconnect starts fresh
+                yield f'id: {bus.last_event_id}\nevent: resync\ndata: {{}}\n\n'
+                return
+            try:
+                event, distance = subscription.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            bus.delivered()
+            yield format_sse(event, distance)
+    finally:
+        bus.unsubscribe(subscription)
+
+
+def watch_requests(collection, bus, retry_delay=5):
+    """Publish every request insert and status change seen on the change stream"""
+    pipeline = [{'$match': {'operationType': {'$in': ['insert', 'update']}}}]
+    resume_token = None
+    while True:
+        try:
+            with collection.watch(pipeline, full_document='updateLookup',
+                                  resume_after=resume_token) as changes:
+                for change in changes:
+                    resume_token = changes.resume_token
+                    req = change.get('fullDocument')
+                    if not req:
+                        continue
+                    if change['operationType'] == 'insert':
+                        bus.publish(CREATED, req)
+                    elif 'status' in change['updateDescription']['updatedFields']:
+                        bus.publish(status_event(req['status']), req)
+        except PyMongoError:
+            time.sleep(retry_delay)
+
+
+def start_change_stream_watcher(collection, bus):
+    thread = threading.Thread(target=watch_requests, args=(collection, bus), daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,22 @@
+"""gunicorn settings: start each worker once it is forked.
+
+create_app() forks the password hash workers and starts threads, so it runs
+in every worker right after the fork, before the worker takes traffic,
+whether or not the app was imported in the master (--preload).
+
+ADMISSION_CAPACITY defaults to the thread count, so admission control and
+the password hash slots (half of it) are sized to what a worker can serve.
+
+Usage: gunicorn -c gunicorn.conf.py app:app
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '127.0.0.1:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', 2))
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+os.environ.setdefault('ADMISSION_CAPACITY', str(threads))
+
+
+def post_fork(server, worker):
+    from app import create_app
+    create_app()
@@ -0,0 +1,220 @@
+"""Index declarations for the users and requests collections.
+
+`ensure_indexes` applies them idempotently at startup, and drops the ones
+listed in SUPERSEDED_REQUEST_INDEXES. Run this module to apply them by hand or to
+verify that every query shape of the endpoints and background jobs is
+served by an index:
+
+    python backend/indexes.py apply
+    python backend/indexes.py check    # exits 1 on a COLLSCAN, or an in-memory SORT
+"""
+from datetime import datetime
+import argparse
+import logging
+import os
+import sys
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure
+
+from projections import HAS_LOCATION
+
+
+logger = logging.getLogger(__name__)
+
+USER_INDEXES = [
+    IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+]
+
+REQUEST_INDEXES = [
+    IndexModel([('geo', GEOSPHERE)], name='geo_2dsphere'),
+    # Listings and exports, sorted by creation with _id as tie-breaker
+    IndexModel([('status', ASCENDING), ('type', ASCENDING), ('urgency', ASCENDING), ('created_at', DESCENDING),
+                ('_id', DESCENDING)], name='status_type_urgency_created_at_id'),
+    IndexModel([('status', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+               name='status_created_at_id'),
+    IndexModel([('victim_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+               name='victim_id_created_at_id'),
+    IndexModel([('volunteer_id', ASCENDING)], name='volunteer_id'),
+    # The archiver's finished requests by last update
+    IndexModel([('status', ASCENDING), ('updated_at', ASCENDING)], name='status_updated_at'),
+    IndexModel([('duplicate_of', ASCENDING), ('created_at', ASCENDING)], name='duplicate_of_created_at',
+               partialFilterExpression={'status': 'duplicate'}),
+]
+
+INDEXES = {
+    'users': USER_INDEXES,
+    'requests': REQUEST_INDEXES,
+}
+
+# Request indexes replaced by one above: {old name: replacement}
+SUPERSEDED_REQUEST_INDEXES = {
+    'status_type_urgency_created_at': 'status_type_urgency_created_at_id',
+    'victim_id_created_at': 'victim_id_created_at_id',
+}
+
+
+def to_geo_point(location):
+    """Convert a {latitude, longitude} location into a GeoJSON point"""
+    if not location or not location.get('latitude') or not location.get('longitude'):
+        return None
+    return {
+        'type': 'Point',
+        'coordinates': [float(location['longitude']), float(location['latitude'])]
+    }
+
+
+def backfill_geo_points(requests_collection):
+    """Give older requests the GeoJSON point the 2dsphere index is built on"""
+    requests_collection.update_many(
+        {
+            'geo': {'$exists': False},
+            'location.latitude': {'$type': 'number'},
+            'location.longitude': {'$type': 'number'}
+        },
+        [{'$set': {'geo': {
+            'type': 'Point',
+            'coordinates': ['$location.longitude', '$location.latitude']
+        }}}]
+    )
+
+
+def ensure_indexes(db):
+    """Create any missing indexes; returns the names that could not be built"""
+    failed = []
+    for collection_name, models in INDEXES.items():
+        for model in models:
+            try:
+                db[collection_name].create_indexes([model])
+            except OperationFailure as e:
+                # e.g. duplicate emails blocking the unique index; keep serving
+                name = model.document['name']
+                logger.error('Could not create index %s.%s: %s', collection_name, name, e)
+                failed.append(name)
+    drop_superseded(db['requests'], failed)
+    return failed
+
+
+def drop_superseded(requests_collection, failed=()):
+    """Drop request indexes whose replacement has been built"""
+    existing = requests_collection.index_information()
+    for name, replacement in SUPERSEDED_REQUEST_INDEXES.items():
+        if name in existing and replacement not in failed:
+            requests_collection.drop_index(name)
+
+
+def query_shapes():
+    """(name, collection, kind, spec) for the queries each endpoint issues"""
+    some_id = ObjectId()
+    now = datetime.utcnow()
+    near = {'type': 'Point', 'coordinates': [-95.37, 29.76]}
+    by_created = [('created_at', DESCENDING), ('_id', DESCENDING)]
+    oldest_first = [('created_at', ASCENDING), ('_id', ASCENDING)]
+    finished = {'$in': ['fulfilled', 'cancelled']}
+
+    def geo_near(query):
+        return [{'$geoNear': {'near': near, 'key': 'geo', 'distanceField': 'distance',
+                              'spherical': True, 'query': query}}, {'$limit': 10}]
+
+    return [
+        ('signup/login: user by email', 'users', 'find', ({'email': 'someone@example.com'}, None)),
+        ('get_current_user: user by id', 'users', 'find', ({'_id': some_id}, None)),
+        ('GET /requests victim', 'requests', 'find', ({'victim_id': some_id}, by_created)),
+        ('GET /requests volunteer', 'requests', 'find', ({'status': 'pending'}, by_created)),
+        ('GET /requests volunteer by type', 'requests', 'find',
+         ({'status': 'pending', 'type': 'food'}, by_created)),
+        ('GET /requests volunteer by type+urgency', 'requests', 'find',
+         ({'status': 'pending', 'type': 'food', 'urgency': 'high'}, by_created)),
+        ('GET /requests volunteer page', 'requests', 'find',
+         ({'status': 'pending', '$or': [{'created_at': {'$lt': now}},
+                                        {'created_at': now, '_id': {'$lt': some_id}}]}, by_created)),
+        ('GET /requests volunteer near', 'requests', 'aggregate', geo_near({'status': 'pending'})),
+        ('GET /map/data without location', 'requests', 'find', ({'status': 'pending'}, [('_id', ASCENDING)])),
+        ('GET /map/data near', 'requests', 'aggregate', geo_near({'status': 'pending', 'type': 'food'})),
+        ('GET /suggestions', 'requests', 'aggregate', geo_near({'status': 'pending'})),
+        ('claim / status update by id', 'requests', 'find', ({'_id': some_id, 'status': 'pending'}, None)),
+        ('requests by volunteer', 'requests', 'find', ({'volunteer_id': some_id}, None)),
+        ('GET /requests/export by status', 'requests', 'find',
+         ({'status': 'fulfilled', 'created_at': {'$gte': now}}, oldest_first)),
+        ('GET /requests/export by statuses', 'requests', 'find', ({'status': finished}, oldest_first)),
+        ('GET /requests/export victim', 'requests', 'find', ({'victim_id': some_id}, oldest_first)),
+        ('archiver: finished before cutoff', 'requests', 'find',
+         ({'status': finished, 'updated_at': {'$lt': now}}, None)),
+        ('tile index load', 'requests', 'find', (dict({'status': 'pending'}, **HAS_LOCATION), None)),
+        ('dedup index load', 'requests', 'find', ({'status': 'pending'}, None)),
+        ('duplicates of a request', 'requests', 'find',
+         ({'duplicate_of': some_id, 'status': 'duplicate'}, [('created_at', ASCENDING)])),
+    ]
+
+
+def winning_stages(plan):
+    """Every stage name in the winning plans of an explain() result"""
+    stages = []
+
+    def walk(node, in_winning):
+        if isinstance(node, dict):
+            if in_winning and 'stage' in node:
+                stages.append(node['stage'])
+            for key, value in node.items():
+                if key == 'rejectedPlans':
+                    continue
+                walk(value, in_winning or key in ('winningPlan', 'queryPlan'))
+        elif isinstance(node, list):
+            for item in node:
+                walk(item, in_winning)
+
+    walk(plan, False)
+    return stages
+
+
+def explain(db, collection_name, kind, spec):
+    if kind == 'find':
+        query, sort = spec
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        return cursor.explain()
+    return db.command('aggregate', collection_name, pipeline=spec, explain=True)
+
+
+def check_query_plans(db):
+    """Explain every query shape; returns (name, stages, ok) rows
+
+    A shape fails on a collection scan, or when the server sorts in memory
+    (a SORT stage) because no index is in the order the query asks for.
+    """
+    rows = []
+    for name, collection_name, kind, spec in query_shapes():
+        stages = winning_stages(explain(db, collection_name, kind, spec))
+        rows.append((name, stages, bool(stages) and not {'COLLSCAN', 'SORT'} & set(stages)))
+    return rows
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo.mongo_client import MongoClient
+    from pymongo.server_api import ServerApi
+
+    parser = argparse.ArgumentParser(description='Apply or verify MongoDB indexes')
+    parser.add_argument('command', choices=['apply', 'check'])
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = MongoClient(os.getenv('MONGO_URI_STRING'), server_api=ServerApi('1'))['Database']
+
+    if args.command == 'apply':
+        backfill_geo_points(db['requests'])
+        failed = ensure_indexes(db)
+        print('indexes applied' if not failed else f'failed: {", ".join(failed)}')
+        return 1 if failed else 0
+
+    rows = check_query_plans(db)
+    for name, stages, ok in rows:
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {' > '.join(stages)}")
+    return 0 if all(ok for _, _, ok in rows) else 1
+
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    sys.exit(main())
@@ -0,0 +1,426 @@
+"""Request instrumentation, exposed in the Prometheus text format.
+
+Each request gets a RequestStats, held in a context variable while it runs.
+Three sources add to it:
+
+- the pymongo CommandListener, with operation counts, time spent in
+  MongoDB and documents sent back by the server;
+- the JSON provider, with serialization time and response items (the
+  length of a top-level array, or the summed length of the top-level
+  arrays of an object);
+- `with metrics.phase(name):` blocks around Python-side work.
+
+When the response body has been sent, these are folded into per-route
+histograms and served at GET /metrics. Comparing documents returned by the
+database with response items shows where a route fetches more than it
+sends.
+
+What the server scans is not in a command's reply. ExplainSampler picks a
+share (EXPLAIN_SAMPLE_RATE) of the find, aggregate, count and distinct
+commands requests issue. Once the request has finished, it re-runs each one
+as `explain` with executionStats on a background thread, and counts the
+documents and index keys examined against the documents the plan
+returned, per route. A route whose examined count runs far ahead of its
+returned count is missing an index. The rate defaults to 0.01; 0 turns
+sampling off.
+
+SlowRequestProfiler is opt-in (PROFILE_SLOW_MS). While it is on, one
+background thread samples the stack of every in-flight request. Requests
+slower than the threshold are written to PROFILE_DIR as collapsed stacks,
+ready for flamegraph.pl or speedscope. While it is off, no sampler thread
+runs.
+"""
+from contextlib import contextmanager
+import contextvars
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+
+from serialization import JSONProvider
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+EXPLAINED_COMMANDS = ('find', 'aggregate', 'count', 'distinct')
+# Session, transaction and routing fields that the explain command does not take
+_NOT_EXPLAINED = {'lsid', 'txnNumber', 'startTransaction', 'autocommit', 'readConcern', 'writeConcern',
+                  '$db', '$clusterTime', '$readPreference', 'apiVersion', 'apiStrict', 'apiDeprecationErrors'}
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set"""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def exposition(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, [list(counts), count, total])
+                            for labels, (counts, count, total) in self._series.items())
+        for labels, (counts, count, total) in series:
+            base = _labels(self.label_names, labels)
+            for bound, n in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="{bound}"}} {n}')
+            lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{base}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{base}}} {count}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter per label set"""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def exposition(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f'{self.name}{{{_labels(self.label_names, labels)}}} {value}')
+        return lines
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestStats:
+    """What one request spent, filled in while it runs"""
+    __slots__ = ('started', 'db_operations', 'db_seconds', 'db_documents',
+                 'serialize_seconds', 'response_items', 'phases', 'thread_id', 'explain_samples')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_operations = 0
+        self.db_seconds = 0.0
+        self.db_documents = 0
+        self.serialize_seconds = 0.0
+        self.response_items = 0
+        self.phases = {}
+        self.thread_id = threading.get_ident()
+        self.explain_samples = []
+
+
+def _batch_size(reply):
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        batch = cursor.get('firstBatch', cursor.get('nextBatch'))
+        return len(batch) if batch is not None else 0
+    if reply.get('value') is not None:
+        return 1
+    return 0
+
+
+class _CommandListener(monitoring.CommandListener):
+    """Attributes every MongoDB command to the request that issued it"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def started(self, event):
+        explainer = self.metrics.explainer
+        if explainer is not None and event.command_name in EXPLAINED_COMMANDS:
+            stats = _current.get()
+            if stats is not None:
+                explainer.sample(stats, event)
+
+    def succeeded(self, event):
+        seconds = event.duration_micros / 1e6
+        self.metrics.db_duration.observe((event.command_name,), seconds)
+        stats = _current.get()
+        if stats is not None:
+            stats.db_operations += 1
+            stats.db_seconds += seconds
+            stats.db_documents += _batch_size(event.reply)
+
+    def failed(self, event):
+        self.metrics.db_duration.observe((event.command_name,), event.duration_micros / 1e6)
+        self.metrics.db_failures.inc((event.command_name,))
+        stats = _current.get()
+        if stats is not None:
+            stats.db_operations += 1
+            stats.db_seconds += event.duration_micros / 1e6
+
+
+def _item_count(obj):
+    if isinstance(obj, list):
+        return len(obj)
+    if isinstance(obj, dict):
+        lists = [len(v) for v in obj.values() if isinstance(v, list)]
+        return sum(lists) if lists else 1
+    return 1
+
+
+def execution_totals(explain):
+    """(documents examined, keys examined, documents returned) summed over an explain's executionStats"""
+    totals = [0, 0, 0]
+
+    def walk(node):
+        if isinstance(node, dict):
+            stats = node.get('executionStats')
+            if isinstance(stats, dict):
+                totals[0] += stats.get('totalDocsExamined', 0)
+                totals[1] += stats.get('totalKeysExamined', 0)
+                totals[2] += stats.get('nReturned', 0)
+            for key, value in node.items():
+                # executionStats already sums the shards and stages below it
+                if key != 'executionStats':
+                    walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(explain)
+    return tuple(totals)
+
+
+class ExplainSampler:
+    """Explains a sample of request commands off the request path"""
+
+    def __init__(self, client, metrics, rate, maxsize=256):
+        self.client = client
+        self.metrics = metrics
+        self.rate = rate
+        self._queue = queue.Queue(maxsize)
+
+    def sample(self, stats, event):
+        if random.random() < self.rate:
+            command = {k: v for k, v in event.command.items() if k not in _NOT_EXPLAINED}
+            stats.explain_samples.append((event.database_name, command))
+
+    def submit(self, labels, samples):
+        for database, command in samples:
+            try:
+                self._queue.put_nowait((labels, database, command))
+            except queue.Full:
+                self.metrics.explains.inc(labels + ('dropped',))
+
+    def start(self):
+        thread = threading.Thread(target=self._run, daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self):
+        while True:
+            labels, database, command = self._queue.get()
+            try:
+                reply = self.client[database].command({'explain': command, 'verbosity': 'executionStats'})
+            except PyMongoError:
+                logger.debug('Explaining a sampled %s failed', next(iter(command)), exc_info=True)
+                self.metrics.explains.inc(labels + ('failed',))
+                continue
+            examined, keys, returned = execution_totals(reply)
+            self.metrics.explains.inc(labels + ('ok',))
+            self.metrics.docs_examined.inc(labels, examined)
+            self.metrics.keys_examined.inc(labels, keys)
+            self.metrics.explained_returned.inc(labels, returned)
+
+
+class TimedJSONProvider(JSONProvider):
+    """The app's JSON provider, charging encode time to the current request"""
+
+    def encode(self, obj):
+        stats = _current.get()
+        if stats is None:
+            return super().encode(obj)
+        started = time.perf_counter()
+        try:
+            return super().encode(obj)
+        finally:
+            stats.serialize_seconds += time.perf_counter() - started
+            stats.response_items += _item_count(obj)
+
+
+class Metrics:
+    """Per-route histograms and counters, plus the hooks that feed them"""
+
+    def __init__(self):
+        route = ('method', 'route')
+        self.request_duration = Histogram(
+            'cascade_http_request_duration_seconds', 'Time from routing to the last body byte',
+            ('method', 'route', 'status'))
+        self.db_operations = Histogram(
+            'cascade_db_operations_per_request', 'MongoDB commands issued per request',
+            route, COUNT_BUCKETS)
+        self.db_time = Histogram(
+            'cascade_db_time_per_request_seconds', 'Time spent in MongoDB commands per request', route)
+        self.db_duration = Histogram(
+            'cascade_db_command_duration_seconds', 'Duration of MongoDB commands', ('command',))
+        self.db_failures = Counter(
+            'cascade_db_command_failures_total', 'Failed MongoDB commands', ('command',))
+        self.serialize_time = Histogram(
+            'cascade_serialize_time_per_request_seconds', 'Time spent encoding JSON per request', route)
+        self.phase_time = Histogram(
+            'cascade_phase_duration_seconds', 'Time spent in named phases of a request',
+            ('method', 'route', 'phase'))
+        self.db_documents = Counter(
+            'cascade_db_documents_returned_total', 'Documents MongoDB sent back', route)
+        self.response_items = Counter(
+            'cascade_response_items_total', 'Items in JSON responses', route)
+        self.slow_profiles = Counter(
+            'cascade_slow_request_profiles_total', 'Slow requests written out by the profiler', route)
+        self.explains = Counter(
+            'cascade_db_explains_total', 'Sampled MongoDB commands by explain outcome',
+            ('method', 'route', 'outcome'))
+        self.docs_examined = Counter(
+            'cascade_db_documents_examined_total', 'Documents the server examined for sampled commands', route)
+        self.keys_examined = Counter(
+            'cascade_db_keys_examined_total', 'Index keys the server examined for sampled commands', route)
+        self.explained_returned = Counter(
+            'cascade_db_explained_returned_total', 'Documents the plans of sampled commands returned', route)
+        self.explainer = None
+        self.command_listener = _CommandListener(self)
+
+    def start_explainer(self, client, rate):
+        """Explain about rate of the commands requests issue, from a thread, using client"""
+        self.explainer = ExplainSampler(client, self, rate)
+        self.explainer.start()
+
+    def start_request(self):
+        """Begin collecting for the request running in this context"""
+        stats = RequestStats()
+        _current.set(stats)
+        return stats
+
+    def finish_request(self, stats, method, route, status):
+        if _current.get() is stats:
+            _current.set(None)
+        elapsed = time.perf_counter() - stats.started
+        labels = (method, route)
+        self.request_duration.observe((method, route, str(status)), elapsed)
+        self.db_operations.observe(labels, stats.db_operations)
+        self.db_time.observe(labels, stats.db_seconds)
+        self.serialize_time.observe(labels, stats.serialize_seconds)
+        self.db_documents.inc(labels, stats.db_documents)
+        self.response_items.inc(labels, stats.response_items)
+        if stats.explain_samples and self.explainer is not None:
+            self.explainer.submit(labels, stats.explain_samples)
+        for phase, seconds in stats.phases.items():
+            self.phase_time.observe((method, route, phase), seconds)
+        return elapsed
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block of Python-side work against the current request"""
+        stats = _current.get()
+        if stats is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats.phases[name] = stats.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def exposition(self):
+        """Everything, in the Prometheus text format"""
+        lines = []
+        for metric in (self.request_duration, self.db_operations, self.db_time, self.db_duration,
+                       self.db_failures, self.serialize_time, self.phase_time, self.db_documents,
+                       self.response_items, self.slow_profiles, self.explains, self.docs_examined,
+                       self.keys_examined, self.explained_returned):
+            lines.extend(metric.exposition())
+        return '\n'.join(lines) + '\n'
+
+
+class SlowRequestProfiler:
+    """Sampling profiler that keeps the stacks of requests slower than a threshold"""
+
+    def __init__(self, threshold_ms, directory, interval_ms=5):
+        self.threshold = threshold_ms / 1000
+        self.directory = directory
+        self.interval = interval_ms / 1000
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def watch(self, stats):
+        """Sample the thread serving this request until finish is called"""
+        with self._lock:
+            self._samples[stats.thread_id] = {}
+
+    def finish(self, stats, method, route, elapsed):
+        """Stop sampling; True if the request was slow and its profile was written"""
+        with self._lock:
+            samples = self._samples.pop(stats.thread_id, None)
+        if not samples or elapsed < self.threshold:
+            return False
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        path = os.path.join(self.directory, f'{time.strftime("%Y%m%dT%H%M%S")}-{method}-{slug}-{elapsed * 1000:.0f}ms.folded')
+        with open(path, 'w') as f:
+            for stack, count in sorted(samples.items(), key=lambda item: -item[1]):
+                f.write(f'{stack} {count}\n')
+        return True
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                watched = list(self._samples)
+            if not watched:
+                continue
+            frames = sys._current_frames()
+            for thread_id in watched:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                with self._lock:
+                    samples = self._samples.get(thread_id)
+                    if samples is not None:
+                        samples[key] = samples.get(key, 0) + 1
@@ -0,0 +1,137 @@
+"""Keyset pagination and streamed JSON arrays for the list endpoints.
+
+Cursors are opaque base64url tokens. Time-ordered listings page on
+(created_at, _id); distance-ordered listings page on the $geoNear distance,
+carrying the ids already returned at the boundary distance so exact ties
+are neither repeated nor skipped.
+"""
+from datetime import datetime
+import base64
+import json
+
+from bson.objectid import ObjectId
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Distances within this many km of the cursor count as ties
+DISTANCE_EPSILON_KM = 1e-9
+
+
+def encode_cursor(data):
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor token; raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(data, dict):
+        raise ValueError('Invalid cursor')
+    return data
+
+
+def page_args(args):
+    """(limit, cursor) from query args; limit is None when the caller wants everything
+
+    Raises ValueError on a bad limit or cursor.
+    """
+    limit = args.get('limit')
+    token = args.get('cursor')
+
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        if not 0 < limit <= MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    elif token:
+        limit = DEFAULT_PAGE_SIZE
+
+    return limit, decode_cursor(token) if token else None
+
+
+def created_at_filter(cursor):
+    """Filter for the page after cursor, newest first"""
+    if not cursor:
+        return {}
+    try:
+        created_at = datetime.fromisoformat(cursor['c'])
+        last_id = ObjectId(cursor['i'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+    return {'$or': [
+        {'created_at': {'$lt': created_at}},
+        {'created_at': created_at, '_id': {'$lt': last_id}}
+    ]}
+
+
+def created_at_cursor(last):
+    return encode_cursor({'c': last['created_at'].isoformat(), 'i': str(last['_id'])})
+
+
+def id_filter(cursor):
+    """Filter for the page after cursor, in _id order"""
+    if not cursor:
+        return {}
+    try:
+        return {'_id': {'$gt': ObjectId(cursor['i'])}}
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+
+def id_cursor(last_id):
+    return encode_cursor({'i': str(last_id)})
+
+
+def apply_distance_cursor(stage, cursor, multiplier):
+    """Narrow a $geoNear stage to the page after cursor"""
+    if not cursor:
+        return stage
+    try:
+        distance = float(cursor['d'])
+        seen = [ObjectId(i) for i in cursor['s']]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+    geo_near = stage['$geoNear']
+    geo_near['minDistance'] = max(distance - DISTANCE_EPSILON_KM, 0) / multiplier
+    if seen:
+        geo_near['query'] = dict(geo_near['query'], _id={'$nin': seen})
+    return stage
+
+
+def distance_cursor(page, distance_key='distance', id_key='_id'):
+    """Cursor after a distance-ordered page of $geoNear results
+
+    distance_key must hold the unrounded $geoNear distance.
+    """
+    last = page[-1][distance_key]
+    seen = [str(doc[id_key]) for doc in page if doc[distance_key] >= last - DISTANCE_EPSILON_KM]
+    return encode_cursor({'d': last, 's': seen})
+
+
+def stream_json_array(items, encode):
+    """Encode an iterable as a JSON array one element at a time; encode returns bytes"""
+    yield b'['
+    first = True
+    for item in items:
+        yield encode(item) if first else b',' + encode(item)
+        first = False
+    yield b']'
+
+
+async def astream_json_array(items, encode):
+    """stream_json_array for an async iterable, such as an AsyncMongoClient cursor"""
+    yield b'['
+    first = True
+    async for item in items:
+        yield encode(item) if first else b',' + encode(item)
+        first = False
+    yield b']'
@@ -0,0 +1,154 @@
+"""Password hashing off the request threads.
+
+werkzeug's password hashes are deliberately expensive. Running them inline
+lets a burst of logins occupy every web worker, and requests for help queue
+behind them. HashPool runs them in a small process pool instead, with a
+fixed number of slots (workers plus queue depth). A caller's thread waits
+on its hash, so the slots are also capped by `max_slots`, which the app
+keeps below its request thread count: logins can never hold every thread.
+When every slot is taken, calls raise PoolSaturated at once rather than
+queueing, and the endpoint answers 503 with a Retry-After.
+
+The hash method (and so its cost) comes from PASSWORD_HASH_METHOD, in
+werkzeug's notation: `scrypt:32768:8:1`, `pbkdf2:sha256:600000`, ...
+Stored hashes made with other parameters are upgraded on the next
+successful login.
+"""
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+import math
+import multiprocessing
+import os
+import threading
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PoolSaturated(Exception):
+    """No hashing slot is free; retry after retry_after seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__('Password hashing is saturated')
+        self.retry_after = retry_after
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _check(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+def method_of(pwhash):
+    """Method and cost parameters a stored hash was made with"""
+    return pwhash.split('$', 1)[0]
+
+
+class HashPool:
+    """Bounded process pool for password hashing and verification"""
+
+    def __init__(self, method='scrypt', workers=2, queue_depth=8, timeout=10, max_slots=None):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self.method_prefix = None
+        self.slots = workers + queue_depth if max_slots is None else max(1, min(workers + queue_depth, max_slots))
+        self._slots = threading.BoundedSemaphore(self.slots)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._latency = None
+        self._counters = dict.fromkeys(['hashed', 'checked', 'rejected', 'timeouts', 'restarts'], 0)
+
+    def start(self):
+        """Start the workers and resolve the full method string
+
+        Call this from the main thread, before starting background threads:
+        workers are forked, and forking is only safe while the process is
+        still single-threaded. Calling it again does nothing. A process
+        forked from one with a running pool gets its own on start.
+        """
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # An executor inherited over fork belongs to the parent
+                self._executor = self._new_executor()
+                self.method_prefix = None
+        if self.method_prefix is None:
+            self.method_prefix = method_of(self._run(_hash, '', self.method))
+
+    def _new_executor(self):
+        self._pid = os.getpid()
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'))
+
+    def hash(self, password):
+        with self._lock:
+            self._counters['hashed'] += 1
+        return self._run(_hash, password, self.method)
+
+    def check(self, pwhash, password):
+        with self._lock:
+            self._counters['checked'] += 1
+        return self._run(_check, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if a stored hash was made with other parameters than the current ones"""
+        return self.method_prefix is not None and method_of(pwhash) != self.method_prefix
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise PoolSaturated(self.retry_after())
+
+        started = time.monotonic()
+        try:
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = self._new_executor()
+                future = self._executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._restart()
+            self._slots.release()
+            raise PoolSaturated(self.retry_after())
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._finished(started))
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FuturesTimeout:
+            with self._lock:
+                self._counters['timeouts'] += 1
+            raise PoolSaturated(self.retry_after())
+        except BrokenProcessPool:
+            self._restart()
+            raise PoolSaturated(self.retry_after())
+
+    def _finished(self, started):
+        # The slot stays taken until the worker is done, even if the caller gave up
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._latency = elapsed if self._latency is None else 0.8 * self._latency + 0.2 * elapsed
+        self._slots.release()
+
+    def _restart(self):
+        # A worker died (e.g. OOM-killed); replace the pool for later calls
+        with self._lock:
+            self._counters['restarts'] += 1
+            broken, self._executor = self._executor, self._new_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def retry_after(self):
+        """Seconds until a slot is likely free, from recent call latency"""
+        with self._lock:
+            latency = self._latency or 1
+        return max(1, math.ceil(latency))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, workers=self.workers, slots=self.slots,
+                        method=self.method_prefix or self.method,
+                        latency_ms=round(self._latency * 1000, 1) if self._latency is not None else None)
@@ -0,0 +1,93 @@
+"""Aggregation stages that shape list-endpoint responses inside MongoDB.
+
+Each endpoint's pipeline ends in one of these stages so the server only
+sends back the fields that endpoint returns, already converted to their
+JSON form, instead of whole documents for Python to reshape. The matching
+schemas say which of those fields reach the response body (see
+serialization.py).
+"""
+from serialization import Schema
+
+
+MAP_DESCRIPTION_LENGTH = 100
+
+
+def iso_date_expression(field):
+    """Expression matching datetime.isoformat() for a BSON date (ms precision)"""
+    return {'$cond': [
+        {'$eq': [{'$millisecond': field}, 0]},
+        {'$dateToString': {'format': '%Y-%m-%dT%H:%M:%S', 'date': field}},
+        {'$dateToString': {'format': '%Y-%m-%dT%H:%M:%S.%L000', 'date': field}}
+    ]}
+
+
+def truncate_expression(field, length):
+    """First length characters of a string, with '...' appended if it was cut"""
+    return {'$cond': [
+        {'$gt': [{'$strLenCP': field}, length]},
+        {'$concat': [{'$substrCP': [field, 0, length]}, '...']},
+        field
+    ]}
+
+
+def rounded_distance_expression():
+    """Distance in km to two decimals, null when missing or zero"""
+    return {'$cond': [{'$gt': ['$distance', 0]}, {'$round': ['$distance', 2]}, None]}
+
+
+def request_stages(geo_sorted, keep_raw_distance=False):
+    """GET /requests: the stored document minus `geo`, with ids as strings"""
+    fields = {
+        '_id': {'$toString': '$_id'},
+        'victim_id': {'$toString': '$victim_id'},
+        'volunteer_id': {'$cond': [
+            {'$ifNull': ['$volunteer_id', False]},
+            {'$toString': '$volunteer_id'},
+            '$volunteer_id'
+        ]}
+    }
+    if geo_sorted:
+        fields['distance'] = {'$round': ['$distance', 2]}
+        if keep_raw_distance:
+            fields['_d'] = '$distance'
+    return [{'$set': fields}, {'$project': {'geo': 0}}]
+
+
+def map_pin_stage(keep_raw_distance=False):
+    """GET /map/data: marker fields only, no phone numbers or full descriptions"""
+    projection = {
+        '_id': 0,
+        'id': {'$toString': '$_id'},
+        'type': 1,
+        'urgency': 1,
+        'description': truncate_expression('$description', MAP_DESCRIPTION_LENGTH),
+        'location': 1,
+        'distance': rounded_distance_expression(),
+        'created_at': iso_date_expression('$created_at')
+    }
+    if keep_raw_distance:
+        projection['_d'] = '$distance'
+    return {'$project': projection}
+
+
+# Raw distances (_d) stay on page documents for the next cursor only
+REQUEST_SCHEMA = Schema(omit=['geo', '_d'])
+MAP_PIN_SCHEMA = Schema(['id', 'type', 'urgency', 'description', 'location', 'distance', 'created_at'])
+
+
+# Query terms for requests that can be placed on the map
+HAS_LOCATION = {
+    'location.latitude': {'$nin': [None, '', 0]},
+    'location.longitude': {'$nin': [None, '', 0]}
+}
+
+# GET /suggestions: what scoring and the response need, nothing more
+SUGGESTION_FIELDS_STAGE = {'$project': {
+    'type': 1,
+    'urgency': 1,
+    'description': 1,
+    'victim_name': 1,
+    'location': 1,
+    'created_at': 1,
+    'distance': 1
+}}
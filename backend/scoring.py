@@ -0,0 +1,267 @@
+"""Suggestion scoring for volunteers.
+
+`score_request` is the per-document reference. `CandidateSet` holds pending
+requests as columnar NumPy arrays so one or many volunteers can be scored
+against them with array operations, matching `score_request` exactly.
+
+Given a semantic index (see embeddings.py), both also award up to
+SEMANTIC_MATCH_SCORE points for how close a request's description is to a
+volunteer's skills. The set holds the request vectors as a matrix, so that
+term is one matrix product for any number of volunteers.
+"""
+from datetime import datetime
+import math
+
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371
+
+SUGGESTION_LIMIT = 10
+DISTANCE_SCORES = [(5, 50), (15, 30), (30, 15)]
+URGENCY_SCORES = {'high': 30, 'medium': 20, 'low': 10}
+SKILL_MATCH_SCORE = 20
+SEMANTIC_MATCH_SCORE = 15
+AGE_SCORES = [(2, 10), (6, 5)]
+SUGGESTION_RADIUS_KM = DISTANCE_SCORES[-1][0]
+
+URGENCY_LEVELS = list(URGENCY_SCORES)
+EPOCH = datetime(1970, 1, 1)
+
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """Calculate distance between two points using Haversine formula (in km)"""
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+
+    a = (math.sin(dlat/2) * math.sin(dlat/2) +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(dlon/2) * math.sin(dlon/2))
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def semantic_points(similarity):
+    """Points for the cosine similarity of requests to a volunteer's skills"""
+    return np.rint(np.clip(similarity, 0, 1) * SEMANTIC_MATCH_SCORE).astype(np.int64)
+
+
+def score_request(req, distance, user_skills, now, semantic=None):
+    """Relevance score of a request for a volunteer"""
+    score = 0
+
+    # Distance score (closer = higher score)
+    for limit, points in DISTANCE_SCORES:
+        if distance <= limit:
+            score += points
+            break
+
+    # Urgency score
+    score += URGENCY_SCORES.get(req['urgency'], 0)
+
+    # Skills match score
+    if user_skills and req['type'] in user_skills:
+        score += SKILL_MATCH_SCORE
+
+    # Description match score
+    if semantic is not None:
+        score += int(semantic_points(semantic.similarity(req, user_skills)))
+
+    # Time score (newer requests get slight boost)
+    hours_old = (now - req['created_at']).total_seconds() / 3600
+    for limit, points in AGE_SCORES:
+        if hours_old < limit:
+            score += points
+            break
+
+    return score
+
+
+def to_epoch(dt):
+    """Seconds since the Unix epoch for a naive UTC datetime"""
+    return (dt - EPOCH).total_seconds()
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Vectorized calculate_distance; arguments broadcast against each other"""
+    dlat = np.radians(lat2 - lat1)
+    dlon = np.radians(lon2 - lon1)
+
+    a = (np.sin(dlat/2) * np.sin(dlat/2) +
+         np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) *
+         np.sin(dlon/2) * np.sin(dlon/2))
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+
+    return EARTH_RADIUS_KM * c
+
+
+class CandidateSet:
+    """Pending requests loaded into columnar arrays for batch scoring"""
+
+    def __init__(self, docs, lat, lon, urgency, type_code, types, created_at, vectors=None, semantic=None):
+        self.docs = docs
+        self.lat = lat
+        self.lon = lon
+        self.urgency = urgency
+        self.type_code = type_code
+        self.types = types
+        self.created_at = created_at
+        self.vectors = vectors
+        self.semantic = semantic
+
+        # Points per urgency code; unknown urgencies share the last slot
+        self.urgency_points = np.array(
+            [URGENCY_SCORES[u] for u in URGENCY_LEVELS] + [0], dtype=np.int64
+        )
+
+    @classmethod
+    def from_documents(cls, docs, semantic=None):
+        """Build a candidate set from request documents that have a location"""
+        docs = [doc for doc in docs
+                if doc.get('location', {}).get('latitude') and doc.get('location', {}).get('longitude')]
+
+        types = sorted({doc['type'] for doc in docs})
+        type_index = {t: i for i, t in enumerate(types)}
+        urgency_index = {u: i for i, u in enumerate(URGENCY_LEVELS)}
+
+        n = len(docs)
+        lat = np.empty(n, dtype=np.float64)
+        lon = np.empty(n, dtype=np.float64)
+        urgency = np.empty(n, dtype=np.int8)
+        type_code = np.empty(n, dtype=np.int16)
+        created_at = np.empty(n, dtype=np.float64)
+
+        for i, doc in enumerate(docs):
+            lat[i] = doc['location']['latitude']
+            lon[i] = doc['location']['longitude']
+            urgency[i] = urgency_index.get(doc['urgency'], len(URGENCY_LEVELS))
+            type_code[i] = type_index[doc['type']]
+            created_at[i] = to_epoch(doc['created_at'])
+
+        vectors = semantic.vectors(docs) if semantic is not None else None
+        return cls(docs, lat, lon, urgency, type_code, types, created_at, vectors, semantic)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def take(self, index):
+        """Candidate set restricted to the given positions, sharing type codes"""
+        return CandidateSet(
+            [self.docs[i] for i in index], self.lat[index], self.lon[index],
+            self.urgency[index], self.type_code[index], self.types, self.created_at[index],
+            self.vectors[index] if self.vectors is not None else None, self.semantic
+        )
+
+    @property
+    def semantic_ceiling(self):
+        """Most semantic points any candidate can score"""
+        return SEMANTIC_MATCH_SCORE if self.semantic is not None else 0
+
+    def skill_mask(self, user_skills):
+        """Boolean mask over type codes that match a volunteer's skills"""
+        if not user_skills:
+            return np.zeros(len(self.types), dtype=bool)
+        return np.array([t in user_skills for t in self.types], dtype=bool)
+
+    def static_scores(self, now):
+        """Urgency and age score components shared by every volunteer"""
+        score = self.urgency_points[self.urgency]
+
+        hours_old = (to_epoch(now) - self.created_at) / 3600
+        conditions = [hours_old < limit for limit, _ in AGE_SCORES]
+        score = score + np.select(conditions, [points for _, points in AGE_SCORES], 0)
+
+        return score
+
+    def score(self, lat, lon, user_skills, now, static=None):
+        """Scores and distances (km) of every candidate for one volunteer"""
+        distance = haversine(float(lat), float(lon), self.lat, self.lon)
+
+        conditions = [distance <= limit for limit, _ in DISTANCE_SCORES]
+        score = np.select(conditions, [points for _, points in DISTANCE_SCORES], 0)
+
+        score = score + (static if static is not None else self.static_scores(now))
+        score = score + self.skill_mask(user_skills)[self.type_code] * SKILL_MATCH_SCORE
+
+        profile = self.semantic.profile(user_skills) if self.semantic is not None else None
+        if profile is not None:
+            score = score + semantic_points(self.vectors @ profile)
+
+        return score, distance
+
+    def score_many(self, volunteers, now):
+        """Score matrix (volunteers x candidates) and matching distances
+
+        `volunteers` is a list of (latitude, longitude, skills) tuples.
+        """
+        if not volunteers:
+            empty = np.empty((0, len(self)))
+            return empty.astype(np.int64), empty
+
+        vol_lat = np.array([float(v[0]) for v in volunteers])[:, None]
+        vol_lon = np.array([float(v[1]) for v in volunteers])[:, None]
+        distance = haversine(vol_lat, vol_lon, self.lat[None, :], self.lon[None, :])
+
+        conditions = [distance <= limit for limit, _ in DISTANCE_SCORES]
+        score = np.select(conditions, [points for _, points in DISTANCE_SCORES], 0)
+        score = score + self.static_scores(now)[None, :]
+
+        skill_masks = np.array([self.skill_mask(v[2]) for v in volunteers], dtype=bool)
+        score = score + skill_masks[:, self.type_code] * SKILL_MATCH_SCORE
+
+        if self.semantic is not None:
+            profiles = np.zeros((len(volunteers), self.vectors.shape[1]), dtype=np.float32)
+            for i, v in enumerate(volunteers):
+                profile = self.semantic.profile(v[2])
+                if profile is not None:
+                    profiles[i] = profile
+            score = score + semantic_points(profiles @ self.vectors.T)
+
+        return score, distance
+
+
+def top_k(scores, k=SUGGESTION_LIMIT):
+    """Indices of the k best scores, highest first, ties in candidate order
+
+    Works on a single score vector or row-wise on a score matrix, matching a
+    stable descending sort without sorting every candidate.
+    """
+    scores = np.asarray(scores, dtype=np.int64)
+    n = scores.shape[-1]
+    if n == 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+
+    # Fold the candidate position into the key so ties keep input order
+    key = scores * n + (n - 1 - np.arange(n))
+    k = min(k, n)
+    if k < n:
+        part = np.argpartition(-key, k - 1, axis=-1)[..., :k]
+    else:
+        part = np.broadcast_to(np.arange(n), key.shape)
+    order = np.argsort(-np.take_along_axis(key, part, axis=-1), axis=-1)
+    return np.take_along_axis(part, order, axis=-1)
+
+
+def rank_candidates(candidates, user_location, user_skills, now, k=SUGGESTION_LIMIT):
+    """Best k (doc, distance, score) tuples for one volunteer, highest first"""
+    scores, distances = candidates.score(
+        user_location['latitude'], user_location['longitude'], user_skills, now
+    )
+    return [(candidates.docs[i], float(distances[i]), int(scores[i]))
+            for i in top_k(scores, k)]
+
+
+def suggestion_from(req, distance, score):
+    """Response shape of a scored suggestion"""
+    return {
+        'id': str(req['_id']),
+        'type': req['type'],
+        'urgency': req['urgency'],
+        'description': req['description'],
+        'victim_name': req['victim_name'],
+        'location': req['location'],
+        'distance': round(float(distance), 2),
+        'score': int(score),
+        'created_at': req['created_at'].isoformat()
+    }
@@ -0,0 +1,150 @@
+"""Encoding MongoDB documents straight to JSON bytes.
+
+dumps() writes ObjectIds as strings and datetimes as HTTP dates, as
+Flask's encoder always has, so response bodies keep their format. It uses
+orjson when it is installed and the standard library otherwise; both
+produce the same JSON, with keys in document order. With iso_dates,
+datetimes are written as isoformat() does instead, which is what exports
+use.
+
+A Schema is the shape of one endpoint's documents. It picks the fields to
+write and adds per-response ones (a caller's distance, say). It never
+modifies the fetched document, and returns it as is when nothing needs
+leaving out. Otherwise it builds a new dict that shares the document's
+values.
+
+JSONProvider is Flask's JSON provider writing through dumps(), so jsonify
+and app.json.encode give the same bytes.
+"""
+from dataclasses import asdict, is_dataclass
+from datetime import date, datetime, timezone
+from decimal import Decimal
+import json
+import uuid
+
+from bson.objectid import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+BACKEND = 'orjson' if orjson else 'json'
+
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+_CLOCK = [f'{hour:02d}:{minute:02d}:' for hour in range(24) for minute in range(60)]
+_SECONDS = [f'{second:02d} GMT' for second in range(60)]
+_day_prefixes = {}
+
+
+def http_date(moment):
+    """werkzeug.http.http_date, several times faster; naive datetimes are UTC"""
+    if isinstance(moment, datetime):
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc)
+        clock = _CLOCK[moment.hour * 60 + moment.minute] + _SECONDS[moment.second]
+    else:
+        clock = '00:00:00 GMT'
+    day = moment.toordinal()
+    prefix = _day_prefixes.get(day)
+    if prefix is None:
+        if len(_day_prefixes) > 4096:
+            _day_prefixes.clear()
+        prefix = _day_prefixes[day] = (f'{_DAYS[moment.weekday()]}, {moment.day:02d} '
+                                       f'{_MONTHS[moment.month - 1]} {moment.year:04d} ')
+    return prefix + clock
+
+
+def _default(obj, dates):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, date):
+        return dates(obj)
+    if isinstance(obj, (Decimal, uuid.UUID)):
+        return str(obj)
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def default(obj):
+    """JSON form of the non-JSON values documents hold"""
+    return _default(obj, http_date)
+
+
+def _iso_default(obj):
+    return _default(obj, lambda moment: moment.isoformat())
+
+
+def json_dumps(obj, iso_dates=False):
+    """dumps() on the standard library"""
+    return json.dumps(obj, default=_iso_default if iso_dates else default, separators=(',', ':'),
+                      ensure_ascii=False).encode()
+
+
+if orjson:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def orjson_dumps(obj, iso_dates=False):
+        """dumps() on orjson"""
+        if iso_dates:
+            # orjson's own datetime format is isoformat()'s
+            return orjson.dumps(obj, default=_iso_default, option=_OPTIONS)
+        return orjson.dumps(obj, default=default, option=_OPTIONS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+    dumps = orjson_dumps
+else:
+    orjson_dumps = None
+    dumps = json_dumps
+
+
+class Schema:
+    """Fields of one endpoint's documents
+
+    fields lists the keys to write, or is None for every key but those in
+    omit.
+    """
+
+    def __init__(self, fields=None, omit=()):
+        self.fields = tuple(fields) if fields is not None else None
+        self.omit = frozenset(omit)
+        self._allowed = frozenset(fields) - self.omit if fields is not None else None
+
+    def select(self, doc, extra=None):
+        """The document as the endpoint returns it, with extra fields set"""
+        if self.fields is None:
+            if not doc.keys().isdisjoint(self.omit):
+                doc = {key: value for key, value in doc.items() if key not in self.omit}
+        elif not doc.keys() <= self._allowed:
+            doc = {key: doc[key] for key in self.fields if key in self._allowed and key in doc}
+        return {**doc, **extra} if extra else doc
+
+    def select_many(self, docs):
+        return [self.select(doc) for doc in docs]
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, encoding with dumps()"""
+
+    default = staticmethod(default)
+
+    def encode(self, obj):
+        """JSON bytes for obj"""
+        return dumps(obj)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.encode(obj).decode()
+
+    def response(self, *args, **kwargs):
+        # Debug mode pretty-prints through the standard library
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.encode(obj), mimetype=self.mimetype)
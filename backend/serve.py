@@ -0,0 +1,34 @@
+"""Start the backend in WSGI or ASGI mode.
+
+WSGI mode serves the Flask app on werkzeug's threaded server, one thread per
+connection. ASGI mode serves asgi.application on uvicorn (see asgi.py).
+Both expose the same routes, so the two can be compared side by side with
+benchmarks/load_modes.py.
+
+Usage: python serve.py [--mode wsgi|asgi] [--host HOST] [--port PORT]
+The mode defaults to SERVER_MODE, then wsgi.
+"""
+import argparse
+import os
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=['wsgi', 'asgi'], default=os.getenv('SERVER_MODE', 'wsgi'))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.mode == 'asgi':
+        import uvicorn
+        uvicorn.run('asgi:application', host=args.host, port=args.port, log_level='warning')
+    else:
+        from werkzeug.serving import run_simple
+        from app import create_app
+        run_simple(args.host, args.port, create_app(), threaded=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
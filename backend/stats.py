@@ -0,0 +1,336 @@
+"""Dashboard statistics kept as counters by the write paths.
+
+Counters live in the `stats` collection, one document per scope:
+
+- 'all': every request;
+- 'victim:<id>': the requests a victim has made;
+- 'volunteer:<id>': the requests a volunteer holds or has held;
+- 'cell:<zoom>/<x>/<y>': the requests in one map tile at STATS_CELL_ZOOM.
+
+Each document counts its requests in total and by status, type and
+urgency. It also has hourly buckets of requests created, claimed and
+fulfilled. Those buckets include histograms of minutes from creation to
+claim and to fulfillment, so /stats can report medians over the last
+WINDOW_HOURS. A write only $incs the scopes it touches, and a dashboard
+load reads at most three documents, however long the user's history.
+
+Write paths call `record(before, after)` with the request as it was and as
+it is now. A thread started by `start_pruner` drops the hours that have
+left the window from every document once an hour, off the write path.
+Writes that race, or that bypass the app, can leave counters off.
+`reconcile` recounts every document from the live and archived requests.
+It applies the difference as $incs, so counts recorded while it scans are
+kept. Run it with `python backend/stats.py`, or set STATS_RECONCILE_INTERVAL
+(seconds) to run it from a thread in the app.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from tiles import tile_xy
+
+
+logger = logging.getLogger(__name__)
+
+STATS_CELL_ZOOM = int(os.getenv('STATS_CELL_ZOOM', 10))
+WINDOW_HOURS = 24
+# Hours before the window that pruning clears; older ones are left to reconcile
+PRUNE_HOURS = 7 * 24
+
+# Upper bounds (minutes) of the duration histogram buckets; the last is open
+DURATION_BUCKETS = [1, 2, 5, 10, 15, 30, 60, 120, 240, 480, 720, 1440, 2880, 10080]
+OPEN_BUCKET = 'more'
+
+EVENTS = ['created', 'claimed', 'fulfilled']
+STATS_FIELDS = {
+    'victim_id': 1, 'volunteer_id': 1, 'status': 1, 'type': 1, 'urgency': 1, 'location': 1,
+    'created_at': 1, 'updated_at': 1, 'claimed_at': 1, 'fulfilled_at': 1
+}
+
+
+def hour_key(moment):
+    return moment.strftime('%Y-%m-%dT%H')
+
+
+def duration_bucket(minutes):
+    for bound in DURATION_BUCKETS:
+        if minutes <= bound:
+            return str(bound)
+    return OPEN_BUCKET
+
+
+def cell_scope(location):
+    """Counter scope of the map cell holding a location, or None"""
+    try:
+        x, y = tile_xy(float(location['latitude']), float(location['longitude']), STATS_CELL_ZOOM)
+    except (KeyError, TypeError, ValueError):
+        return None
+    return f'cell:{STATS_CELL_ZOOM}/{x}/{y}'
+
+
+def scopes(doc):
+    """Every counter scope a request counts towards"""
+    result = ['all', f"victim:{doc['victim_id']}"]
+    if doc.get('volunteer_id'):
+        result.append(f"volunteer:{doc['volunteer_id']}")
+    cell = cell_scope(doc.get('location'))
+    if cell:
+        result.append(cell)
+    return result
+
+
+def _minutes(start, end):
+    if not isinstance(start, datetime) or not isinstance(end, datetime):
+        return None
+    return max((end - start).total_seconds() / 60, 0)
+
+
+def _add_counts(incs, doc, sign):
+    for scope in scopes(doc):
+        counts = incs[scope]
+        for field in ('total', f"status.{doc['status']}", f"type.{doc['type']}", f"urgency.{doc['urgency']}"):
+            counts[field] += sign
+
+
+def _add_event(incs, doc, event, at, minutes=None):
+    prefix = f'hours.{hour_key(at)}'
+    for scope in scopes(doc):
+        incs[scope][f'{prefix}.{event}'] += 1
+        if minutes is not None:
+            incs[scope][f'{prefix}.{event}_minutes.{duration_bucket(minutes)}'] += 1
+
+
+def changes(before, after, now):
+    """{scope: {field: delta}} for a request going from before (None if new) to after"""
+    incs = defaultdict(lambda: defaultdict(int))
+    if before:
+        _add_counts(incs, before, -1)
+    _add_counts(incs, after, 1)
+
+    previous = before['status'] if before else None
+    if before is None:
+        _add_event(incs, after, 'created', now)
+    if after['status'] == 'in_progress' and previous in (None, 'pending'):
+        _add_event(incs, after, 'claimed', now, _minutes(after.get('created_at'), now))
+    if after['status'] == 'fulfilled' and previous != 'fulfilled':
+        _add_event(incs, after, 'fulfilled', now, _minutes(after.get('created_at'), now))
+
+    return {scope: {f: n for f, n in counts.items() if n} for scope, counts in incs.items()}
+
+
+def record(stats_collection, before, after, now=None):
+    """Apply one request's change to the counters"""
+    record_many(stats_collection, [(before, after)], now)
+
+
+def prune_hours(stats_collection, now):
+    """Drop the hourly buckets that have left the window from every document"""
+    oldest = now - timedelta(hours=WINDOW_HOURS)
+    stats_collection.update_many({}, {'$unset': {
+        f'hours.{hour_key(oldest - timedelta(hours=back))}': '' for back in range(PRUNE_HOURS)
+    }})
+
+
+def prune_loop(stats_collection, interval):
+    while True:
+        try:
+            prune_hours(stats_collection, datetime.utcnow())
+        except PyMongoError:
+            logger.exception('Pruning hourly stats failed')
+        time.sleep(interval)
+
+
+def start_pruner(stats_collection, interval=3600):
+    """Prune expired hours in a thread, every interval seconds"""
+    thread = threading.Thread(target=prune_loop, args=(stats_collection, interval), daemon=True)
+    thread.start()
+    return thread
+
+
+def record_many(stats_collection, transitions, now=None):
+    """Apply (before, after) changes of several requests in one round trip"""
+    now = now or datetime.utcnow()
+    merged = defaultdict(lambda: defaultdict(int))
+    for before, after in transitions:
+        for scope, counts in changes(before, after, now).items():
+            for field, n in counts.items():
+                merged[scope][field] += n
+    updates = [UpdateOne({'_id': scope}, {'$inc': dict(counts)}, upsert=True)
+               for scope, counts in merged.items() if counts]
+    if updates:
+        stats_collection.bulk_write(updates, ordered=False)
+
+
+def _median(histogram):
+    """Median minutes estimated from a duration histogram"""
+    n = sum(histogram.values())
+    if not n:
+        return None
+    seen, lower = 0, 0
+    for bound in DURATION_BUCKETS:
+        count = histogram.get(str(bound), 0)
+        if count and seen + count >= n / 2:
+            return round(lower + (bound - lower) * (n / 2 - seen) / count, 1)
+        seen += count
+        lower = bound
+    return float(lower)
+
+
+def summarize(doc, now=None):
+    """Counts, hourly throughput and medians of one counter document"""
+    doc = doc or {}
+    now = now or datetime.utcnow()
+    hours = doc.get('hours', {})
+    hourly = []
+    histograms = {'claimed': defaultdict(int), 'fulfilled': defaultdict(int)}
+    for back in range(WINDOW_HOURS - 1, -1, -1):
+        key = hour_key(now - timedelta(hours=back))
+        bucket = hours.get(key, {})
+        hourly.append(dict({event: bucket.get(event, 0) for event in EVENTS}, hour=key))
+        for event, histogram in histograms.items():
+            for label, count in bucket.get(f'{event}_minutes', {}).items():
+                histogram[label] += count
+    return {
+        'total': doc.get('total', 0),
+        'status': doc.get('status', {}),
+        'type': doc.get('type', {}),
+        'urgency': doc.get('urgency', {}),
+        'window_hours': WINDOW_HOURS,
+        'hourly': hourly,
+        'median_minutes_to_claim': _median(histograms['claimed']),
+        'median_minutes_to_fulfill': _median(histograms['fulfilled'])
+    }
+
+
+def count_requests(collections, now, session=None):
+    """Counters computed from scratch: {scope: {dotted field: n}}"""
+    window_start = now - timedelta(hours=WINDOW_HOURS)
+    incs = defaultdict(lambda: defaultdict(int))
+    for collection in collections:
+        for doc in collection.find({}, STATS_FIELDS, batch_size=1000, session=session):
+            _add_counts(incs, doc, 1)
+            created_at, claimed_at, fulfilled_at = doc.get('created_at'), doc.get('claimed_at'), doc.get('fulfilled_at')
+            if isinstance(created_at, datetime) and created_at >= window_start:
+                _add_event(incs, doc, 'created', created_at)
+            if isinstance(claimed_at, datetime) and claimed_at >= window_start:
+                _add_event(incs, doc, 'claimed', claimed_at, _minutes(created_at, claimed_at))
+            if doc['status'] == 'fulfilled' and isinstance(fulfilled_at, datetime) and fulfilled_at >= window_start:
+                _add_event(incs, doc, 'fulfilled', fulfilled_at, _minutes(created_at, fulfilled_at))
+    return incs
+
+
+def _flatten(doc, prefix=''):
+    flat = {}
+    for key, value in doc.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def _snapshot_session(collection):
+    """A session whose reads all see one point in time, or None if the server has none"""
+    try:
+        session = collection.database.client.start_session(snapshot=True)
+    except (PyMongoError, TypeError, NotImplementedError):
+        return None
+    try:
+        collection.find_one({}, {'_id': 1}, session=session)
+    except PyMongoError:
+        # Snapshot reads need a replica set or sharded cluster
+        session.end_session()
+        return None
+    return session
+
+
+def reconcile(collections, stats_collection, batch_size=1000):
+    """Correct every counter document by a fresh count; returns how many were written
+
+    The stored counters and the requests are read at one point in time where
+    the server supports it (a snapshot session), and the difference between
+    the two is applied with $inc. Counts that record() adds while this runs
+    are kept. Without snapshots, the counters are read first, so a write
+    that lands during the scan may be counted twice until the next run.
+    """
+    started = datetime.utcnow()
+    oldest_hour = hour_key(started - timedelta(hours=WINDOW_HOURS))
+    session = _snapshot_session(stats_collection)
+    try:
+        stored = {doc.pop('_id'): _flatten(doc) for doc in
+                  stats_collection.find({}, {'reconciled_at': 0}, session=session)}
+        counted = count_requests(collections, started, session)
+    finally:
+        if session:
+            session.end_session()
+
+    writes, emptied = [], []
+    for scope in stored.keys() | counted.keys():
+        before, after = stored.get(scope, {}), counted.get(scope, {})
+        expired = {field for field in before if field.startswith('hours.') and field.split('.')[1] < oldest_hour}
+        update = {'$set': {'reconciled_at': started}}
+        incs = {field: after.get(field, 0) - before.get(field, 0)
+                for field in (before.keys() | after.keys()) - expired}
+        incs = {field: n for field, n in incs.items() if n}
+        if incs:
+            update['$inc'] = incs
+        if expired:
+            update['$unset'] = {f"hours.{field.split('.')[1]}": '' for field in expired}
+        writes.append(UpdateOne({'_id': scope}, update, upsert=True))
+        if scope not in counted:
+            emptied.append(scope)
+    for start in range(0, len(writes), batch_size):
+        stats_collection.bulk_write(writes[start:start + batch_size], ordered=False)
+    # Scopes with no requests left, unless record() has counted some since
+    if emptied:
+        stats_collection.delete_many({'_id': {'$in': emptied}, 'total': {'$lte': 0}})
+    return len(writes)
+
+
+def reconcile_loop(collections, stats_collection, interval):
+    while True:
+        try:
+            written = reconcile(collections, stats_collection)
+            logger.info('Reconciled %d counter documents', written)
+        except PyMongoError:
+            logger.exception('Stats reconciliation failed')
+        if not interval:
+            return
+        time.sleep(interval)
+
+
+def start_reconciler(collections, stats_collection, interval=None):
+    """Reconcile in a thread, every interval seconds or just once"""
+    thread = threading.Thread(target=reconcile_loop, args=(collections, stats_collection, interval),
+                              daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo.mongo_client import MongoClient
+    from pymongo.server_api import ServerApi
+
+    from archive import ARCHIVE_COLLECTION
+
+    argparse.ArgumentParser(description='Rebuild dashboard counters from the stored requests').parse_args()
+    load_dotenv()
+    db = MongoClient(os.getenv('MONGO_URI_STRING'), server_api=ServerApi('1'))['Database']
+    start = time.perf_counter()
+    written = reconcile([db['requests'], db[ARCHIVE_COLLECTION]], db['stats'])
+    print(f'{written} counter documents rebuilt in {time.perf_counter() - start:.2f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""Per-volunteer cache of ranked suggestions.
+
+Each entry keeps a volunteer's best `depth` candidates plus a `floor`: an
+upper bound on the score of every pending request that is *not* cached.
+Request events keep entries current instead of dropping them:
+
+- a new pending request is scored against every entry and inserted if it
+  beats the floor. A request is offered again when its description has
+  been embedded, since its semantic points can only go up;
+- a claimed, cancelled or fulfilled request is removed, and the entry is
+  only invalidated when fewer than SUGGESTION_LIMIT trusted items remain.
+
+Age boosts only ever decrease, so uncached requests can never rise above the
+floor. When a cached request crosses an age bucket the entry is rescored on
+its next read, and stays valid as long as its top SUGGESTION_LIMIT still
+score at or above the floor.
+
+The cache is per process and listens to the event bus, like the tile index.
+With several workers, use EVENT_SOURCE=change_stream so each sees the
+others' writes; otherwise their entries catch up when they expire.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import threading
+
+from scoring import (
+    AGE_SCORES, SUGGESTION_LIMIT, calculate_distance, score_request, suggestion_from
+)
+
+
+class _Entry:
+    __slots__ = ('lat', 'lon', 'skills', 'items', 'floor', 'expires_at', 'next_rescore')
+
+    def __init__(self, lat, lon, skills, items, floor, now, ttl):
+        self.lat = lat
+        self.lon = lon
+        self.skills = skills
+        self.items = items
+        self.floor = floor
+        self.expires_at = now + ttl
+        self.next_rescore = next_age_boundary(items, now)
+
+    @property
+    def complete(self):
+        # A negative floor means every pending request is cached
+        return self.floor < 0
+
+    def trusted(self):
+        if self.complete:
+            return True
+        return (len(self.items) >= SUGGESTION_LIMIT and
+                self.items[SUGGESTION_LIMIT - 1][2] >= self.floor)
+
+
+def next_age_boundary(items, now):
+    """Earliest time after now that a cached request drops into a lower age bucket"""
+    boundary = datetime.max
+    for req, _, _ in items:
+        for limit, _ in AGE_SCORES:
+            crossing = req['created_at'] + timedelta(hours=limit)
+            if crossing > now:
+                boundary = min(boundary, crossing)
+                break
+    return boundary
+
+
+class SuggestionCache:
+    """Bounded LRU cache of ranked suggestions keyed by volunteer id"""
+
+    def __init__(self, maxsize=1024, ttl=300, depth=SUGGESTION_LIMIT * 3, semantic=None):
+        self.maxsize = maxsize
+        self.ttl = timedelta(seconds=ttl)
+        self.depth = depth
+        self.semantic = semantic
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ['hits', 'misses', 'invalidations', 'evictions', 'expirations', 'rescores', 'updates'], 0
+        )
+
+    def get(self, volunteer_id, now):
+        """Cached top suggestions for a volunteer, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(volunteer_id)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+
+            if now >= entry.expires_at:
+                del self._entries[volunteer_id]
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return None
+
+            if now >= entry.next_rescore:
+                self._rescore(entry, now)
+                if not entry.trusted():
+                    del self._entries[volunteer_id]
+                    self._counters['invalidations'] += 1
+                    self._counters['misses'] += 1
+                    return None
+
+            self._entries.move_to_end(volunteer_id)
+            self._counters['hits'] += 1
+            return [suggestion_from(*item) for item in entry.items[:SUGGESTION_LIMIT]]
+
+    def put(self, volunteer_id, location, skills, ranked, now):
+        """Store a volunteer's ranking: (doc, distance, score) tuples, best first"""
+        ranked = list(ranked[:self.depth])
+        floor = ranked[-1][2] if len(ranked) >= self.depth else -1
+        entry = _Entry(float(location['latitude']), float(location['longitude']),
+                       list(skills or []), ranked, floor, now, self.ttl)
+
+        with self._lock:
+            self._entries[volunteer_id] = entry
+            self._entries.move_to_end(volunteer_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def invalidate(self, volunteer_id):
+        """Drop a volunteer's entry, e.g. after their location or skills change"""
+        with self._lock:
+            if self._entries.pop(volunteer_id, None) is not None:
+                self._counters['invalidations'] += 1
+
+    def clear(self):
+        """Drop every entry, e.g. once volunteer profiles change how all requests score"""
+        with self._lock:
+            self._counters['invalidations'] += len(self._entries)
+            self._entries.clear()
+
+    def add_request(self, req, now):
+        """Offer a newly pending or newly embedded request to every cached ranking"""
+        req_location = req.get('location', {})
+        if not (req_location.get('latitude') and req_location.get('longitude')):
+            return
+
+        lat = float(req_location['latitude'])
+        lon = float(req_location['longitude'])
+        request_id = str(req['_id'])
+        with self._lock:
+            for entry in self._entries.values():
+                distance = calculate_distance(entry.lat, entry.lon, lat, lon)
+                score = score_request(req, distance, entry.skills, now, self.semantic)
+                if score <= entry.floor:
+                    continue
+
+                entry.items = [item for item in entry.items if str(item[0]['_id']) != request_id]
+                entry.items.append((req, distance, score))
+                entry.items.sort(key=lambda item: item[2], reverse=True)
+                if len(entry.items) > self.depth:
+                    entry.floor = max(entry.floor, entry.items.pop()[2])
+                entry.next_rescore = min(entry.next_rescore,
+                                         next_age_boundary([(req, distance, score)], now))
+                self._counters['updates'] += 1
+
+    def on_event(self, event):
+        """EventBus listener: pending requests are offered, any other status is withdrawn"""
+        if event.get('recipient'):
+            return
+        payload = event['request']
+        if payload['status'] != 'pending':
+            self.remove_request(payload['id'])
+            return
+        req = dict(payload, _id=payload['id'], created_at=datetime.fromisoformat(payload['created_at']))
+        self.add_request(req, datetime.utcnow())
+
+    def remove_request(self, request_id):
+        """Withdraw a request that is no longer pending from every ranking"""
+        request_id = str(request_id)
+        with self._lock:
+            for volunteer_id, entry in list(self._entries.items()):
+                remaining = [item for item in entry.items if str(item[0]['_id']) != request_id]
+                if len(remaining) == len(entry.items):
+                    continue
+
+                entry.items = remaining
+                self._counters['updates'] += 1
+                if not entry.complete and len(remaining) < SUGGESTION_LIMIT:
+                    del self._entries[volunteer_id]
+                    self._counters['invalidations'] += 1
+
+    def stats(self):
+        """Counters plus current size, for monitoring"""
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return dict(
+                self._counters,
+                size=len(self._entries),
+                maxsize=self.maxsize,
+                hit_rate=round(self._counters['hits'] / lookups, 4) if lookups else None
+            )
+
+    def _rescore(self, entry, now):
+        entry.items = [(req, distance, score_request(req, distance, entry.skills, now, self.semantic))
+                       for req, distance, _ in entry.items]
+        entry.items.sort(key=lambda item: item[2], reverse=True)
+        entry.next_rescore = next_age_boundary(entry.items, now)
+        self._counters['rescores'] += 1
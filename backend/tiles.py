@@ -0,0 +1,236 @@
+"""In-memory tile index of pending requests for the map view.
+
+Tiles use the slippy-map (Web Mercator) z/x/y scheme that Leaflet uses.
+Below PIN_ZOOM a tile is answered with clusters: the tile is split into
+2**CLUSTER_DEPTH cells per side, and each cell with requests reports its
+count, centroid and breakdown by type and urgency. From PIN_ZOOM on, tiles
+list individual pins.
+
+Cluster counts are kept pre-aggregated for every level and updated in place
+as requests are created, claimed or change status, so a tile read never
+touches MongoDB. Every tile also carries a version that changes whenever a
+request inside it does, for ETags.
+
+The index follows the event bus, so with EVENT_SOURCE=change_stream every
+worker sees every write.
+"""
+import math
+import threading
+import uuid
+
+from events import event_payload
+from projections import HAS_LOCATION, MAP_DESCRIPTION_LENGTH
+
+
+PIN_ZOOM = 14
+CLUSTER_DEPTH = 3
+MAX_ZOOM = 20
+
+# Most tiles a single bounding-box query may cover
+MAX_BBOX_TILES = 64
+
+# Web Mercator stops short of the poles
+MAX_LATITUDE = 85.05112878
+
+# Finest level kept: cluster cells of the last clustered zoom
+_CELL_LEVEL = PIN_ZOOM - 1 + CLUSTER_DEPTH
+
+PIN_FIELDS = {
+    'type': 1, 'urgency': 1, 'status': 1, 'description': 1, 'location': 1,
+    'victim_id': 1, 'created_at': 1
+}
+
+
+def tile_xy(lat, lon, zoom):
+    """Slippy-map tile containing a point"""
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    n = 2 ** zoom
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_in_bbox(west, south, east, north, zoom):
+    """Every tile at zoom that intersects a bounding box"""
+    x0, y0 = tile_xy(north, west, zoom)
+    x1, y1 = tile_xy(south, east, zoom)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def pin_from(payload):
+    """Map pin for an event payload, as GET /map/data returns it"""
+    description = payload['description']
+    if len(description) > MAP_DESCRIPTION_LENGTH:
+        description = description[:MAP_DESCRIPTION_LENGTH] + '...'
+    return {
+        'id': payload['id'],
+        'type': payload['type'],
+        'urgency': payload['urgency'],
+        'description': description,
+        'location': payload['location'],
+        'created_at': payload['created_at']
+    }
+
+
+class _Cell:
+    """Counts and coordinate sums per (type, urgency) within one cluster cell"""
+    __slots__ = ('groups',)
+
+    def __init__(self):
+        self.groups = {}
+
+    def add(self, key, lat, lon, sign):
+        count, sum_lat, sum_lon = self.groups.get(key, (0, 0.0, 0.0))
+        count += sign
+        if count:
+            self.groups[key] = (count, sum_lat + sign * lat, sum_lon + sign * lon)
+        else:
+            self.groups.pop(key, None)
+
+    def summary(self, types, urgencies):
+        count, sum_lat, sum_lon = 0, 0.0, 0.0
+        by_type, by_urgency = {}, {}
+        for (req_type, urgency), (n, lat, lon) in self.groups.items():
+            if (types and req_type not in types) or (urgencies and urgency not in urgencies):
+                continue
+            count += n
+            sum_lat += lat
+            sum_lon += lon
+            by_type[req_type] = by_type.get(req_type, 0) + n
+            by_urgency[urgency] = by_urgency.get(urgency, 0) + n
+        if not count:
+            return None
+        return {
+            'latitude': sum_lat / count,
+            'longitude': sum_lon / count,
+            'count': count,
+            'types': by_type,
+            'urgencies': by_urgency
+        }
+
+
+class TileIndex:
+    """Pending requests bucketed by tile, with cluster counts at every zoom"""
+
+    def __init__(self):
+        # Changes whenever the index is rebuilt, so ETags never outlive it
+        self.generation = uuid.uuid4().hex
+        self._requests = {}
+        self._cells = [dict() for _ in range(_CELL_LEVEL + 1)]
+        self._pins = {}
+        self._versions = [dict() for _ in range(PIN_ZOOM + 1)]
+        self._lock = threading.Lock()
+
+    def load(self, requests_collection):
+        """Index every pending request that has a location, dropping any other
+
+        Loading again refreshes the index, e.g. in a worker forked from a
+        process that had already loaded it.
+        """
+        loaded = set()
+        for doc in requests_collection.find(dict({'status': 'pending'}, **HAS_LOCATION), PIN_FIELDS):
+            payload = event_payload(doc)
+            loaded.add(payload['id'])
+            self.apply(payload)
+        with self._lock:
+            stale = [request_id for request_id in self._requests if request_id not in loaded]
+        for request_id in stale:
+            self.apply({'id': request_id, 'status': None})
+
+    def on_event(self, event):
+        """EventBus listener; private events (proposals) say nothing new about a request"""
+        if not event.get('recipient'):
+            self.apply(event['request'])
+
+    def apply(self, payload):
+        """Add, move or drop a request according to its current status"""
+        location = payload.get('location') or {}
+        pending = payload['status'] == 'pending' and location.get('latitude') and location.get('longitude')
+        with self._lock:
+            previous = self._requests.pop(payload['id'], None)
+            if previous:
+                self._update(previous, -1)
+            if pending:
+                entry = (float(location['latitude']), float(location['longitude']),
+                         payload['type'], payload['urgency'], pin_from(payload))
+                self._requests[payload['id']] = entry
+                self._update(entry, 1)
+
+    def _update(self, entry, sign):
+        lat, lon, req_type, urgency, pin = entry
+        key = (req_type, urgency)
+
+        x, y = tile_xy(lat, lon, _CELL_LEVEL)
+        for level in range(CLUSTER_DEPTH, _CELL_LEVEL + 1):
+            shift = _CELL_LEVEL - level
+            cells = self._cells[level]
+            cell = cells.get((x >> shift, y >> shift))
+            if cell is None:
+                cell = cells[(x >> shift, y >> shift)] = _Cell()
+            cell.add(key, lat, lon, sign)
+            if not cell.groups:
+                del cells[(x >> shift, y >> shift)]
+
+        pin_tile = (x >> (_CELL_LEVEL - PIN_ZOOM), y >> (_CELL_LEVEL - PIN_ZOOM))
+        pins = self._pins.setdefault(pin_tile, {})
+        if sign > 0:
+            pins[pin['id']] = pin
+        else:
+            pins.pop(pin['id'], None)
+            if not pins:
+                del self._pins[pin_tile]
+
+        for zoom in range(PIN_ZOOM + 1):
+            shift = PIN_ZOOM - zoom
+            tile = (pin_tile[0] >> shift, pin_tile[1] >> shift)
+            self._versions[zoom][tile] = self._versions[zoom].get(tile, 0) + 1
+
+    def version(self, zoom, x, y):
+        """Counter that changes with every write inside the tile"""
+        if zoom > PIN_ZOOM:
+            shift = zoom - PIN_ZOOM
+            zoom, x, y = PIN_ZOOM, x >> shift, y >> shift
+        with self._lock:
+            return self._versions[zoom].get((x, y), 0)
+
+    def tile(self, zoom, x, y, types=None, urgencies=None):
+        """Clusters or pins in one tile, optionally filtered by type and urgency"""
+        if zoom >= PIN_ZOOM:
+            return {'pins': self._tile_pins(zoom, x, y, types, urgencies)}
+
+        level = zoom + CLUSTER_DEPTH
+        side = 2 ** CLUSTER_DEPTH
+        clusters = []
+        with self._lock:
+            cells = self._cells[level]
+            for cx in range(x * side, (x + 1) * side):
+                for cy in range(y * side, (y + 1) * side):
+                    cell = cells.get((cx, cy))
+                    summary = cell and cell.summary(types, urgencies)
+                    if summary:
+                        clusters.append(summary)
+        return {'clusters': clusters}
+
+    def _tile_pins(self, zoom, x, y, types, urgencies):
+        shift = zoom - PIN_ZOOM
+        with self._lock:
+            pins = list(self._pins.get((x >> shift, y >> shift), {}).values())
+
+        found = []
+        for pin in pins:
+            if (types and pin['type'] not in types) or (urgencies and pin['urgency'] not in urgencies):
+                continue
+            # Past PIN_ZOOM, keep only the part of the indexed tile asked for
+            location = pin['location']
+            if shift and tile_xy(float(location['latitude']), float(location['longitude']), zoom) != (x, y):
+                continue
+            found.append(pin)
+        return found
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': len(self._requests),
+                'pin_tiles': len(self._pins),
+                'generation': self.generation
+            }
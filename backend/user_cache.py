@@ -0,0 +1,70 @@
+"""Short-lived cache of user profiles keyed by session user id.
+
+Profiles are loaded with USER_PROJECTION so secrets never leave the
+database. update_profile invalidates the writer's entry directly; other
+worker processes pick the change up when the TTL runs out.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+USER_PROJECTION = {'password_hash': 0}
+
+
+class UserCache:
+    """Bounded TTL cache of user documents"""
+
+    def __init__(self, maxsize=4096, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(['hits', 'misses', 'invalidations', 'evictions'], 0)
+
+    def get(self, user_id, load):
+        """Cached copy of a user, calling load(user_id) on a miss"""
+        user = self.peek(user_id)
+        if user is None:
+            user = load(user_id)
+            if user is None:
+                return None
+            self.put(user_id, user)
+        return dict(user)
+
+    def peek(self, user_id):
+        """Cached copy of a user, or None on a miss (for callers that load asynchronously)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self._counters['hits'] += 1
+                return dict(entry[1])
+            self._counters['misses'] += 1
+        return None
+
+    def put(self, user_id, user):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def invalidate(self, user_id):
+        """Forget a user, e.g. after their profile changes"""
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self._counters['invalidations'] += 1
+
+    def stats(self):
+        """Counters plus current size, for monitoring"""
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return dict(
+                self._counters,
+                size=len(self._entries),
+                maxsize=self.maxsize,
+                hit_rate=round(self._counters['hits'] / lookups, 4) if lookups else None
+            )
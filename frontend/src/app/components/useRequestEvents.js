@@ -0,0 +1,54 @@
+'use client';
+
+import { useEffect, useRef } from 'react';
+
+const EVENT_TYPES = ['request.created', 'request.claimed', 'request.status_changed', 'request.fulfilled'];
+
+// Subscribe to live request events from the backend's /events stream.
+// onEvent(eventType, request) is called for every delta; onResync is called
+// when the server asks the client to reload its full state.
+export function useRequestEvents(onEvent, { filters = {}, enabled = true, onResync } = {}) {
+  const onEventRef = useRef(onEvent);
+  const onResyncRef = useRef(onResync);
+  onEventRef.current = onEvent;
+  onResyncRef.current = onResync;
+
+  const params = new URLSearchParams();
+  Object.entries(filters).forEach(([key, value]) => {
+    if (value) {
+      params.append(key, value);
+    }
+  });
+  const query = params.toString();
+
+  useEffect(() => {
+    if (!enabled || typeof window === 'undefined' || !window.EventSource) return;
+
+    const source = new EventSource(`/api/events${query ? `?${query}` : ''}`, { withCredentials: true });
+    const handleEvent = (event) => onEventRef.current?.(event.type, JSON.parse(event.data));
+    const handleResync = () => onResyncRef.current?.();
+
+    EVENT_TYPES.forEach(type => source.addEventListener(type, handleEvent));
+    source.addEventListener('resync', handleResync);
+
+    return () => source.close();
+  }, [enabled, query]);
+}
+
+// Apply a request delta to a list: update or drop an existing entry, or
+// prepend a new one that matches the list's filters.
+export function applyRequestEvent(list, request, matches = () => true) {
+  const index = list.findIndex(item => (item._id || item.id) === request.id);
+
+  if (index === -1) {
+    return matches(request) ? [{ ...request, _id: request.id }, ...list] : list;
+  }
+
+  if (!matches(request)) {
+    return list.filter((_, i) => i !== index);
+  }
+
+  const updated = [...list];
+  updated[index] = { ...list[index], ...request, id: list[index].id, distance: list[index].distance ?? request.distance };
+  return updated;
+}
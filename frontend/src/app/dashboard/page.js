@@ -4,6 +4,7 @@ import { useState, useEffect } from 'react';
 import { useRouter } from 'next/navigation';
 import Link from 'next/link';
 import Navigation from '../components/Navigation';
+import { useRequestEvents, applyRequestEvent } from '../components/useRequestEvents';
 import { 
   PlusIcon, 
   MapPinIcon, 
@@ -33,6 +34,7 @@ export default function Dashboard() {
 
     fetchUserData();
     fetchRequests();
+    fetchStats();
   }, []);
 
   const fetchUserData = async () => {
@@ -62,7 +64,6 @@ export default function Dashboard() {
       if (response.ok) {
         const requestsData = await response.json();
         setRequests(requestsData);
-        calculateStats(requestsData);
       }
     } catch (error) {
       console.error('Error fetching requests:', error);
@@ -71,23 +72,50 @@ export default function Dashboard() {
     }
   };
 
-  const calculateStats = (requestsData) => {
-    const role = localStorage.getItem('role');
-    
-    if (role === 'victim') {
-      const pending = requestsData.filter(r => r.status === 'pending').length;
-      const inProgress = requestsData.filter(r => r.status === 'in_progress').length;
-      const fulfilled = requestsData.filter(r => r.status === 'fulfilled').length;
-      
-      setStats({ pending, inProgress, fulfilled, total: requestsData.length });
-    } else {
-      const helped = requestsData.filter(r => r.status === 'fulfilled').length;
-      const inProgress = requestsData.filter(r => r.status === 'in_progress').length;
+  // Counters are kept by the server, so this is one small read however
+  // many requests the user has
+  const fetchStats = async () => {
+    try {
+      const response = await fetch('/api/stats', {
+        credentials: 'include',
+      });
       
-      setStats({ helped, inProgress, available: requestsData.length });
+      if (response.ok) {
+        const { user: own, all } = await response.json();
+        const role = localStorage.getItem('role');
+        
+        if (role === 'victim') {
+          setStats({
+            pending: own.status.pending || 0,
+            inProgress: own.status.in_progress || 0,
+            fulfilled: own.status.fulfilled || 0,
+            total: own.total
+          });
+        } else {
+          setStats({
+            helped: own.status.fulfilled || 0,
+            inProgress: own.status.in_progress || 0,
+            available: all.status.pending || 0
+          });
+        }
+      }
+    } catch (error) {
+      console.error('Error fetching stats:', error);
     }
   };
 
+  useRequestEvents(
+    (eventType, request) => {
+      setRequests(prev => {
+        // Volunteers see pending requests; victims follow all of their own
+        const matches = (r) => user?.role === 'victim' || r.status === 'pending';
+        return applyRequestEvent(prev, request, matches);
+      });
+      fetchStats();
+    },
+    { enabled: !!user, onResync: () => { fetchRequests(); fetchStats(); } }
+  );
+
   const getUrgencyColor = (urgency) => {
     switch (urgency) {
       case 'high': return 'text-red-600 bg-red-50 border-red-200';
@@ -108,7 +136,8 @@ export default function Dashboard() {
 
   const markAsFulfilled = async (requestId) => {
     try {
-      const response = await fetch(`/api/requests/${requestId}/status`, {
+      // On success the change arrives through the live event stream
+      await fetch(`/api/requests/${requestId}/status`, {
         method: 'PUT',
         headers: {
           'Content-Type': 'application/json',
@@ -116,10 +145,6 @@ export default function Dashboard() {
         credentials: 'include',
         body: JSON.stringify({ status: 'fulfilled' }),
       });
-
-      if (response.ok) {
-        fetchRequests(); // Refresh the data
-      }
     } catch (error) {
       console.error('Error updating request status:', error);
     }
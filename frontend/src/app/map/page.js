@@ -13,11 +13,35 @@ import {
   XMarkIcon
 } from '@heroicons/react/24/outline';
 
+const urgencyColors = {
+  high: '#dc2626',
+  medium: '#ea580c',
+  low: '#16a34a'
+};
+
+// Slippy-map tile containing a point, as the backend's /map/tiles expects
+const tileXY = (lat, lon, zoom) => {
+  const n = 2 ** zoom;
+  const clampedLat = Math.max(Math.min(lat, 85.05112878), -85.05112878);
+  const x = Math.floor((lon + 180) / 360 * n);
+  const y = Math.floor((1 - Math.asinh(Math.tan(clampedLat * Math.PI / 180)) / Math.PI) / 2 * n);
+  return [Math.min(Math.max(x, 0), n - 1), Math.min(Math.max(y, 0), n - 1)];
+};
+
+const distanceKm = (lat1, lon1, lat2, lon2) => {
+  const toRad = (deg) => deg * Math.PI / 180;
+  const a = Math.sin(toRad(lat2 - lat1) / 2) ** 2 +
+    Math.cos(toRad(lat1)) * Math.cos(toRad(lat2)) * Math.sin(toRad(lon2 - lon1) / 2) ** 2;
+  return 6371 * 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1 - a));
+};
+
 export default function Map() {
   const [user, setUser] = useState(null);
   const [requests, setRequests] = useState([]);
+  const [requestCount, setRequestCount] = useState(0);
   const [selectedRequest, setSelectedRequest] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [leafletLoaded, setLeafletLoaded] = useState(false);
   const [filters, setFilters] = useState({
     type: '',
     urgency: '',
@@ -25,8 +49,12 @@ export default function Map() {
   });
   const mapRef = useRef(null);
   const leafletRef = useRef(null);
-  const markersRef = useRef([]);
+  const mapInstanceRef = useRef(null);
+  const layerRef = useRef(null);
+  const filtersRef = useRef(filters);
+  const fetchIdRef = useRef(0);
   const router = useRouter();
+  filtersRef.current = filters;
 
   useEffect(() => {
     const role = localStorage.getItem('role');
@@ -42,10 +70,23 @@ export default function Map() {
   }, []);
 
   useEffect(() => {
-    if (user && leafletRef.current) {
-      fetchMapData();
+    if (user && leafletLoaded && !loading) {
+      initializeMap();
+    }
+  }, [user, leafletLoaded, loading]);
+
+  useEffect(() => {
+    if (mapInstanceRef.current) {
+      fetchTiles();
     }
-  }, [user, filters]);
+  }, [filters]);
+
+  useEffect(() => {
+    return () => {
+      mapInstanceRef.current?.remove();
+      mapInstanceRef.current = null;
+    };
+  }, []);
 
   const loadLeaflet = async () => {
     if (typeof window !== 'undefined') {
@@ -59,6 +100,7 @@ export default function Map() {
         iconUrl: 'https://cdnjs.cloudflare.com/ajax/libs/leaflet/1.9.4/images/marker-icon.png',
         shadowUrl: 'https://cdnjs.cloudflare.com/ajax/libs/leaflet/1.9.4/images/marker-shadow.png',
       });
+      setLeafletLoaded(true);
     }
   };
 
@@ -77,48 +119,77 @@ export default function Map() {
     } catch (error) {
       console.error('Error fetching user data:', error);
       router.push('/login');
+    } finally {
+      setLoading(false);
     }
   };
 
-  const fetchMapData = async () => {
-    try {
-      const params = new URLSearchParams();
-      
-      Object.entries(filters).forEach(([key, value]) => {
-        if (value) {
-          if (key === 'maxDistance') {
-            params.append('max_distance', value);
-          } else {
-            params.append(key, value);
-          }
-        }
-      });
+  // Load the tiles covering the current view; unchanged tiles come back as 304s
+  const fetchTiles = async () => {
+    const map = mapInstanceRef.current;
+    if (!map) return;
 
-      const response = await fetch(`/api/map/data?${params.toString()}`, {
-        credentials: 'include',
-      });
-      
-      if (response.ok) {
-        const data = await response.json();
-        setRequests(data.requests);
-        initializeMap(data.requests, data.user_location);
+    const zoom = Math.round(map.getZoom());
+    const bounds = map.getBounds();
+    const [x0, y0] = tileXY(bounds.getNorth(), bounds.getWest(), zoom);
+    const [x1, y1] = tileXY(bounds.getSouth(), bounds.getEast(), zoom);
+
+    const params = new URLSearchParams();
+    ['type', 'urgency'].forEach(key => {
+      if (filtersRef.current[key]) {
+        params.append(key, filtersRef.current[key]);
       }
+    });
+    const query = params.toString();
+
+    const urls = [];
+    for (let x = x0; x <= x1; x++) {
+      for (let y = y0; y <= y1; y++) {
+        urls.push(`/api/map/tiles/${zoom}/${x}/${y}${query ? `?${query}` : ''}`);
+      }
+    }
+
+    const fetchId = ++fetchIdRef.current;
+    try {
+      const tiles = await Promise.all(urls.map(async (url) => {
+        const response = await fetch(url, { credentials: 'include' });
+        return response.ok ? response.json() : {};
+      }));
+
+      // A later pan or zoom has already replaced this view
+      if (fetchId !== fetchIdRef.current) return;
+
+      const distanceTo = makeDistanceFrom(user?.location);
+      const maxDistance = parseFloat(filtersRef.current.maxDistance);
+      const withinDistance = (distance) => !maxDistance || distance === null || distance <= maxDistance;
+
+      const clusters = tiles.flatMap(tile => tile.clusters || [])
+        .filter(cluster => withinDistance(distanceTo(cluster.latitude, cluster.longitude)));
+      const pins = tiles.flatMap(tile => tile.pins || [])
+        .map(pin => ({ ...pin, distance: distanceTo(pin.location.latitude, pin.location.longitude) }))
+        .filter(pin => withinDistance(pin.distance));
+
+      setRequests(pins);
+      setRequestCount(pins.length + clusters.reduce((sum, cluster) => sum + cluster.count, 0));
+      renderTiles(clusters, pins);
     } catch (error) {
-      console.error('Error fetching map data:', error);
-    } finally {
-      setLoading(false);
+      console.error('Error fetching map tiles:', error);
     }
   };
 
-  const initializeMap = (requestsData, userLocation) => {
-    if (!leafletRef.current || !mapRef.current) return;
+  // Tiles are shared by everyone, so distances from the user are worked out here
+  const makeDistanceFrom = (location) => {
+    if (!location?.latitude || !location?.longitude) {
+      return () => null;
+    }
+    return (lat, lon) => Math.round(distanceKm(location.latitude, location.longitude, lat, lon) * 100) / 100;
+  };
 
-    const L = leafletRef.current;
+  const initializeMap = () => {
+    if (!leafletRef.current || !mapRef.current || mapInstanceRef.current) return;
 
-    // Clear existing map
-    if (mapRef.current._leaflet_id) {
-      mapRef.current._leaflet_map.remove();
-    }
+    const L = leafletRef.current;
+    const userLocation = user.location || {};
 
     // Default center (San Francisco if no user location)
     const defaultCenter = [37.7749, -122.4194];
@@ -128,17 +199,13 @@ export default function Map() {
 
     // Initialize map
     const map = L.map(mapRef.current).setView(center, 12);
-    mapRef.current._leaflet_map = map;
+    mapInstanceRef.current = map;
 
     // Add tile layer
     L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
       attribution: '© OpenStreetMap contributors'
     }).addTo(map);
 
-    // Clear existing markers
-    markersRef.current.forEach(marker => marker.remove());
-    markersRef.current = [];
-
     // Add user location marker if available
     if (userLocation.latitude && userLocation.longitude) {
       const userMarker = L.marker([userLocation.latitude, userLocation.longitude])
@@ -154,115 +221,131 @@ export default function Map() {
         iconAnchor: [10, 10]
       });
       userMarker.setIcon(userIcon);
-      
-      markersRef.current.push(userMarker);
     }
 
-    // Add request markers
-    requestsData.forEach(request => {
-      if (request.location.latitude && request.location.longitude) {
-        const urgencyColors = {
-          high: '#dc2626',
-          medium: '#ea580c',
-          low: '#16a34a'
-        };
-
-        const marker = L.marker([request.location.latitude, request.location.longitude])
-          .addTo(map);
-
-        // Custom icon based on urgency and status
-        let iconHtml;
-        if (request.status === 'in_progress' && request.volunteer_location) {
-          // Request has volunteer assigned - show as yellow
-          iconHtml = `<div style="background-color: #eab308; width: 16px; height: 16px; border-radius: 50%; border: 2px solid white; box-shadow: 0 2px 4px rgba(0,0,0,0.3);"></div>`;
-        } else {
-          // Regular request
-          iconHtml = `<div style="background-color: ${urgencyColors[request.urgency]}; width: 16px; height: 16px; border-radius: 50%; border: 2px solid white; box-shadow: 0 2px 4px rgba(0,0,0,0.3);"></div>`;
-        }
-
-        const icon = L.divIcon({
-          className: 'request-marker',
-          html: iconHtml,
-          iconSize: [16, 16],
-          iconAnchor: [8, 8]
-        });
-        marker.setIcon(icon);
-
-        // Add click handler
-        marker.on('click', () => {
-          setSelectedRequest(request);
-        });
-
-        // Enhanced popup content
-        const statusText = request.status === 'in_progress' ? 'Help on the way' : 'Help needed';
-        const popupContent = `
-          <div class="p-2">
-            <div class="flex items-center space-x-2 mb-2">
-              <span class="px-2 py-1 rounded-full text-xs font-medium" style="background-color: ${urgencyColors[request.urgency]}20; color: ${urgencyColors[request.urgency]}">
-                ${request.urgency} priority
-              </span>
-              <span class="px-2 py-1 rounded-full text-xs font-medium bg-gray-100 text-gray-800">
-                ${request.type}
-              </span>
-            </div>
-            <p class="text-sm font-medium mb-1">${statusText}</p>
-            <p class="text-sm mb-1">${request.description.length > 50 ? request.description.substring(0, 50) + '...' : request.description}</p>
-            ${request.distance ? `<p class="text-xs text-gray-600">${request.distance} km away</p>` : ''}
-            ${request.status === 'in_progress' ? '<p class="text-xs text-green-600 font-medium">Volunteer assigned</p>' : ''}
-            <button onclick="window.selectRequest('${request.id}')" class="mt-2 text-xs text-blue-600 hover:text-blue-800">View Details</button>
-          </div>
-        `;
-        
-        marker.bindPopup(popupContent);
-        markersRef.current.push(marker);
-
-        // Add volunteer marker if request is in progress and has volunteer location
-        if (request.status === 'in_progress' && request.volunteer_location && 
-            request.volunteer_location.latitude && request.volunteer_location.longitude) {
-          
-          const volunteerMarker = L.marker([request.volunteer_location.latitude, request.volunteer_location.longitude])
-            .addTo(map);
-
-          // Volunteer icon
-          const volunteerIcon = L.divIcon({
-            className: 'volunteer-marker',
-            html: `<div style="background-color: #2563eb; width: 18px; height: 18px; border-radius: 50%; border: 2px solid white; box-shadow: 0 2px 4px rgba(0,0,0,0.3); display: flex; align-items: center; justify-content: center;">
-                     <div style="color: white; font-size: 10px; font-weight: bold;">V</div>
-                   </div>`,
-            iconSize: [18, 18],
-            iconAnchor: [9, 9]
-          });
-          volunteerMarker.setIcon(volunteerIcon);
-
-          const volunteerPopupContent = `
-            <div class="p-2">
-              <p class="text-sm font-medium mb-1">Volunteer</p>
-              <p class="text-sm text-gray-700">${request.volunteer_name || 'Volunteer'}</p>
-              <p class="text-xs text-green-600">Helping with ${request.type} request</p>
-            </div>
-          `;
-          volunteerMarker.bindPopup(volunteerPopupContent);
-          markersRef.current.push(volunteerMarker);
-
-          // Add a connecting line between request and volunteer
-          const connectionLine = L.polyline([
-            [request.location.latitude, request.location.longitude],
-            [request.volunteer_location.latitude, request.volunteer_location.longitude]
-          ], {
-            color: '#059669',
-            weight: 2,
-            opacity: 0.6,
-            dashArray: '5, 5'
-          }).addTo(map);
-          markersRef.current.push(connectionLine);
-        }
-      }
+    // Request clusters and pins live in their own layer, redrawn per view
+    layerRef.current = L.layerGroup().addTo(map);
+    map.on('moveend', fetchTiles);
+    fetchTiles();
+  };
+
+  const renderTiles = (clusters, pins) => {
+    const L = leafletRef.current;
+    const map = mapInstanceRef.current;
+    const layer = layerRef.current;
+    if (!L || !map || !layer) return;
+
+    layer.clearLayers();
+
+    clusters.forEach(cluster => {
+      const urgency = ['high', 'medium', 'low'].find(level => cluster.urgencies[level]) || 'low';
+      const size = Math.round(Math.min(24 + Math.log2(cluster.count) * 6, 56));
+      const icon = L.divIcon({
+        className: 'request-cluster',
+        html: `<div style="background-color: ${urgencyColors[urgency]}; width: ${size}px; height: ${size}px; border-radius: 50%; border: 2px solid white; box-shadow: 0 2px 4px rgba(0,0,0,0.3); display: flex; align-items: center; justify-content: center; color: white; font-size: 12px; font-weight: bold;">${cluster.count}</div>`,
+        iconSize: [size, size],
+        iconAnchor: [size / 2, size / 2]
+      });
+
+      const marker = L.marker([cluster.latitude, cluster.longitude], { icon }).addTo(layer);
+      const breakdown = Object.entries(cluster.types).map(([type, count]) => `${type}: ${count}`).join(', ');
+      marker.bindTooltip(`${cluster.count} request${cluster.count !== 1 ? 's' : ''} (${breakdown})`);
+
+      // Zoom in towards individual pins
+      marker.on('click', () => {
+        map.setView([cluster.latitude, cluster.longitude], Math.min(map.getZoom() + 2, map.getMaxZoom()));
+      });
     });
 
-    // Fit map to show all markers if there are any
-    if (markersRef.current.length > 0) {
-      const group = new L.featureGroup(markersRef.current);
-      map.fitBounds(group.getBounds().pad(0.1));
+    pins.forEach(request => renderPin(L, layer, request));
+  };
+
+  const renderPin = (L, layer, request) => {
+    const marker = L.marker([request.location.latitude, request.location.longitude])
+      .addTo(layer);
+
+    // Custom icon based on urgency and status
+    let iconHtml;
+    if (request.status === 'in_progress' && request.volunteer_location) {
+      // Request has volunteer assigned - show as yellow
+      iconHtml = `<div style="background-color: #eab308; width: 16px; height: 16px; border-radius: 50%; border: 2px solid white; box-shadow: 0 2px 4px rgba(0,0,0,0.3);"></div>`;
+    } else {
+      // Regular request
+      iconHtml = `<div style="background-color: ${urgencyColors[request.urgency]}; width: 16px; height: 16px; border-radius: 50%; border: 2px solid white; box-shadow: 0 2px 4px rgba(0,0,0,0.3);"></div>`;
+    }
+
+    const icon = L.divIcon({
+      className: 'request-marker',
+      html: iconHtml,
+      iconSize: [16, 16],
+      iconAnchor: [8, 8]
+    });
+    marker.setIcon(icon);
+
+    // Add click handler
+    marker.on('click', () => {
+      setSelectedRequest(request);
+    });
+
+    // Enhanced popup content
+    const statusText = request.status === 'in_progress' ? 'Help on the way' : 'Help needed';
+    const popupContent = `
+      <div class="p-2">
+        <div class="flex items-center space-x-2 mb-2">
+          <span class="px-2 py-1 rounded-full text-xs font-medium" style="background-color: ${urgencyColors[request.urgency]}20; color: ${urgencyColors[request.urgency]}">
+            ${request.urgency} priority
+          </span>
+          <span class="px-2 py-1 rounded-full text-xs font-medium bg-gray-100 text-gray-800">
+            ${request.type}
+          </span>
+        </div>
+        <p class="text-sm font-medium mb-1">${statusText}</p>
+        <p class="text-sm mb-1">${request.description.length > 50 ? request.description.substring(0, 50) + '...' : request.description}</p>
+        ${request.distance ? `<p class="text-xs text-gray-600">${request.distance} km away</p>` : ''}
+        ${request.status === 'in_progress' ? '<p class="text-xs text-green-600 font-medium">Volunteer assigned</p>' : ''}
+        <button onclick="window.selectRequest('${request.id}')" class="mt-2 text-xs text-blue-600 hover:text-blue-800">View Details</button>
+      </div>
+    `;
+    
+    marker.bindPopup(popupContent);
+    
+    // Add volunteer marker if request is in progress and has volunteer location
+    if (request.status === 'in_progress' && request.volunteer_location && 
+        request.volunteer_location.latitude && request.volunteer_location.longitude) {
+      
+      const volunteerMarker = L.marker([request.volunteer_location.latitude, request.volunteer_location.longitude])
+        .addTo(layer);
+
+      // Volunteer icon
+      const volunteerIcon = L.divIcon({
+        className: 'volunteer-marker',
+        html: `<div style="background-color: #2563eb; width: 18px; height: 18px; border-radius: 50%; border: 2px solid white; box-shadow: 0 2px 4px rgba(0,0,0,0.3); display: flex; align-items: center; justify-content: center;">
+                 <div style="color: white; font-size: 10px; font-weight: bold;">V</div>
+               </div>`,
+        iconSize: [18, 18],
+        iconAnchor: [9, 9]
+      });
+      volunteerMarker.setIcon(volunteerIcon);
+
+      const volunteerPopupContent = `
+        <div class="p-2">
+          <p class="text-sm font-medium mb-1">Volunteer</p>
+          <p class="text-sm text-gray-700">${request.volunteer_name || 'Volunteer'}</p>
+          <p class="text-xs text-green-600">Helping with ${request.type} request</p>
+        </div>
+      `;
+      volunteerMarker.bindPopup(volunteerPopupContent);
+
+      // Add a connecting line between request and volunteer
+      L.polyline([
+        [request.location.latitude, request.location.longitude],
+        [request.volunteer_location.latitude, request.volunteer_location.longitude]
+      ], {
+        color: '#059669',
+        weight: 2,
+        opacity: 0.6,
+        dashArray: '5, 5'
+      }).addTo(layer);
     }
   };
 
@@ -296,7 +379,7 @@ export default function Map() {
 
       if (response.ok) {
         setSelectedRequest(null);
-        fetchMapData(); // Refresh the data
+        fetchTiles(); // Refresh the data
       } else {
         const data = await response.json();
         alert(data.error || 'Failed to volunteer for request');
@@ -461,7 +544,7 @@ export default function Map() {
           {/* Request Count */}
           <div className="p-6 flex-1">
             <div className="text-sm text-gray-600">
-              Showing {requests.length} request{requests.length !== 1 ? 's' : ''}
+              Showing {requestCount} request{requestCount !== 1 ? 's' : ''}
               {user.role === 'volunteer' && ' available to help with'}
             </div>
           </div>
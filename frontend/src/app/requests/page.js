@@ -4,6 +4,7 @@ import { useState, useEffect } from 'react';
 import { useRouter } from 'next/navigation';
 import Link from 'next/link';
 import Navigation from '../components/Navigation';
+import { useRequestEvents, applyRequestEvent } from '../components/useRequestEvents';
 import { 
   PlusIcon, 
   FunnelIcon,
@@ -87,6 +88,20 @@ export default function Requests() {
     }
   };
 
+  const matchesFilters = (request) => {
+    if (user?.role === 'victim') return true;
+    return request.status === (filters.status || 'pending');
+  };
+
+  useRequestEvents(
+    (eventType, request) => setRequests(prev => applyRequestEvent(prev, request, matchesFilters)),
+    {
+      filters: { type: filters.type, urgency: filters.urgency, radius: filters.maxDistance },
+      enabled: !!user,
+      onResync: fetchRequests
+    }
+  );
+
   const handleFilterChange = (key, value) => {
     setFilters(prev => ({
       ...prev,
@@ -101,9 +116,8 @@ export default function Requests() {
         credentials: 'include',
       });
 
-      if (response.ok) {
-        fetchRequests(); // Refresh the data
-      } else {
+      // On success the change arrives through the live event stream
+      if (!response.ok) {
         const data = await response.json();
         alert(data.error || 'Failed to volunteer for request');
       }
@@ -124,9 +138,8 @@ export default function Requests() {
         body: JSON.stringify({ status }),
       });
 
-      if (response.ok) {
-        fetchRequests(); // Refresh the data
-      } else {
+      // On success the change arrives through the live event stream
+      if (!response.ok) {
         const data = await response.json();
         alert(data.error || 'Failed to update request status');
       }
@@ -150,6 +163,7 @@ export default function Requests() {
       case 'pending': return 'text-yellow-600 bg-yellow-50 border-yellow-200';
       case 'in_progress': return 'text-blue-600 bg-blue-50 border-blue-200';
       case 'fulfilled': return 'text-green-600 bg-green-50 border-green-200';
+      case 'duplicate': return 'text-purple-600 bg-purple-50 border-purple-200';
       default: return 'text-gray-600 bg-gray-50 border-gray-200';
     }
   };
@@ -257,6 +271,7 @@ export default function Requests() {
                   <option value="pending">Pending</option>
                   <option value="in_progress">In Progress</option>
                   <option value="fulfilled">Fulfilled</option>
+                  <option value="duplicate">Duplicate</option>
                 </select>
               </div>
             )}
@@ -318,6 +333,11 @@ export default function Requests() {
                       <span className="inline-flex items-center px-2.5 py-0.5 rounded-full text-xs font-medium bg-gray-100 text-gray-800 border border-gray-200">
                         {request.type}
                       </span>
+                      {request.possible_duplicate_of && request.status === 'pending' && (
+                        <span className="inline-flex items-center px-2.5 py-0.5 rounded-full text-xs font-medium text-purple-600 bg-purple-50 border border-purple-200">
+                          possible duplicate
+                        </span>
+                      )}
                     </div>
 
                     {/* Description */}
@@ -397,7 +417,16 @@ export default function Requests() {
                       </button>
                     )}
 
-                    {user.role === 'victim' && request.status === 'pending' && (
+                    {user.role === 'victim' && request.status === 'duplicate' && (
+                      <button
+                        onClick={() => updateRequestStatus(request._id, 'pending')}
+                        className="inline-flex items-center px-3 py-2 border border-transparent text-sm font-medium rounded-md text-white bg-sky-600 hover:bg-sky-700"
+                      >
+                        Not a Duplicate
+                      </button>
+                    )}
+
+                    {user.role === 'victim' && ['pending', 'duplicate'].includes(request.status) && (
                       <button
                         onClick={() => updateRequestStatus(request._id, 'cancelled')}
                         className="inline-flex items-center px-3 py-2 border border-gray-300 text-sm font-medium rounded-md text-gray-700 bg-white hover:bg-gray-50"
@@ -4,6 +4,7 @@ import { useState, useEffect } from 'react';
 import { useRouter } from 'next/navigation';
 import Link from 'next/link';
 import Navigation from '../components/Navigation';
+import { useRequestEvents } from '../components/useRequestEvents';
 import { 
   SparklesIcon,
   MapPinIcon,
@@ -82,6 +83,18 @@ export default function Suggestions() {
     }
   };
 
+  // Drop suggestions that are taken; re-rank when something new comes in
+  useRequestEvents(
+    (eventType, request) => {
+      if (eventType === 'request.created') {
+        fetchSuggestions();
+      } else if (request.status !== 'pending') {
+        setSuggestions(prev => prev.filter(s => s.id !== request.id));
+      }
+    },
+    { enabled: !!user, onResync: fetchSuggestions }
+  );
+
   const handleRefresh = () => {
     setRefreshing(true);
     fetchSuggestions();
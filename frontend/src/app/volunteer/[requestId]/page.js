@@ -88,41 +88,14 @@ export default function VolunteerConfirmation() {
 
   const fetchRequestData = async () => {
     try {
-      // First try to get from suggestions endpoint (which has distance/score data)
-      const suggestionsResponse = await fetch('/api/suggestions', {
+      const response = await fetch(`/api/requests/${requestId}`, {
         credentials: 'include',
       });
       
-      if (suggestionsResponse.ok) {
-        const suggestions = await suggestionsResponse.json();
-        const foundRequest = suggestions.find(s => s.id === requestId);
-        
-        if (foundRequest) {
-          setRequest(foundRequest);
-          setLoading(false);
-          return;
-        }
-      }
-
-      // If not found in suggestions, get all requests and find it
-      const requestsResponse = await fetch('/api/requests', {
-        credentials: 'include',
-      });
-      
-      if (requestsResponse.ok) {
-        const requests = await requestsResponse.json();
-        const foundRequest = requests.find(r => r._id === requestId);
-        
-        if (foundRequest) {
-          // Convert to match suggestions format
-          setRequest({
-            id: foundRequest._id,
-            ...foundRequest,
-            score: 0 // Default score since it's not from suggestions
-          });
-        } else {
-          setError('Request not found or no longer available');
-        }
+      if (response.ok) {
+        setRequest(await response.json());
+      } else if (response.status === 404) {
+        setError('Request not found or no longer available');
       } else {
         setError('Failed to load request details');
       }